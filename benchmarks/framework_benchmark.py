@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_benchmark
+# Purpose:  This script times the framework_cell_log.py and framework_xsec.py
+#           requests against a stack of rasters, normally the synthetic stack
+#           written by framework_synthetic.py. Well logs are timed one
+#           location per request and in batches of locations, and cross
+#           sections across transect lengths. Latency, throughput and the
+#           peak resident memory are reported for each case, every case is
+#           run in a new interpreter so its peak is its own, beside the
+#           baseline peak of an interpreter holding only the modules.
+#
+#           resident  layers loaded once and kept as the service does
+#           cgi       rasters opened for every request as the CGI scripts do
+#           process   a new interpreter for every request, a true CGI request
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+###############################################################################
+
+import os, sys, time
+import math
+
+import argparse
+import resource
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+import json
+
+# Results are timed without the shared result cache, and without merging
+#  the metrics of each request into the shared metrics of the service
+#
+os.environ['FRAMEWORK_CACHE']   = ''
+os.environ['FRAMEWORK_METRICS'] = ''
+
+# Framework scripts
+#
+cgiDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cgi-bin')
+sys.path.insert(0, cgiDir)
+
+import framework_cell_log
+import framework_xsec
+
+from framework_layers import readLookup, openLayers
+
+# Set up logging, the scripts log every request at info level
+#
+import logging
+
+screen_logger = logging.getLogger()
+screen_logger.setLevel(logging.WARNING)
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+program      = "USGS Raster Framework Benchmark Script"
+version      = "1.01"
+version_date = "October 18, 2026"
+usage_message = """
+Usage: framework_benchmark.py
+                [--help]
+                [--usage]
+                [--directory               Provide the directory holding the rasters and framework_lookup.json]
+                [--modes                   Provide the modes to time of resident, cgi and process]
+                [--points                  Provide the numbers of locations in a batch of well logs]
+                [--lengths                 Provide the transect lengths as fractions of the raster diagonal]
+                [--requests                Provide the number of requests timed in each case]
+                [--seed                    Provide the seed of the random locations]
+                [--json                    Provide a file to hold the results as JSON]
+"""
+
+# =============================================================================
+def peakRss(mode):
+
+    # Peak resident memory (MB) of this process, or of the request processes
+    #
+    who = resource.RUSAGE_CHILDREN if mode == 'process' else resource.RUSAGE_SELF
+
+    return resource.getrusage(who).ru_maxrss / 1024.0
+
+# =============================================================================
+def runCase(mode, script, queriesL):
+
+    # Case timed in a new interpreter, the peak resident memory of a process
+    #  never falls so an earlier case would set it for every later one
+    #
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(timeCase, (mode, script, queriesL))
+
+# =============================================================================
+def baselineRss():
+
+    # Peak resident memory (MB) of a new interpreter holding the modules
+    #
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(peakRss, ('resident',))
+
+# =============================================================================
+def randomPoints(bounds, rng, n):
+
+    # Locations inside the rasters away from the edges
+    #
+    (left, bottom, right, top) = bounds
+    (dx, dy) = (0.02 * (right - left), 0.02 * (top - bottom))
+
+    xs = rng.uniform(left + dx, right - dx, n)
+    ys = rng.uniform(bottom + dy, top - dy, n)
+
+    return list(zip(xs.tolist(), ys.tolist()))
+
+# =============================================================================
+def randomTransect(bounds, rng, fraction):
+
+    # Transect of a fraction of the raster diagonal in a random direction,
+    #  shortened until both ends fall inside the rasters
+    #
+    (left, bottom, right, top) = bounds
+    length = fraction * math.hypot(right - left, top - bottom)
+
+    while True:
+        angle  = rng.uniform(0.0, math.pi)
+        (x, y) = randomPoints(bounds, rng, 1)[0]
+        (dx, dy) = (0.5 * length * math.cos(angle), 0.5 * length * math.sin(angle))
+        (x1, y1, x2, y2) = (x - dx, y - dy, x + dx, y + dy)
+        if left < min(x1, x2) and max(x1, x2) < right and bottom < min(y1, y2) and max(y1, y2) < top:
+            return [(x1, y1), (x2, y2)]
+        length *= 0.95
+
+# =============================================================================
+def buildCases(rastersL, bounds, rng, pointsL, lengthsL, nrequests):
+
+    rasters = 'rasters=%s' % ','.join(rastersL)
+    casesL  = []
+
+    # One location per request
+    #
+    queriesL = ['x_coordinate=%.2f&y_coordinate=%.2f&%s' % (x, y, rasters) for (x, y) in randomPoints(bounds, rng, nrequests)]
+    casesL.append(('cell_log', 'single', 'framework_cell_log.py', queriesL))
+
+    # Batches of locations
+    #
+    for npoints in pointsL:
+        queriesL = []
+        for i in range(nrequests):
+            points = ' '.join(['%.2f,%.2f' % (x, y) for (x, y) in randomPoints(bounds, rng, npoints)])
+            queriesL.append('points=%s&%s' % (points, rasters))
+        casesL.append(('cell_log', 'batch %d' % npoints, 'framework_cell_log.py', queriesL))
+
+    # Cross sections
+    #
+    for fraction in lengthsL:
+        queriesL = []
+        for i in range(nrequests):
+            points = ' '.join(['%.2f,%.2f' % (x, y) for (x, y) in randomTransect(bounds, rng, fraction)])
+            queriesL.append('points=%s&%s' % (points, rasters))
+        casesL.append(('xsec', 'length %.2f' % fraction, 'framework_xsec.py', queriesL))
+
+    return casesL
+
+# =============================================================================
+def timeCase(mode, script, queriesL):
+
+    processQuery = {
+        'framework_cell_log.py' : framework_cell_log.processQuery,
+        'framework_xsec.py'     : framework_xsec.processQuery
+    }[script]
+
+    # Layers kept between requests as the service does
+    #
+    layersD = {}
+    def loadLayers(rastersL):
+        key = tuple(rastersL)
+        if key not in layersD:
+            layersD[key] = openLayers(rastersL, decode=True)
+        return layersD[key]
+
+    if mode == 'resident':
+        processQuery(queriesL[0], loadLayers=loadLayers)
+
+    latenciesL = []
+    failures   = 0
+    begin      = time.perf_counter()
+    for queryString in queriesL:
+
+        start = time.perf_counter()
+
+        if mode == 'process':
+            environ = dict(os.environ, QUERY_STRING=queryString, REQUEST_METHOD='GET')
+            result  = subprocess.run([sys.executable, os.path.join(cgiDir, script)],
+                                     env=environ, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            jsonText = result.stdout.decode('utf-8').split('\n\n', 1)[-1]
+        elif mode == 'resident':
+            jsonText = processQuery(queryString, loadLayers=loadLayers)
+        else:
+            jsonText = processQuery(queryString)
+
+        latenciesL.append(time.perf_counter() - start)
+
+        if '"success"' not in jsonText[:200]:
+            failures += 1
+
+    elapsed   = time.perf_counter() - begin
+    latencies = np.array(latenciesL) * 1000.0
+
+    return {
+        'requests'   : len(queriesL),
+        'failures'   : failures,
+        'mean_ms'    : float(np.mean(latencies)),
+        'p50_ms'     : float(np.percentile(latencies, 50)),
+        'p95_ms'     : float(np.percentile(latencies, 95)),
+        'per_second' : len(queriesL) / elapsed,
+        'peak_rss_mb': peakRss(mode)
+    }
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=program, usage=usage_message)
+    parser.add_argument('--usage', action='store_true')
+    parser.add_argument('--directory', default='synthetic')
+    parser.add_argument('--modes', default='resident,cgi')
+    parser.add_argument('--points', default='1,10,100,1000')
+    parser.add_argument('--lengths', default='0.1,0.5,1.0')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', default=None)
+    args = parser.parse_args()
+
+    if args.usage:
+        print(usage_message)
+        sys.exit()
+
+    # Raster paths in the lookup file are relative to its directory
+    #
+    if args.json is not None:
+        args.json = os.path.abspath(args.json)
+
+    lookupD  = readLookup(os.path.join(args.directory, 'framework_lookup.json'))
+    rastersL = lookupD['rasters']
+    os.chdir(args.directory)
+
+    layers = openLayers(rastersL)
+    bounds = tuple(layers['bounds'])
+
+    rng     = np.random.default_rng(args.seed)
+    pointsL = [int(n) for n in args.points.split(',')]
+    lengths = [float(f) for f in args.lengths.split(',')]
+    casesL  = buildCases(rastersL, bounds, rng, pointsL, lengths, args.requests)
+
+    baseline = baselineRss()
+
+    print('%s version %s' % (program, version))
+    print('Rasters %d layers, %d rows, %d columns' % (layers['nlays'], layers['nrows'], layers['ncols']))
+    print('Baseline peak RSS %.1f MB of an interpreter holding the modules' % baseline)
+    print('%-9s %-9s %-12s %8s %10s %10s %10s %10s %12s' % ('mode', 'script', 'case', 'requests', 'mean ms', 'p50 ms', 'p95 ms', 'req/s', 'peak RSS MB'))
+
+    resultsL = [{'mode': 'baseline', 'script': None, 'case': None, 'peak_rss_mb': baseline}]
+    for mode in args.modes.split(','):
+        for (kind, case, script, queriesL) in casesL:
+
+            result = runCase(mode, script, queriesL)
+            result.update({'mode': mode, 'script': kind, 'case': case})
+            resultsL.append(result)
+
+            print('%-9s %-9s %-12s %8d %10.2f %10.2f %10.2f %10.1f %12.1f%s' % (mode, kind, case, result['requests'],
+                  result['mean_ms'], result['p50_ms'], result['p95_ms'], result['per_second'], result['peak_rss_mb'],
+                  '  (%d failed)' % result['failures'] if result['failures'] > 0 else ''))
+
+    if args.json is not None:
+        with open(args.json, 'w') as fh:
+            json.dump(resultsL, fh, indent=2)
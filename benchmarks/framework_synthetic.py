@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_synthetic
+# Purpose:  This script generates a synthetic stack of framework rasters for
+#           benchmarking. Each layer is a float32 GeoTIFF of layer top
+#           elevations in the Lambert Conformal Conic projection of the
+#           framework model, descending from land surface to bedrock, with
+#           a fraction of each layer set to nodata where the unit is absent.
+#           A lookup file listing the rasters is written beside them.
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+###############################################################################
+
+import os, sys
+
+import argparse
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+import json
+
+# Set up logging
+#
+import logging
+
+# -- Set logging file
+#
+# Create screen handler
+#
+screen_logger = logging.getLogger()
+formatter     = logging.Formatter(fmt='%(message)s')
+console       = logging.StreamHandler()
+console.setFormatter(formatter)
+screen_logger.addHandler(console)
+screen_logger.setLevel(logging.INFO)
+screen_logger.propagate = False
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+program      = "USGS Synthetic Framework Raster Script"
+version      = "1.01"
+version_date = "October 18, 2026"
+usage_message = """
+Usage: framework_synthetic.py
+                [--help]
+                [--usage]
+                [--directory               Provide the directory to hold the synthetic rasters and lookup file]
+                [--rows                    Provide the number of raster rows]
+                [--columns                 Provide the number of raster columns]
+                [--layers                  Provide the number of layers from land surface to bedrock]
+                [--nodata                  Provide the fraction of each layer below land surface without a value]
+                [--layout                  Provide the block layout of tiled or striped]
+                [--block                   Provide the block size in cells of a tiled layout]
+                [--seed                    Provide the seed of the random surfaces]
+"""
+
+# Framework model projection, Washington State Plane South (feet)
+#
+rasterCrs = '+proj=lcc +lat_0=45.33333333333334 +lon_0=-120.5 +lat_1=47.33333333333334 +lat_2=45.83333333333334 +x_0=500000.0001016 +y_0=0 +ellps=GRS80 +datum=NAD83 +to_meter=0.3048006096012192 +no_defs'
+
+# Upper left corner and cell size (feet) of the framework grid
+#
+x_origin  = 1400000.0
+y_origin  = 700000.0
+cell_size = 1000.0
+
+nodata    = -9999.0
+
+# =============================================================================
+def layerNames(nlays):
+
+    # Names of the framework model followed by numbered units
+    #
+    namesL = ['obtop', 'smtop', 'wntop', 'grtop', 'pmtop']
+
+    return [namesL[k] if k < len(namesL) else 'u%02dtop' % k for k in range(nlays)]
+
+# =============================================================================
+def buildSurfaces(nrows, ncols, nlays, nodataFraction, seed):
+
+    # Smooth surfaces descending from land surface, units below land surface
+    #  are absent where a smooth random field falls below the nodata fraction
+    #
+    rng      = np.random.default_rng(seed)
+    (r, c)   = np.mgrid[0:nrows, 0:ncols].astype(np.float32)
+    land     = 1500.0 + 300.0 * np.sin(c / 40.0) + 200.0 * np.cos(r / 30.0)
+    depth    = np.zeros((nrows, ncols), dtype=np.float32)
+
+    for k in range(nlays):
+        phase  = rng.uniform(0.0, 2.0 * np.pi, 2)
+        depth += 150.0 + 100.0 * np.sin(r / (25.0 + 3 * k) + phase[0]) * np.cos(c / (35.0 + 5 * k) + phase[1])
+        top    = (land - depth * (k > 0)).astype(np.float32)
+        top   += rng.normal(0.0, 1.0, (nrows, ncols)).astype(np.float32)
+
+        if k > 0 and nodataFraction > 0.0:
+            field = np.sin(r / (15.0 + k) + phase[1]) * np.cos(c / (25.0 + k) + phase[0])
+            top[field < np.quantile(field, nodataFraction)] = nodata
+
+        yield top
+
+# =============================================================================
+def writeRasters(directory, nrows, ncols, nlays, nodataFraction, layout, block, seed):
+
+    tiffDir = os.path.join(directory, 'tiffs')
+    os.makedirs(tiffDir, exist_ok=True)
+
+    profile = {
+        'driver'    : 'GTiff',
+        'height'    : nrows,
+        'width'     : ncols,
+        'count'     : 1,
+        'dtype'     : 'float32',
+        'crs'       : rasterCrs,
+        'transform' : from_origin(x_origin, y_origin, cell_size, cell_size),
+        'nodata'    : nodata
+    }
+    if layout == 'tiled':
+        profile.update({'tiled': True, 'blockxsize': block, 'blockysize': block})
+
+    rastersL = []
+    for (raster, top) in zip(layerNames(nlays), buildSurfaces(nrows, ncols, nlays, nodataFraction, seed)):
+
+        rasterFile = os.path.join('tiffs', '%s.tif' % raster)
+        screen_logger.info('\tLayer %s' % rasterFile)
+
+        with rasterio.open(os.path.join(directory, rasterFile), 'w', **profile) as rc:
+            rc.write(top, 1)
+
+        rastersL.append(rasterFile)
+
+    # Lookup file in the form of the framework lookup file
+    #
+    lookupD = {
+        'title'             : 'Synthetic Framework Model',
+        'rasters'           : rastersL,
+        'rasterL'           : layerNames(nlays),
+        'raster_projection' : rasterCrs,
+        'nrows'             : nrows,
+        'ncols'             : ncols,
+        'layout'            : layout
+    }
+
+    lookupFile = os.path.join(directory, 'framework_lookup.json')
+    with open(lookupFile, 'w') as fh:
+        fh.write('var myGeologicFramework = %s;\n' % json.dumps(lookupD, indent=4))
+
+    return lookupFile
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=program, usage=usage_message)
+    parser.add_argument('--usage', action='store_true')
+    parser.add_argument('--directory', default='synthetic')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--columns', type=int, default=1500)
+    parser.add_argument('--layers', type=int, default=5)
+    parser.add_argument('--nodata', type=float, default=0.2)
+    parser.add_argument('--layout', choices=['tiled', 'striped'], default='tiled')
+    parser.add_argument('--block', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.usage:
+        print(usage_message)
+        sys.exit()
+
+    screen_logger.info('Writing %d layers of %d rows and %d columns to %s' % (args.layers, args.rows, args.columns, args.directory))
+
+    lookupFile = writeRasters(args.directory, args.rows, args.columns, args.layers, args.nodata, args.layout, args.block, args.seed)
+
+    screen_logger.info('Done with lookup file %s' % lookupFile)
@@ -0,0 +1,186 @@
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_cache
+# Purpose:  This module holds the result cache shared by the framework
+#           scripts and service workers. Well logs and cross sections are
+#           stored in a SQLite file keyed on the request and the version of
+#           the raster set, and the least recently used entries are evicted
+#           once the cache grows past its size limit.
+#
+#           FRAMEWORK_CACHE        path of the cache file, empty to disable
+#           FRAMEWORK_CACHE_BYTES  largest size of the stored results
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+###############################################################################
+
+import os, time
+import tempfile
+import threading
+
+import hashlib
+import sqlite3
+import zlib
+
+import json
+
+# Set up logging
+#
+import logging
+
+screen_logger = logging.getLogger()
+
+# Stage timings and counters of a request
+#
+from framework_metrics import timed, countMetric
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+cacheFile     = os.environ.get('FRAMEWORK_CACHE', os.path.join(tempfile.gettempdir(), 'framework_cache.sqlite'))
+maxCacheBytes = int(os.environ.get('FRAMEWORK_CACHE_BYTES', 256 * 1024 * 1024))
+
+# Open connection for this process, shared by the service threads
+#
+connectionL = []
+cacheLock   = threading.Lock()
+
+# =============================================================================
+def cacheConnection():
+
+    if len(cacheFile) < 1:
+        return None
+
+    if len(connectionL) > 0:
+        return connectionL[0]
+
+    try:
+        connection = sqlite3.connect(cacheFile, timeout=5.0, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('''CREATE TABLE IF NOT EXISTS results (
+                                  key       TEXT PRIMARY KEY,
+                                  rasters   TEXT,
+                                  version   TEXT,
+                                  body      BLOB,
+                                  size      INTEGER,
+                                  last_used REAL)''')
+        connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+    except sqlite3.Error as e:
+        screen_logger.warning('Result cache %s is not available: %s' % (cacheFile, str(e)))
+        return None
+
+    connectionL.append(connection)
+
+    return connection
+
+# =============================================================================
+def cacheKey(kind, layers, parts):
+
+    # Key on the kind of result, the raster set and its version, and the
+    #  resolved request
+    #
+    keyText = json.dumps([kind, layers['files'], layers['version'], parts])
+
+    return hashlib.sha1(keyText.encode('utf-8')).hexdigest()
+
+# =============================================================================
+@timed('cache')
+def cacheGet(key):
+
+    with cacheLock:
+        connection = cacheConnection()
+        if connection is None:
+            return None
+
+        try:
+            row = connection.execute('SELECT body FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                countMetric('cache_misses')
+                return None
+
+            # A body that cannot be decoded is removed and counted as a miss
+            #
+            try:
+                text = zlib.decompress(row[0]).decode('utf-8')
+            except (zlib.error, UnicodeDecodeError) as e:
+                screen_logger.warning('Result cache entry %s is corrupt: %s' % (key, str(e)))
+                connection.execute('DELETE FROM results WHERE key = ?', (key,))
+                countMetric('cache_misses')
+                return None
+
+            connection.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+        except sqlite3.Error as e:
+            screen_logger.warning('Result cache read failed: %s' % str(e))
+            return None
+
+    screen_logger.info('\nResult cache hit %s' % key)
+    countMetric('cache_hits')
+
+    return text
+
+# =============================================================================
+@timed('cache')
+def cachePut(key, layers, text):
+
+    with cacheLock:
+        connection = cacheConnection()
+        if connection is None:
+            return
+
+        body    = zlib.compress(text.encode('utf-8'))
+        rasters = ' '.join(layers['files'])
+
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+
+            # Results of older versions of the raster set are no longer valid
+            #
+            connection.execute('DELETE FROM results WHERE rasters = ? AND version != ?', (rasters, layers['version']))
+
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, rasters, layers['version'], body, len(body), time.time()))
+
+            # Evict the least recently used results down to 90 percent of the limit
+            #
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+            if total > maxCacheBytes:
+                excess = total - int(0.9 * maxCacheBytes)
+                evictL = []
+                for (oldKey, size) in connection.execute('SELECT key, size FROM results ORDER BY last_used'):
+                    if excess <= 0:
+                        break
+                    evictL.append((oldKey,))
+                    excess -= size
+                connection.executemany('DELETE FROM results WHERE key = ?', evictL)
+                screen_logger.info('\nResult cache evicted %d entries' % len(evictL))
+
+            connection.execute('COMMIT')
+
+        except sqlite3.Error as e:
+            screen_logger.warning('Result cache write failed: %s' % str(e))
+            try:
+                connection.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
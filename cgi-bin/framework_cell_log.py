@@ -51,25 +51,40 @@ import logging
 # Create screen handler
 #
 screen_logger = logging.getLogger()
-formatter     = logging.Formatter(fmt='%(message)s')
-console       = logging.StreamHandler()
-console.setFormatter(formatter)
-screen_logger.addHandler(console)
+if len(screen_logger.handlers) < 1:
+    formatter     = logging.Formatter(fmt='%(message)s')
+    console       = logging.StreamHandler()
+    console.setFormatter(formatter)
+    screen_logger.addHandler(console)
 screen_logger.setLevel(logging.ERROR)
 screen_logger.setLevel(logging.INFO)
 screen_logger.propagate = False
 
 # Import modules for CGI handling
 #
-from urllib.parse import parse_qs
+from urllib.parse import parse_qs, quote
+
+# Shared raster layer handling
+#
+from framework_layers import FrameworkError, parseRasters, parseNumber, openLayers, sharedLayers, rowCol, insideLayers, insideStudyArea, readCells, readDerived, readPostBody
+from framework_layers import longlatCrs, transformCoordinates
+from framework_layers import rasterPaths, rasterSetVersion, entityTag, outputFormat, compactJson, printResponse, printNotModified
+
+# Shared result cache
+#
+from framework_cache import cacheKey, cacheGet, cachePut
+
+# Stage timings and counters of a request
+#
+from framework_metrics import timed, startRequest, finishRequest, timingsRequested, timingsJson, serverTiming
 
 # ------------------------------------------------------------
 # -- Set
 # ------------------------------------------------------------
 
 program      = "USGS Raster Location Script"
-version      = "3.11"
-version_date = "February 26, 2025"
+version      = "3.12"
+version_date = "October 18, 2026"
 usage_message = """
 Usage: framework_location.py
                 [--help]
@@ -79,64 +94,87 @@ Usage: framework_location.py
                 [--x                       Provide a numeric x coordinate in the raster coordinate projection]
                 [--y                       Provide a numeric y coordinate in the raster coordinate projection]
                 [--raster                  Provide a set of rasters from land surface to bedrock (descending order)]
+                [--input                   Provide a CSV, GeoJSON or GeoJSON Lines file of locations for a bulk run]
+                [--output                  Provide a CSV, Parquet or JSON Lines file for the well logs of a bulk run, - for standard output]
+                [--format                  Provide the output format of csv, parquet or jsonl when not given by the output file suffix]
+                [--crs                     Provide the coordinate system of x and y coordinates in the input file]
+                [--workers                 Provide the number of worker processes of a bulk run]
+                [--chunk                   Provide the number of locations handed to a worker at a time]
 """
 
+# Output formats, compact drops the padding and white space
+#
+outputFormats = ['json', 'compact']
+
+# Bulk output formats by file suffix and the columns of the tabular formats,
+#  one row for each unit of each location
+#
+bulkFormats = {
+    '.csv'     : 'csv',
+    '.parquet' : 'parquet',
+    '.jsonl'   : 'jsonl',
+    '.ndjson'  : 'jsonl'
+}
+bulkColumns = ['id', 'x_coordinate', 'y_coordinate', 'row', 'column', 'unit',
+               'top_elev', 'top_depth', 'bot_elev', 'bot_depth', 'thickness', 'message']
+
+# Layers opened once by each bulk worker process
+#
+workerLayers = {}
+
 # =============================================================================
 def errorMessage(error_message):
 
-    print("Content-type: application/json\n")
+    print("Content-type: application/json")
+    print("Cache-Control: no-store\n")
     print('{')
     print(' "status"        : "failed",')
     print(' "message": "%s" ' % error_message)
     print('}')
+
+    finishRequest('framework_cell_log.py', 'failed')
     
     sys.exit()
 
 # =============================================================================
+@timed('parse')
+def parseQuery(queryString, postBody=None):
+
+    if len(queryString) < 1 and postBody is None:
+        usage_message = ", ".join([
+        'Provide a longitude value',
+        'Provide a latitude value',
+        'Provide a x coordinate in the raster coordinate projection',
+        'Provide a y coordinate in the raster coordinate projection',
+        #'Provide a path to directory containing the set of rasters',
+        'Provide a set of rasters from land surface to bedrock (descending order)'
+        ])
+        raise FrameworkError(usage_message)
 
-# ----------------------------------------------------------------------
-# -- Main program
-# ----------------------------------------------------------------------
+    queryStringD = parse_qs(queryString, encoding='utf-8')
+    screen_logger.debug('\nqueryStringD %s' % str(queryStringD))
 
-Arguments = {}
-rastersL  = []
-raster_legend = {}
- 
-# Current directory
-#
-currentDir = os.path.dirname(__file__)
+    # Batch of locations from the points argument or the request body
+    #
+    if 'points' in queryStringD or postBody is not None:
 
-# Parse the Query String
-#
-params = {}
- 
-HardWired = None
-#HardWired = 1
-
-if HardWired is not None:
-    os.environ['QUERY_STRING'] = 'longitude=-120.81387691535224&latitude=46.423308095146126&x_coordinate=1561263.8314058625&y_coordinate=397630.901255142&color=framework_color_map.txt&rasters=tiffs/obtop.tif tiffs/smtop.tif tiffs/wntop.tif tiffs/grtop.tif tiffs/pmtop.tif'
-    os.environ['QUERY_STRING'] = 'longitude=-120.81387691535224&latitude=46.423308095146126&x_coordinate=1561263.8314058625&y_coordinate=397630.901255142&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
-    #os.environ['QUERY_STRING'] = 'longitude=-119.48181152343751&latitude=46.09609080214316&x_coordinate=1898715.1435567&y_coordinate=279817.25493153144&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
-    #os.environ['QUERY_STRING'] = 'longitude=-119.52575683593751&latitude=45.321254361171476&x_coordinate=1891057.3624456269&y_coordinate=-2857.0708499001557&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
-    os.environ['QUERY_STRING'] = 'longitude=-119.07531738281251&latitude=46.7248003746672&x_coordinate=1997685.8509084934&y_coordinate=510646.72156364744&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
-    os.environ['QUERY_STRING'] = 'longitude=-118.32824707031251&latitude=46.06166996192512&x_coordinate=2191647.6286216783&y_coordinate=273187.42898256733&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
-    os.environ['QUERY_STRING'] = 'longitude=-117.58721927180888&latitude=46.20239286768872&x_coordinate=2377764.965356479&y_coordinate=330530.0168397045&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
-
-# Check URL
-#
-QUERY_STRING = ''
+        if 'rasters' not in queryStringD:
+            raise FrameworkError('%s' % 'Provide a set of rasters from land surface to bedrock (descending order)')
 
-if 'QUERY_STRING' in os.environ:
-    QUERY_STRING = str(os.environ['QUERY_STRING'])
-    
-screen_logger.debug('\nQUERY_STRING: %s' % QUERY_STRING)
-  
-if len(QUERY_STRING) > 0:
-    
-    queryString = os.environ['QUERY_STRING']
+        rastersL = parseRasters(queryStringD['rasters'][0])
 
-    queryStringD = parse_qs(queryString, encoding='utf-8')
-    screen_logger.debug('\nqueryStringD %s' % str(queryStringD))
+        if postBody is not None:
+            pointsD = parsePostPoints(postBody)
+        else:
+            pointsD = parsePoints(queryStringD['points'][0])
+
+        # Coordinate system of the locations, the raster coordinate projection
+        #  unless given
+        #
+        if 'crs' in queryStringD:
+            pointsD['crs'] = queryStringD['crs'][0]
+
+        return (rastersL, {}, pointsD)
 
     # List of arguments
     #
@@ -147,21 +185,28 @@ if len(QUERY_STRING) > 0:
         'y_coordinate',
         'rasters'
        ]
-    parmL    = list(myParmsL)
     missingL = []
-    
+
     # Check arguments
     #
     querySet = set(queryStringD.keys())
     argsSet  = set(myParmsL)
     missingL = list(argsSet.difference(querySet))
+
+    # Location is given by either x and y coordinates in the raster coordinate
+    #  projection or longitude and latitude
+    #
+    if 'x_coordinate' in querySet and 'y_coordinate' in querySet:
+        missingL = [myParm for myParm in missingL if myParm not in ['longitude', 'latitude']]
+    elif 'longitude' in querySet and 'latitude' in querySet:
+        missingL = [myParm for myParm in missingL if myParm not in ['x_coordinate', 'y_coordinate']]
     screen_logger.debug('Arguments missing %s' % str(missingL))
 
     # Check other arguments
     #
     if len(missingL) > 0:
         errorL = []
-        if 'raster' in missingL:
+        if 'rasters' in missingL:
             errorL.append('%s' % 'Provide a set of rasters from land surface to bedrock (descending order)')
         elif 'longitude' in missingL:
             errorL.append('%s' % 'Provide a numeric longitude value')
@@ -171,274 +216,733 @@ if len(QUERY_STRING) > 0:
             errorL.append('%s' % 'Provide a numeric x_coordinate value')
         elif 'y_coordinate' in missingL:
             errorL.append('%s' % 'Provide a numeric y_coordinate value')
-        elif 'color' in missingL:
-            errorL.append('%s' % 'Provide a color specification file name containing a list of description and colors for each raster')
 
-        errorMessage('%s' % ', '.join(errorL))
-    
+        raise FrameworkError('%s' % ', '.join(errorL))
+
     # Check rasters
     #
-    rastersL = re.split(r"[-;,\s]\s*", queryStringD['rasters'][0])
-    tempL    = list(rastersL)
-    screen_logger.debug('\nRasters: %s' % ' '.join(rastersL))
+    rastersL = parseRasters(queryStringD['rasters'][0])
+
+    # Real numbers
+    #
+    myArgs = {}
+    for myParm in ['longitude', 'latitude', 'x_coordinate', 'y_coordinate']:
 
-    if len(rastersL) < 1:
-        errorMessage('%s' % 'Provide a set of rasters from land surface to bedrock (descending order)')
+        if myParm not in queryStringD:
+            continue
 
-    while len(tempL) > 0:
-        rasterFile  = str(tempL.pop(0))
-        #rasterFile = os.path.join(currentDir, rasterFile)
+        myArgs[myParm] = parseNumber(queryStringD[myParm][0], myParm)
+        screen_logger.info('\n%s: %s' % (myParm, str(myArgs[myParm])))
 
-        if not os.path.isfile(rasterFile):
-            errorMessage('Error: Raster file %s does not exist' % rasterFile)
+    return (rastersL, myArgs, None)
 
-    # Real numbers
-    #             regex "^[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?$"
+# =============================================================================
+def parsePoints(pointsText):
+
+    # Locations as x and y coordinates in the raster coordinate projection
+    #  x,y x,y ...
     #
-    for myParm in ['longitude', 'latitude', 'x_coordinate', 'y_coordinate']:
+    pointsD = {'ids': [], 'x_coordinates': [], 'y_coordinates': [], 'crs': None}
 
-        myArg = queryStringD[myParm][0]
+    for point in pointsText.split():
+        try:
+            (x_coordinate, y_coordinate) = point.split(',')
+        except ValueError:
+            raise FrameworkError('Provide a set of x and y coordinates for each location')
 
-        myMatch = bool(re.search(r"^[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?$", myArg))
+        pointsD['ids'].append(None)
+        pointsD['x_coordinates'].append(parseNumber(x_coordinate, 'x coordinate'))
+        pointsD['y_coordinates'].append(parseNumber(y_coordinate, 'y coordinate'))
 
-        # Argument failed regex
-        #
-        if not myMatch:
-            errorMessage('Provide a numeric value for %s' % myParm)
-
-        if myParm == 'longitude':
-            longitude = float(myArg)
-        elif myParm == 'latitude':
-            latitude = float(myArg)
-        elif myParm == 'x_coordinate':
-            x_coordinate = float(myArg)
-        elif myParm == 'y_coordinate':
-            y_coordinate = float(myArg)
-            
-        screen_logger.info('\n%s: %s' % (myParm, str(myArg)))
-
-# Set rasters
-#
-rasterList = []
-if len(rastersL) > 0:
-
-    rasterD    = {}
-    rasters    = []
-    units      = []
-    tempL      = list(rastersL)
-    nrows      = None
-    ncols      = None
-    nlays      = len(rastersL)
-    row        = None
-    col        = None
-    cell_size  = None
-    cell       = None
-    cell_count = 0
-    bounds     = None
-
-    elevation_min =  9999999999999999.99
-    elevation_max = -9999999999999999.99
-
-    while len(tempL) > 0:
-
-        rasterFile  = str(tempL.pop(0))
-        NoData      = None
-        rasterValue = None
-        maximum     = None
-        minimum     = None
-        nodata      = None
-            
-        if not os.path.isfile(rasterFile):
-            errorMessage('Error: Raster file %s does not exist' % rasterFile)
-
-        # Remove suffix .tif
-        #
-        (root, tif_suffix)   = os.path.splitext(rasterFile)
-        if tif_suffix is not None:
-            (dir, raster) = os.path.split(root)
+    if len(pointsD['ids']) < 1:
+        raise FrameworkError('Provide a set of x and y coordinates for each location')
 
-        # Build list of rasters
-        #
-        rasters.append(raster)
+    screen_logger.info('\nNumber of locations %d' % len(pointsD['ids']))
 
-        # Read raster bands directly to Numpy arrays.
-        #
+    return pointsD
+
+# =============================================================================
+def parsePostPoints(postBody):
+
+    postBody = postBody.strip()
+
+    # GeoJSON points are longitude and latitude (WGS84)
+    #
+    if postBody.startswith('{'):
         try:
-            with rasterio.open(rasterFile) as rc:
-                
-                # General information for rasters
-                #
-                if bounds is None:
-                    screen_logger.info('\n\nGeneral information for rasters')
-                    kwds = rc.profile
-                    #screen_logger.info(kwds)
-                    bounds = rc.bounds
-                    screen_logger.info('\t%s' % str(bounds))
-                    ncols = rc.width
-                    #screen_logger.info('Number of columns %s' % str(ncols))
-                    nrows = rc.height
-                    #screen_logger.info('Number of rows %s' % str(nrows))
-                    shape = rc.shape
-                    screen_logger.info('\tRaster shape (columns %s (x coordinate) rows %s (y coordinate) ' % (str(ncols), str(nrows)))
-
-                    # Determine CRS parameters
-                    #
-                    rasterCrs = rc.crs
-                    screen_logger.info('\tCoordinate system %s' % str(rasterCrs))
-
-                    # Proj4 parameters
-                    #
-                    dst_crs = rc.crs.to_proj4()
-                    screen_logger.info('\tRaster proj4 parameters %s' % str(dst_crs))
-
-                    # Determine x,y coordinates from longitude/latitude
-                    #
-                    src_crs = {'init': 'EPSG:4326'}
-                    #src_crs = CRS.from_proj4("+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs")
-                    screen_logger.info('\tWGS84 proj4 parameters %s' % str(src_crs))
-                    src_coords = [[longitude, latitude]]
-                    screen_logger.info('\tWGS84 coordinates %s' % str(src_coords))
-                    dst_coords = [[ 0, 0]]
-                    #new_coords = reproject_coords(src_coords, dst_coords, src_crs=src_crs, dst_crs=dst_crs, resampling=Resampling.nearest)
-                    #screen_logger.info('\tProjected coordinates %s' % str(new_coords))
-                    
-                    # Determine Affine parameters
-                    #
-                    rasterAffine = rc.transform
-                    #screen_logger.info('\tAffine %s' % str(rasterAffine))
-
-                    # Determine origin coordinates
-                    #
-                    origin_x, origin_y = rc.transform * (0, 0)
-                    screen_logger.info('\tOrigin %s %s' % (str(origin_x), str(origin_y)))
-
-                    # Determine row and column from coordinates
-                    #
-                    transformer = rasterio.transform.AffineTransformer(rasterAffine)
-                    (row, col) = transformer.rowcol(float(x_coordinate), float(y_coordinate))
-                    cell_count += 1
-                    screen_logger.info('\tRaster row %s col %s' % (str(row), str(col)))
-                    (row, col) = transformer.rowcol(float(x_coordinate), float(y_coordinate))
-                    cell_count += 1
-                    screen_logger.info('\tRaster row %s col %s' % (str(row), str(col)))
-
-                    # Bounding box of cell
-                    #
-                    geoInfo   = rc.transform
-                    cell_x_size = geoInfo[0]
-                    screen_logger.info('\tColumn cell size %s (x direction)' % str(cell_x_size))
-                    cell_y_size = geoInfo[4]
-                    screen_logger.info('\tRow cell size %s (y direction)' % str(cell_y_size))
-                    
-                    x = col
-                    y = row
-                    upper_left  = rc.transform * (x, y) 
-                    screen_logger.info('\tCell upper_left  %s' %  str(upper_left))
-                    
-                    x = col + 1
-                    y = row
-                    upper_right  = rc.transform * (x, y)
-                    screen_logger.info('\tCell upper_right %s' % str(upper_right))
-                    
-                    x = col + 1
-                    y = row + 1
-                    lower_right = rc.transform * (x, y)
-                    screen_logger.info('\tCell lower_right %s' %  str(lower_right))
-                    
-                    x = col
-                    y = row + 1
-                    lower_left  = rc.transform * (x, y)
-                    screen_logger.info('\tCell lower_left  %s' %  str(lower_left))
-                    
-                    cell = [ upper_left, upper_right, lower_right, lower_left]
-                    #screen_logger.info('\tCell %s' %  str(cell))
-
-                    # Computing row/col
-                    #
-                    rowEst = abs(origin_y - float(y_coordinate)) / cell_y_size
-                    colEst = abs(origin_x - float(x_coordinate)) / cell_x_size
-                    screen_logger.info('\tEstimated Raster row %s col %s' % (str(rowEst), str(colEst)))
-
-                    py, px = rc.index(float(x_coordinate), float(y_coordinate))
-                    screen_logger.info('\tPixel location x %s y %s' % (str(px), str(py)))
-
-                screen_logger.info('\nProcessing raster %s' % raster)
-
-                noData = rc.nodata
-                screen_logger.info('\tnoData %s' % str(noData))
-
-                # Raster cell value
-                #
-                rasterData = rc.read(1, masked=True)
-
-                rasterValue = rasterData[abs(row)][abs(col)]
-                if str(rasterValue) != '--':
-
-                    rasterList.append({"unit": '%s' % raster, "top_elev": '%s' % rasterValue})
-                    
-                else:
-                    rasterValue = 'null'                    
-                screen_logger.info('\tRaster cell value %s' % str(rasterValue))
-
-        except:
-            errorMessage('Error: Opening and reading raster %s' % rasterFile)
-
-    screen_logger.info('\nDone reading rasters')
-
-    # Output raster information
-    #
-    landSurface = None
-    if len(rasterList) > 0:
-    
-        for i in range(len(rasterList)):
-
-            top_elev = float(rasterList[i]['top_elev'])
-
-            if landSurface is None:
-                landSurface = top_elev
- 
-            top_depth = landSurface - top_elev
-            rasterList[i]['top_depth'] = top_depth
-               
-            j = i + 1
-            if j <= len(rasterList) - 1:
-                bot_elev = float(rasterList[j]['top_elev'])
-                rasterList[i]['top_elev'] = top_elev
-                rasterList[i]['bot_elev'] = bot_elev
-                rasterList[i]['bot_depth'] = landSurface - bot_elev
-                rasterList[i]['thickness'] = top_elev - bot_elev
-                
-            else:
-                rasterList[i]['top_elev'] = top_elev
-                rasterList[i]['bot_elev'] = None
-                rasterList[i]['bot_depth'] = None
-                rasterList[i]['thickness'] = None
+            geojson = json.loads(postBody)
+        except ValueError:
+            raise FrameworkError('Provide a GeoJSON object of point locations')
 
-    screen_logger.info('Done with cell information\n')
+        pointsD = {'ids': [], 'x_coordinates': [], 'y_coordinates': [], 'crs': longlatCrs}
+
+        if geojson.get('type') == 'FeatureCollection':
+            featuresL = geojson.get('features', [])
+        elif geojson.get('type') == 'Feature':
+            featuresL = [geojson]
+        else:
+            featuresL = [{'type': 'Feature', 'geometry': geojson, 'properties': {}}]
+
+        if not isinstance(featuresL, list):
+            raise FrameworkError('Provide a GeoJSON object of point locations')
+
+        for i, feature in enumerate(featuresL):
+            for (site_id, x_coordinate, y_coordinate) in featurePoints(feature, i + 1):
+                pointsD['ids'].append(site_id)
+                pointsD['x_coordinates'].append(x_coordinate)
+                pointsD['y_coordinates'].append(y_coordinate)
+
+    # CSV with x_coordinate,y_coordinate or longitude,latitude columns
+    #
+    else:
+        reader = csv.DictReader(postBody.splitlines())
+
+        (x_column, y_column, id_column, points_crs) = csvColumns(reader.fieldnames)
+
+        pointsD = {'ids': [], 'x_coordinates': [], 'y_coordinates': [], 'crs': points_crs}
+
+        # Rows are numbered as lines of the file, the header is line 1
+        #
+        for line, record in enumerate(reader, start=2):
+            if record[x_column] is None or record[y_column] is None:
+                raise FrameworkError('Provide %s and %s values on CSV line %d' % (x_column, y_column, line))
+
+            pointsD['ids'].append(record[id_column] if id_column is not None else None)
+            pointsD['x_coordinates'].append(parseNumber(record[x_column].strip(), '%s on CSV line %d' % (x_column, line)))
+            pointsD['y_coordinates'].append(parseNumber(record[y_column].strip(), '%s on CSV line %d' % (y_column, line)))
+
+    if len(pointsD['ids']) < 1:
+        raise FrameworkError('Provide one or more locations')
+
+    screen_logger.info('\nNumber of locations %d' % len(pointsD['ids']))
+
+    return pointsD
+
+# =============================================================================
+def featurePoints(feature, number):
+
+    # Locations of a GeoJSON Point or MultiPoint feature
+    #
+    if not isinstance(feature, dict):
+        raise FrameworkError('Provide a GeoJSON Point or MultiPoint for feature %d' % number)
+
+    geometry   = feature.get('geometry') or {}
+    properties = feature.get('properties') or {}
+    site_id    = feature.get('id', properties.get('id', properties.get('site_no')))
+
+    if not isinstance(geometry, dict) or geometry.get('type') not in ['Point', 'MultiPoint']:
+        raise FrameworkError('Provide GeoJSON Point or MultiPoint locations for feature %d' % number)
+
+    coordinatesL = geometry.get('coordinates')
+    if geometry['type'] == 'Point':
+        coordinatesL = [coordinatesL]
+
+    if not isinstance(coordinatesL, list) or len(coordinatesL) < 1:
+        raise FrameworkError('Provide the coordinates of feature %d' % number)
+
+    pointsL = []
+    for coordinates in coordinatesL:
+        if not isinstance(coordinates, list) or len(coordinates) < 2:
+            raise FrameworkError('Provide the longitude and latitude of feature %d' % number)
+
+        pointsL.append((site_id,
+                        parseNumber(str(coordinates[0]), 'longitude of feature %d' % number),
+                        parseNumber(str(coordinates[1]), 'latitude of feature %d' % number)))
+
+    return pointsL
+
+# =============================================================================
+def csvColumns(fieldnames):
+
+    # Coordinate and site columns of a CSV header
+    #
+    columns = dict([(column.strip().lower(), column) for column in (fieldnames or [])])
+
+    if 'x_coordinate' in columns and 'y_coordinate' in columns:
+        (x_column, y_column) = (columns['x_coordinate'], columns['y_coordinate'])
+        points_crs = None
+    elif 'longitude' in columns and 'latitude' in columns:
+        (x_column, y_column) = (columns['longitude'], columns['latitude'])
+        points_crs = longlatCrs
+    else:
+        raise FrameworkError('Provide CSV columns x_coordinate and y_coordinate or longitude and latitude')
+
+    id_column = None
+    for column in ['id', 'site_id', 'site_no']:
+        if column in columns:
+            id_column = columns[column]
+            break
+
+    return (x_column, y_column, id_column, points_crs)
+
+# =============================================================================
+@timed('sample')
+def buildCellLog(layers, x_coordinate, y_coordinate):
+
+    # Determine row and column from coordinates
+    #
+    (rows, cols) = rowCol(layers, [x_coordinate], [y_coordinate])
+    row          = int(rows[0])
+    col          = int(cols[0])
+    screen_logger.info('\tRaster row %s col %s' % (str(row), str(col)))
+
+    # Check location within raster
+    #
+    if not insideLayers(layers, row, col):
+        raise FrameworkError('Error: location (%s, %s) is outside of raster' % (str(x_coordinate), str(y_coordinate)))
+
+    if not insideStudyArea(layers, [row], [col])[0]:
+        raise FrameworkError('Error: location (%s, %s) is outside of the study area' % (str(x_coordinate), str(y_coordinate)))
+
+    # Well log already computed for the cell
+    #
+    key        = cacheKey('cell_log', layers, [row, col])
+    cachedText = cacheGet(key)
+    if cachedText is not None:
+        return json.loads(cachedText)
+
+    # Bounding box of cell
+    #
+    rasterAffine = layers['transform']
+    upper_left   = rasterAffine * (col, row)
+    lower_right  = rasterAffine * (col + 1, row + 1)
+    screen_logger.info('\tCell upper_left  %s lower_right %s' % (str(upper_left), str(lower_right)))
+
+    # Raster cell values, only the window (block) holding the cell is read
+    #
+    values  = readCells(layers, [row], [col])
+    derived = readDerived(layers, [row], [col], values)
+
+    rasterList = cellLog(layers['rasters'], derived, 0)
+    cachePut(key, layers, json.dumps(rasterList))
+
+    return rasterList
+
+# =============================================================================
+def cellLog(rasters, derived, i):
+
+    # Units with a raster cell value, the depths below land surface and the
+    #  bottom (next unit below holding a value) are taken from the derived
+    #  layers of the cell
+    #
+    tops      = derived['tops'][:, i]
+    depth     = derived['depth'][:, i]
+    thickness = derived['thickness'][:, i]
+    below     = derived['below'][:, i]
+
+    rasterList = []
+    for k, raster in enumerate(rasters):
+
+        screen_logger.debug('\tRaster %s cell value %s' % (raster, str(tops[k])))
+        if np.isnan(tops[k]):
+            continue
+
+        rasterRecord = {
+            'unit'      : '%s' % raster,
+            'top_elev'  : float(tops[k]),
+            'top_depth' : float(depth[k]),
+            'bot_elev'  : None,
+            'bot_depth' : None,
+            'thickness' : None
+        }
+
+        j = below[k]
+        if j < len(rasters):
+            rasterRecord['bot_elev']  = float(tops[j])
+            rasterRecord['bot_depth'] = float(depth[j])
+            rasterRecord['thickness'] = float(thickness[k])
+
+        rasterList.append(rasterRecord)
+
+    return rasterList
+
+# =============================================================================
+@timed('sample')
+def buildCellLogs(layers, pointsD):
+
+    x_coordinates = np.asarray(pointsD['x_coordinates'], dtype=np.float64)
+    y_coordinates = np.asarray(pointsD['y_coordinates'], dtype=np.float64)
+
+    # Project locations to the raster coordinate projection in one call
+    #
+    if pointsD['crs'] is not None:
+        (x_coordinates, y_coordinates) = transformCoordinates(pointsD['crs'], layers['crs'], x_coordinates, y_coordinates)
+
+    # Determine rows and columns for all locations
+    #
+    (rows, cols) = rowCol(layers, x_coordinates, y_coordinates)
+    inRasters    = insideLayers(layers, rows, cols)
+    inside       = insideStudyArea(layers, rows, cols)
+
+    # Raster cell values for all locations inside the rasters, one lookup per layer
+    #
+    values  = readCells(layers, rows[inside], cols[inside])
+    derived = readDerived(layers, rows[inside], cols[inside], values)
+    column  = np.cumsum(inside) - 1
+
+    cellLogs = []
+    for i in range(len(rows)):
+
+        cellRecord = {
+            'id'           : pointsD['ids'][i],
+            'x_coordinate' : float(x_coordinates[i]),
+            'y_coordinate' : float(y_coordinates[i]),
+            'row'          : int(rows[i]),
+            'column'       : int(cols[i])
+        }
+
+        if inside[i]:
+            cellRecord['cell_log'] = cellLog(layers['rasters'], derived, column[i])
+        else:
+            cellRecord['cell_log'] = []
+            cellRecord['message']  = 'Error: location is outside of raster'
+            if inRasters[i]:
+                cellRecord['message'] = 'Error: location is outside of the study area'
+
+        cellLogs.append(cellRecord)
+
+    screen_logger.info('Done with %d cell locations\n' % len(cellLogs))
+
+    return cellLogs
+
+# =============================================================================
+@timed('serialize')
+def cellLogsJson(cellLogs):
 
     # Begin JSON format
     #
     jsonL = []
     jsonL.append('{')
     jsonL.append('  "status"        : "%s",' % "success")
-    
+
+    jsonL.append('  "cell_logs" : ')
+    jsonL.append('             %s' % json.dumps(cellLogs))
+    jsonL.append('}')
+
+    return '\n'.join(jsonL)
+
+# =============================================================================
+@timed('serialize')
+def cellLogJson(rasterList):
+
+    # Begin JSON format
+    #
+    jsonL = []
+    jsonL.append('{')
+    jsonL.append('  "status"        : "%s",' % "success")
+
     jsonL.append('  "cell_log" : ')
     jsonL.append('             %s' % json.dumps(rasterList))
     jsonL.append('}')
-        
-    print('Content-type: application/json\n')
-    print('\n'.join(jsonL))
-    
-else:
-
-    usage_message = ", ".join([
-    'Provide a longitude value',
-    'Provide a latitude value',
-    'Provide a x coordinate in the raster coordinate projection',
-    'Provide a y coordinate in the raster coordinate projection',
-    #'Provide a path to directory containing the set of rasters',
-    'Provide a set of rasters from land surface to bedrock (descending order)'
-    ])
-    errorMessage(usage_message)
-
-sys.exit()
+
+    return '\n'.join(jsonL)
+
+# =============================================================================
+def queryTag(queryString, layersVersion=None):
+
+    (rastersL, myArgs, pointsD) = parseQuery(queryString)
+    myFormat                    = outputFormat(queryString, outputFormats)
+
+    # Version of the raster set, the resident service hands over the version
+    #  of the layers it has loaded
+    #
+    if layersVersion is None:
+        version = rasterSetVersion(rasterPaths(rastersL))
+    else:
+        version = layersVersion(rastersL)
+
+    # Canonical location, x and y coordinates take the place of longitude
+    #  and latitude when both are given
+    #
+    if pointsD is not None:
+        parts = [pointsD['ids'], pointsD['x_coordinates'], pointsD['y_coordinates'], pointsD['crs']]
+    elif 'x_coordinate' in myArgs:
+        parts = [myArgs['x_coordinate'], myArgs['y_coordinate']]
+    else:
+        parts = [longlatCrs, myArgs['longitude'], myArgs['latitude']]
+
+    return entityTag('cell_log', rastersL, version, [parts, myFormat])
+
+# =============================================================================
+def processQuery(queryString, loadLayers=None, postBody=None):
+
+    (rastersL, myArgs, pointsD) = parseQuery(queryString, postBody)
+    myFormat                    = outputFormat(queryString, outputFormats)
+
+    # Open rasters, the resident service hands over layers already loaded
+    #
+    if loadLayers is None:
+        layers = openLayers(rastersL)
+    else:
+        layers = loadLayers(rastersL)
+
+    # Batch of locations
+    #
+    if pointsD is not None:
+        jsonText = cellLogsJson(buildCellLogs(layers, pointsD))
+        if myFormat == 'compact':
+            jsonText = compactJson(jsonText)
+
+        return jsonText
+
+    # Project longitude and latitude when no x and y coordinates are given
+    #
+    if 'x_coordinate' in myArgs:
+        (x_coordinate, y_coordinate) = (myArgs['x_coordinate'], myArgs['y_coordinate'])
+    else:
+        (x_coordinates, y_coordinates) = transformCoordinates(longlatCrs, layers['crs'], [myArgs['longitude']], [myArgs['latitude']])
+        (x_coordinate, y_coordinate)   = (float(x_coordinates[0]), float(y_coordinates[0]))
+        screen_logger.info('\tProjected coordinates %s %s' % (str(x_coordinate), str(y_coordinate)))
+
+    rasterList = buildCellLog(layers, x_coordinate, y_coordinate)
+    screen_logger.info('Done with cell information\n')
+
+    jsonText = cellLogJson(rasterList)
+    if myFormat == 'compact':
+        jsonText = compactJson(jsonText)
+
+    return jsonText
+
+# =============================================================================
+def readPointChunks(inputFile, chunkSize, points_crs=None):
+
+    # Locations read a chunk at a time, GeoJSON Lines and CSV files are
+    #  streamed while a GeoJSON file is read whole
+    #
+    (root, suffix) = os.path.splitext(inputFile.lower())
+
+    def newChunk(chunk_crs):
+        return {'ids': [], 'x_coordinates': [], 'y_coordinates': [], 'crs': chunk_crs}
+
+    # Features without usable locations are skipped
+    #
+    def featureRecords(featuresL):
+        for i, feature in enumerate(featuresL):
+            try:
+                if isinstance(feature, str):
+                    feature = json.loads(feature)
+                if isinstance(feature, dict) and feature.get('type') in ['Point', 'MultiPoint']:
+                    feature = {'type': 'Feature', 'geometry': feature, 'properties': {}}
+                for point in featurePoints(feature, i + 1):
+                    yield point
+            except (FrameworkError, ValueError) as e:
+                screen_logger.warning('Feature %d skipped: %s' % (i + 1, str(e)))
+
+    with open(inputFile, 'r', newline='') as fh:
+
+        if suffix in ['.geojson', '.json']:
+            geojson = json.load(fh)
+            if geojson.get('type') == 'FeatureCollection':
+                featuresL = geojson.get('features', [])
+            elif geojson.get('type') == 'Feature':
+                featuresL = [geojson]
+            else:
+                featuresL = [{'type': 'Feature', 'geometry': geojson, 'properties': {}}]
+
+            records   = featureRecords(featuresL)
+            chunk_crs = longlatCrs
+
+        elif suffix in ['.geojsonl', '.geojsons', '.jsonl', '.ndjson']:
+            records = featureRecords(line for line in fh if len(line.strip()) > 0)
+            chunk_crs = longlatCrs
+
+        else:
+            reader = csv.DictReader(fh)
+            (x_column, y_column, id_column, chunk_crs) = csvColumns(reader.fieldnames)
+            if chunk_crs is None:
+                chunk_crs = points_crs
+
+            def csvRecords():
+                for record in reader:
+                    try:
+                        if record[x_column] is None or record[y_column] is None:
+                            raise FrameworkError('Provide %s and %s values' % (x_column, y_column))
+                        yield (record[id_column] if id_column is not None else None,
+                               parseNumber(record[x_column].strip(), x_column),
+                               parseNumber(record[y_column].strip(), y_column))
+                    except FrameworkError as e:
+                        screen_logger.warning('Line %d skipped: %s' % (reader.line_num, str(e)))
+            records = csvRecords()
+
+        pointsD = newChunk(chunk_crs)
+        for (site_id, x_coordinate, y_coordinate) in records:
+            pointsD['ids'].append(site_id)
+            pointsD['x_coordinates'].append(x_coordinate)
+            pointsD['y_coordinates'].append(y_coordinate)
+
+            if len(pointsD['ids']) >= chunkSize:
+                yield pointsD
+                pointsD = newChunk(chunk_crs)
+
+        if len(pointsD['ids']) > 0:
+            yield pointsD
+
+# =============================================================================
+def initWorker(rastersL):
+
+    # Map the decoded layer stack shared by the worker processes
+    #
+    screen_logger.setLevel(logging.WARNING)
+    workerLayers['layers'] = sharedLayers(rastersL)
+
+# =============================================================================
+def bulkChunk(pointsD):
+
+    return buildCellLogs(workerLayers['layers'], pointsD)
+
+# =============================================================================
+def mapChunks(pool, chunks, maxPending):
+
+    # Well logs of each chunk in input order, only a few chunks are held at a
+    #  time so memory stays constant however long the input
+    #
+    pendingL = []
+    for pointsD in chunks:
+        pendingL.append(pool.apply_async(bulkChunk, (pointsD,)))
+
+        if len(pendingL) >= maxPending:
+            yield pendingL.pop(0).get()
+
+    while len(pendingL) > 0:
+        yield pendingL.pop(0).get()
+
+# =============================================================================
+def logRows(cellLogs):
+
+    # One row for each unit of each location, a location without units keeps
+    #  one row holding the message
+    #
+    for cellRecord in cellLogs:
+
+        location = dict([(column, cellRecord[column]) for column in ['id', 'x_coordinate', 'y_coordinate', 'row', 'column']])
+        location['id'] = None if location['id'] is None else str(location['id'])
+
+        if len(cellRecord['cell_log']) < 1:
+            rowD = dict([(column, None) for column in bulkColumns])
+            rowD.update(location)
+            rowD['message'] = cellRecord.get('message')
+            yield rowD
+
+        for unitD in cellRecord['cell_log']:
+            rowD = dict(location)
+            rowD.update(unitD)
+            rowD['message'] = None
+            yield rowD
+
+# =============================================================================
+def openWriter(outputFile, bulkFormat):
+
+    writerD = {'format': bulkFormat, 'file': outputFile}
+
+    if bulkFormat == 'parquet':
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise FrameworkError('Error: Parquet output requires the pyarrow module')
+
+        schema = pyarrow.schema([
+            ('id', pyarrow.string()), ('x_coordinate', pyarrow.float64()), ('y_coordinate', pyarrow.float64()),
+            ('row', pyarrow.int64()), ('column', pyarrow.int64()), ('unit', pyarrow.string()),
+            ('top_elev', pyarrow.float64()), ('top_depth', pyarrow.float64()), ('bot_elev', pyarrow.float64()),
+            ('bot_depth', pyarrow.float64()), ('thickness', pyarrow.float64()), ('message', pyarrow.string())
+        ])
+        writerD['pyarrow'] = pyarrow
+        writerD['schema']  = schema
+        writerD['writer']  = pyarrow.parquet.ParquetWriter(outputFile, schema)
+        return writerD
+
+    if outputFile == '-':
+        writerD['fh'] = sys.stdout
+    else:
+        writerD['fh'] = open(outputFile, 'w', newline='')
+
+    if bulkFormat == 'csv':
+        writerD['writer'] = csv.DictWriter(writerD['fh'], fieldnames=bulkColumns)
+        writerD['writer'].writeheader()
+
+    return writerD
+
+# =============================================================================
+def writeCellLogs(writerD, cellLogs):
+
+    if writerD['format'] == 'jsonl':
+        for cellRecord in cellLogs:
+            writerD['fh'].write('%s\n' % json.dumps(cellRecord))
+
+    elif writerD['format'] == 'csv':
+        writerD['writer'].writerows(logRows(cellLogs))
+
+    else:
+        rowsL    = list(logRows(cellLogs))
+        columnsD = dict([(column, [rowD[column] for rowD in rowsL]) for column in bulkColumns])
+        writerD['writer'].write_table(writerD['pyarrow'].table(columnsD, schema=writerD['schema']))
+
+# =============================================================================
+def closeWriter(writerD):
+
+    if writerD['format'] == 'parquet':
+        writerD['writer'].close()
+    elif writerD['fh'] is not sys.stdout:
+        writerD['fh'].close()
+    else:
+        writerD['fh'].flush()
+
+# =============================================================================
+def bulkCellLogs(rastersL, inputFile, outputFile, bulkFormat, points_crs=None, workers=1, chunkSize=10000):
+
+    chunks  = readPointChunks(inputFile, chunkSize, points_crs)
+    writerD = openWriter(outputFile, bulkFormat)
+    nlocations = 0
+
+    try:
+        # Work shared across worker processes, each mapping the rasters
+        #
+        if workers > 1:
+            import multiprocessing
+
+            with multiprocessing.Pool(workers, initializer=initWorker, initargs=(rastersL,)) as pool:
+                for cellLogs in mapChunks(pool, chunks, 2 * workers):
+                    writeCellLogs(writerD, cellLogs)
+                    nlocations += len(cellLogs)
+
+        else:
+            workerLayers['layers'] = openLayers(rastersL, decode=True)
+            for pointsD in chunks:
+                cellLogs = bulkChunk(pointsD)
+                writeCellLogs(writerD, cellLogs)
+                nlocations += len(cellLogs)
+
+    finally:
+        closeWriter(writerD)
+
+    return nlocations
+
+# =============================================================================
+def commandLine(argv):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=program, usage=usage_message)
+    parser.add_argument('--usage', action='store_true')
+    parser.add_argument('--longitude', default=None)
+    parser.add_argument('--latitude', default=None)
+    parser.add_argument('--x', default=None)
+    parser.add_argument('--y', default=None)
+    parser.add_argument('--raster', '--rasters', dest='raster', default=None)
+    parser.add_argument('--input', default=None)
+    parser.add_argument('--output', default='-')
+    parser.add_argument('--format', choices=sorted(set(bulkFormats.values())), default=None)
+    parser.add_argument('--crs', default=None)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    if args.usage:
+        print(usage_message)
+        sys.exit()
+
+    if args.raster is None:
+        raise FrameworkError('Provide a set of rasters from land surface to bedrock (descending order)')
+
+    # Bulk run over a file of locations
+    #
+    if args.input is not None:
+        rastersL   = parseRasters(args.raster)
+        (root, suffix) = os.path.splitext(args.output.lower())
+        bulkFormat = args.format or bulkFormats.get(suffix, 'jsonl')
+
+        if not os.path.isfile(args.input):
+            raise FrameworkError('Error: Input file %s does not exist' % args.input)
+
+        # Rasters are checked before the workers are started
+        #
+        openLayers(rastersL)
+
+        nlocations = bulkCellLogs(rastersL, args.input, args.output, bulkFormat, args.crs, max(1, args.workers), max(1, args.chunk))
+        screen_logger.info('Done with %d locations written to %s' % (nlocations, args.output))
+        return
+
+    # Single location as the CGI request
+    #
+    queryL = ['rasters=%s' % quote(args.raster)]
+    for (myParm, myArg) in [('longitude', args.longitude), ('latitude', args.latitude), ('x_coordinate', args.x), ('y_coordinate', args.y)]:
+        if myArg is not None:
+            queryL.append('%s=%s' % (myParm, quote(myArg)))
+
+    print(processQuery('&'.join(queryL)))
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    # Parse the Query String
+    #
+    HardWired = None
+    #HardWired = 1
+
+    if HardWired is not None:
+        os.environ['QUERY_STRING'] = 'longitude=-120.81387691535224&latitude=46.423308095146126&x_coordinate=1561263.8314058625&y_coordinate=397630.901255142&color=framework_color_map.txt&rasters=tiffs/obtop.tif tiffs/smtop.tif tiffs/wntop.tif tiffs/grtop.tif tiffs/pmtop.tif'
+        os.environ['QUERY_STRING'] = 'longitude=-120.81387691535224&latitude=46.423308095146126&x_coordinate=1561263.8314058625&y_coordinate=397630.901255142&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
+        #os.environ['QUERY_STRING'] = 'longitude=-119.48181152343751&latitude=46.09609080214316&x_coordinate=1898715.1435567&y_coordinate=279817.25493153144&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
+        #os.environ['QUERY_STRING'] = 'longitude=-119.52575683593751&latitude=45.321254361171476&x_coordinate=1891057.3624456269&y_coordinate=-2857.0708499001557&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
+        os.environ['QUERY_STRING'] = 'longitude=-119.07531738281251&latitude=46.7248003746672&x_coordinate=1997685.8509084934&y_coordinate=510646.72156364744&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
+        os.environ['QUERY_STRING'] = 'longitude=-118.32824707031251&latitude=46.06166996192512&x_coordinate=2191647.6286216783&y_coordinate=273187.42898256733&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
+        os.environ['QUERY_STRING'] = 'longitude=-117.58721927180888&latitude=46.20239286768872&x_coordinate=2377764.965356479&y_coordinate=330530.0168397045&color=framework_color_map.txt&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
+
+    # Command line run, a single location or a bulk run over a file of
+    #  locations
+    #
+    if 'GATEWAY_INTERFACE' not in os.environ and len(sys.argv) > 1:
+        try:
+            commandLine(sys.argv[1:])
+        except FrameworkError as e:
+            screen_logger.error(str(e))
+            sys.exit(1)
+        sys.exit()
+
+    # Check URL
+    #
+    QUERY_STRING = ''
+
+    if 'QUERY_STRING' in os.environ:
+        QUERY_STRING = str(os.environ['QUERY_STRING'])
+
+    screen_logger.debug('\nQUERY_STRING: %s' % QUERY_STRING)
+
+    # Batch of locations posted as GeoJSON or CSV
+    #
+    postBody = None
+    etag     = None
+
+    startRequest()
+
+    try:
+        if os.environ.get('REQUEST_METHOD', '') == 'POST':
+            postBody = readPostBody(sys.stdin.buffer, os.environ.get('CONTENT_LENGTH', ''))
+        else:
+            etag = queryTag(QUERY_STRING)
+
+            # Client already holds this response
+            #
+            if printNotModified(etag, os.environ.get('HTTP_IF_NONE_MATCH'), os.environ.get('HTTP_ACCEPT_ENCODING')):
+                finishRequest('framework_cell_log.py', 'not_modified')
+                sys.exit()
+
+        jsonText = processQuery(QUERY_STRING, postBody=postBody)
+    except FrameworkError as e:
+        errorMessage(str(e))
+
+    # Stage timings in a Server-Timing header, and in the response when asked
+    #  for since it is then no longer cacheable
+    #
+    timingsD = finishRequest('framework_cell_log.py', 'success')
+    if timingsRequested(QUERY_STRING):
+        jsonText = timingsJson(jsonText, timingsD)
+        etag     = None
+
+    printResponse(jsonText, etag, os.environ.get('HTTP_ACCEPT_ENCODING'), [('Server-Timing', serverTiming(timingsD))])
+
+    sys.exit()
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_fence
+# Purpose:  This script produces a fence diagram of subsurface layers, a set
+#           of cross sections (panels) along transects or a network of
+#           connected polylines. The rasters are opened once for all panels,
+#           the panels are computed in parallel and each point where panels
+#           cross is sampled once so the panels line up exactly.
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+###############################################################################
+
+import os, sys
+import math
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import json
+
+# Set up logging
+#
+import logging
+
+# -- Set logging file
+#
+# Create screen handler
+#
+screen_logger = logging.getLogger()
+if len(screen_logger.handlers) < 1:
+    formatter     = logging.Formatter(fmt='%(message)s')
+    console       = logging.StreamHandler()
+    console.setFormatter(formatter)
+    screen_logger.addHandler(console)
+screen_logger.setLevel(logging.INFO)
+screen_logger.propagate = False
+
+# Import modules for CGI handling
+#
+from urllib.parse import parse_qs
+
+# Shared raster layer handling
+#
+from framework_layers import FrameworkError, parseRasters, openLayers, readCells
+from framework_layers import rasterPaths, rasterSetVersion, entityTag, outputFormat, compactJson, printResponse, printNotModified
+
+# Cross section panels
+#
+from framework_xsec import parsePoints, parseBuckets, checkPoints, transectSamples, sampledSection, samplerName
+from framework_xsec import crossSectionJson, columnarJson, outputFormats
+
+# Shared result cache
+#
+from framework_cache import cacheKey, cacheGet, cachePut
+
+# Stage timings and counters of a request
+#
+from framework_metrics import timed, startRequest, finishRequest, timingsRequested, timingsJson, serverTiming
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+program      = "USGS Raster Fence Diagram Script"
+version      = "1.01"
+version_date = "October 18, 2026"
+usage_message = """
+Usage: framework_fence.py
+                [--help]
+                [--usage]
+                [--points                  Provide two or more sets of x and y coordinates for each panel, panels separated by ; or given as repeated points]
+                [--rasters                 Provide a set of rasters from land surface to bedrock (descending order)]
+                [--format                  Provide an output format of json, compact, columnar or binary]
+                [--max_samples             Provide the largest number of samples returned for each panel]
+                [--width                   Provide the chart width in pixels to return one bucket (up to 2 samples per unit plus 2) per pixel]
+"""
+
+# =============================================================================
+def errorMessage(error_message):
+
+    print("Content-type: application/json")
+    print("Cache-Control: no-store\n")
+    print('{')
+    print(' "status"        : "failed",')
+    print(' "message": "%s" ' % error_message)
+    print('}')
+
+    finishRequest('framework_fence.py', 'failed')
+
+    sys.exit()
+
+# =============================================================================
+@timed('parse')
+def parseQuery(queryString):
+
+    if len(queryString) < 1:
+        usage_message = ", ".join([
+        'Provide two or more sets of x and y coordinates for each panel',
+        'Provide a set of rasters from land surface to bedrock (descending order)'
+        ])
+        raise FrameworkError(usage_message)
+
+    queryStringD = parse_qs(queryString, encoding='utf-8')
+    screen_logger.info('\nqueryStringD %s' % str(queryStringD))
+
+    if 'rasters' not in queryStringD:
+        raise FrameworkError('%s' % 'Provide a set of rasters from land surface to bedrock (descending order)')
+
+    if 'points' not in queryStringD:
+        raise FrameworkError('%s' % 'Provide two or more sets of x and y coordinates for each panel')
+
+    # Check rasters
+    #
+    rastersL = parseRasters(queryStringD['rasters'][0])
+
+    # Panels from repeated points arguments or separated by semicolons
+    #
+    panelsL = []
+    for pointsText in queryStringD['points']:
+        for panelText in pointsText.split(';'):
+            if len(panelText.strip()) < 1:
+                continue
+
+            pointsL = parsePoints(panelText.strip())
+            if len(pointsL) < 2:
+                raise FrameworkError('Provide two or more sets of x and y coordinates for panel %d' % (len(panelsL) + 1))
+            panelsL.append(pointsL)
+
+    if len(panelsL) < 1:
+        raise FrameworkError('%s' % 'Provide two or more sets of x and y coordinates for each panel')
+
+    return (rastersL, panelsL)
+
+# =============================================================================
+def panelSegments(panelsL):
+
+    # Segments of all panels with the distance along the panel to the start
+    #  of each segment
+    #
+    segmentsL = []
+    for k, pointsL in enumerate(panelsL):
+        distance = 0.0
+        for (x1, y1), (x2, y2) in zip(pointsL[:-1], pointsL[1:]):
+            length = math.hypot(x2 - x1, y2 - y1)
+            segmentsL.append((k, x1, y1, x2, y2, distance, length))
+            distance += length
+
+    return np.array(segmentsL, dtype=np.float64).reshape(-1, 7)
+
+# =============================================================================
+def panelCrossings(panelsL):
+
+    # Points where segments of different panels cross or touch, all pairs of
+    #  segments at once
+    #
+    segments = panelSegments(panelsL)
+    (panel, x1, y1, x2, y2, start, length) = segments.T
+
+    (dx, dy) = (x2 - x1, y2 - y1)
+    denom    = np.outer(dx, dy) - np.outer(dy, dx)
+    (ex, ey) = (x1[None, :] - x1[:, None], y1[None, :] - y1[:, None])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (ex * dy[None, :] - ey * dx[None, :]) / denom
+        u = (ex * dy[:, None] - ey * dx[:, None]) / denom
+
+    eps     = 1.0e-9
+    crosses = (np.abs(denom) > eps) & (t >= -eps) & (t <= 1 + eps) & (u >= -eps) & (u <= 1 + eps)
+    crosses &= panel[:, None] < panel[None, :]
+
+    # Crossings at the same point are merged, each panel is listed once at
+    #  its distance along the panel
+    #
+    crossingsD = {}
+    for (i, j) in zip(*np.nonzero(crosses)):
+        tij   = min(max(t[i, j], 0.0), 1.0)
+        point = (round(x1[i] + tij * dx[i], 2), round(y1[i] + tij * dy[i], 2))
+
+        crossing = crossingsD.setdefault(point, {})
+        for (k, d) in [(i, start[i] + tij * length[i]), (j, start[j] + min(max(u[i, j], 0.0), 1.0) * length[j])]:
+            crossing.setdefault(int(panel[k]), d)
+
+    crossingsL = []
+    for point in sorted(crossingsD):
+        crossingsL.append({'point': list(point), 'panels': sorted(crossingsD[point].items())})
+
+    screen_logger.info('\nNumber of panel crossings %d' % len(crossingsL))
+
+    return crossingsL
+
+# =============================================================================
+def crossingCell(layers, point):
+
+    x_left, y_lower, x_right, y_upper = layers['bounds']
+
+    row = int( ( y_upper - point[1] ) / abs( layers['y_cell_size'] ) )
+    col = int( abs( x_left - point[0] ) / layers['x_cell_size'] )
+
+    return (min(max(row, 0), layers['nrows'] - 1), min(max(col, 0), layers['ncols'] - 1))
+
+# =============================================================================
+def panelSamples(layers, pointsL, k, crossingsL):
+
+    # Samples of the panel with one sample at each crossing, placed in order
+    #  so the cell holding the crossing ends there
+    #
+    samples = transectSamples(layers, pointsL)
+
+    crossRows = []
+    crossCols = []
+    crossDist = []
+    for crossing in crossingsL:
+        for (panel, distance) in crossing['panels']:
+            if panel == k:
+                (row, col) = crossingCell(layers, crossing['point'])
+                crossRows.append(row)
+                crossCols.append(col)
+                crossDist.append(distance)
+
+    crossDist = np.array(crossDist, dtype=np.float64)
+    order     = np.argsort(crossDist, kind='stable')
+    crossDist = crossDist[order]
+    index     = np.searchsorted(samples['distances'], crossDist)
+
+    samples['rows']      = np.insert(samples['rows'], index, np.array(crossRows, dtype=np.int64)[order])
+    samples['cols']      = np.insert(samples['cols'], index, np.array(crossCols, dtype=np.int64)[order])
+    samples['distances'] = np.insert(samples['distances'], index, crossDist)
+    samples['required']  = crossDist
+
+    return samples
+
+# =============================================================================
+@timed('sample')
+def buildFence(layers, panelsL, nbuckets=None):
+
+    crossingsL = panelCrossings(panelsL)
+    workers    = max(1, min(len(panelsL), os.cpu_count() or 1))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        # Samples of all panels
+        #
+        samplesL = list(executor.map(lambda k: panelSamples(layers, panelsL[k], k, crossingsL), range(len(panelsL))))
+
+        # Cell values of all panels in one read of the rasters
+        #
+        sizes  = [samples['rows'].size for samples in samplesL]
+        rows   = np.concatenate([samples['rows'] for samples in samplesL])
+        cols   = np.concatenate([samples['cols'] for samples in samplesL])
+        values = np.split(readCells(layers, rows, cols), np.cumsum(sizes)[:-1], axis=1)
+
+        # Sections of all panels
+        #
+        sectionsL = list(executor.map(lambda k: sampledSection(layers, panelsL[k], samplesL[k], values[k], nbuckets), range(len(panelsL))))
+
+    for crossing in crossingsL:
+        (crossing['row'], crossing['column']) = crossingCell(layers, crossing['point'])
+
+    return {
+        'panels'        : sectionsL,
+        'crossings'     : crossingsL,
+        'nrows'         : layers['nrows'],
+        'ncols'         : layers['ncols'],
+        'nlays'         : layers['nlays'],
+        'elevation_min' : min([section['elevation_min'] for section in sectionsL]),
+        'elevation_max' : max([section['elevation_max'] for section in sectionsL])
+    }
+
+# =============================================================================
+@timed('serialize')
+def fenceJson(fence, myFormat):
+
+    # Panels in the format of a cross section
+    #
+    panelsL = []
+    for xsec in fence['panels']:
+        if myFormat in ['columnar', 'binary']:
+            panelsL.append(columnarJson(xsec, binary=(myFormat == 'binary')))
+        else:
+            panelsL.append(crossSectionJson(xsec))
+
+    crossingsL = []
+    for crossing in fence['crossings']:
+        crossingsL.append({
+            'easting'  : crossing['point'][0],
+            'northing' : crossing['point'][1],
+            'row'      : crossing['row'],
+            'column'   : crossing['column'],
+            'panels'   : [{'panel': panel + 1, 'distance': round(distance, 3)} for (panel, distance) in crossing['panels']]
+        })
+
+    # Begin JSON format
+    #
+    jsonL = []
+    jsonL.append('{')
+    jsonL.append('  "status"        : "%s",' % "success")
+    jsonL.append('  "npanels"       : %15d,' % len(panelsL))
+    jsonL.append('  "panels" : [')
+    jsonL.append('%s' % ',\n'.join(panelsL))
+    jsonL.append('],')
+    jsonL.append('  "crossings" : %s,' % json.dumps(crossingsL))
+    jsonL.append('  "nrows"         : %15d,' % fence['nrows'])
+    jsonL.append('  "ncols"         : %15d,' % fence['ncols'])
+    jsonL.append('  "nlays"         : %15d,' % fence['nlays'])
+    jsonL.append('  "elevation_min": %15.2f,' % fence['elevation_min'])
+    jsonL.append('  "elevation_max": %15.2f'  % fence['elevation_max'])
+    jsonL.append('}')
+
+    return '\n'.join(jsonL)
+
+# =============================================================================
+def queryTag(queryString, layersVersion=None):
+
+    (rastersL, panelsL) = parseQuery(queryString)
+    myFormat            = outputFormat(queryString, outputFormats)
+    nbuckets            = parseBuckets(queryString, len(rastersL))
+
+    # Version of the raster set, the resident service hands over the version
+    #  of the layers it has loaded
+    #
+    if layersVersion is None:
+        version = rasterSetVersion(rasterPaths(rastersL))
+    else:
+        version = layersVersion(rastersL)
+
+    return entityTag('fence', rastersL, version, [panelsL, myFormat, nbuckets, samplerName])
+
+# =============================================================================
+def processQuery(queryString, loadLayers=None):
+
+    (rastersL, panelsL) = parseQuery(queryString)
+    myFormat            = outputFormat(queryString, outputFormats)
+    nbuckets            = parseBuckets(queryString, len(rastersL))
+
+    # Open rasters once for all panels, the resident service hands over
+    #  layers already loaded
+    #
+    if loadLayers is None:
+        layers = openLayers(rastersL)
+    else:
+        layers = loadLayers(rastersL)
+
+    for pointsL in panelsL:
+        checkPoints(layers, pointsL)
+
+    # Fence diagram already computed for the panels
+    #
+    key      = cacheKey('fence', layers, [panelsL, myFormat if myFormat in ['columnar', 'binary'] else 'json', nbuckets, samplerName])
+    jsonText = cacheGet(key)
+    if jsonText is None:
+
+        fence = buildFence(layers, panelsL, nbuckets)
+
+        try:
+            jsonText = fenceJson(fence, myFormat)
+        except IOError:
+            raise FrameworkError("Error: Cannot create fence diagram")
+
+        cachePut(key, layers, jsonText)
+
+    if myFormat == 'compact':
+        jsonText = compactJson(jsonText)
+
+    return jsonText
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    # Check URL
+    #
+    QUERY_STRING = ''
+
+    if 'QUERY_STRING' in os.environ:
+        QUERY_STRING = str(os.environ['QUERY_STRING'])
+
+    screen_logger.info('\nQUERY_STRING: %s' % QUERY_STRING)
+
+    startRequest()
+
+    try:
+        etag = queryTag(QUERY_STRING)
+
+        # Client already holds this response
+        #
+        if printNotModified(etag, os.environ.get('HTTP_IF_NONE_MATCH'), os.environ.get('HTTP_ACCEPT_ENCODING')):
+            finishRequest('framework_fence.py', 'not_modified')
+            sys.exit()
+
+        jsonText = processQuery(QUERY_STRING)
+    except FrameworkError as e:
+        errorMessage(str(e))
+
+    # Stage timings in a Server-Timing header, and in the response when asked
+    #  for since it is then no longer cacheable
+    #
+    timingsD = finishRequest('framework_fence.py', 'success')
+    if timingsRequested(QUERY_STRING):
+        jsonText = timingsJson(jsonText, timingsD)
+        etag     = None
+
+    printResponse(jsonText, etag, os.environ.get('HTTP_ACCEPT_ENCODING'), [('Server-Timing', serverTiming(timingsD))])
+
+    sys.exit()
@@ -0,0 +1,1080 @@
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_layers
+# Purpose:  This module holds the raster handling shared by the framework
+#           scripts and the resident framework service. The subsurface layers
+#           are represented by one or more rasters that represent the land
+#           surface elevation and the underlying the geologic units or other
+#           subsurface features, all on the same grid.
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+###############################################################################
+
+import os, sys, re
+
+import functools
+import hashlib
+import zlib
+import glob
+import tempfile
+
+import numpy as np
+import rasterio
+import rasterio.transform
+import rasterio.warp
+from rasterio.windows import Window
+from rasterio.enums import Resampling
+from rasterio.coords import BoundingBox
+from rasterio.crs import CRS
+from affine import Affine
+
+import json
+
+# Coordinate transformations are built once per CRS pair with pyproj when it
+#  is installed, otherwise through rasterio (GDAL)
+#
+try:
+    from pyproj import Transformer
+except ImportError:
+    Transformer = None
+
+# Responses are compressed with brotli when it is installed and the client
+#  accepts it, otherwise with gzip
+#
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Worker processes share one decoded layer stack, the first to load a raster
+#  set decodes it while holding a file lock
+#
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from urllib.parse import parse_qs
+
+# Stage timings and counters of a request
+#
+from framework_metrics import timed, countMetric
+
+# Set up logging
+#
+import logging
+
+screen_logger = logging.getLogger()
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+numberRegex = r"^[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?$"
+
+# Stacked layer cube (nlays, nrows, ncols) built by tools/framework_cube.py
+#  and its sidecar holding the grid information, kept beside the rasters
+#
+cubeName = 'framework_cube'
+
+# Layers derived from the cube for every cell, the thickness of each unit,
+#  the depth of its top below land surface and the index of the next layer
+#  below holding a value, built by tools/framework_cube.py --derived
+#
+derivedL = ['thickness', 'depth', 'below']
+
+# Study area mask on the raster grid built by tools/framework_mask.py and its
+#  sidecar, kept beside the rasters
+#
+maskName = 'framework_mask'
+
+# Largest request body accepted for a batch of locations
+#
+maxPostBytes = 64 * 1024 * 1024
+
+# Longitude and latitude coordinate system
+#
+longlatCrs = 'EPSG:4326'
+
+# Directory holding the decoded layer stacks shared by worker processes,
+#  shared memory when the system has it, empty to decode in each process
+#
+sharedDir = os.environ.get('FRAMEWORK_SHARED', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+
+# Coordinate transformations keyed by the CRS pair
+#
+transformersD = {}
+
+# Rasters already warned about their block layout
+#
+layoutWarnedS = set()
+
+# Seconds a response may be reused by browsers and proxies before it is
+#  revalidated with its entity tag
+#
+maxAge = int(os.environ.get('FRAMEWORK_MAX_AGE', 86400))
+
+# Responses shorter than this are sent uncompressed, and compressed
+#  responses are written in chunks of this size
+#
+minCompressBytes = 1024
+chunkBytes       = 64 * 1024
+
+# =============================================================================
+class FrameworkError(Exception):
+
+    # Error reported back to the client as a failed status message
+    #
+    pass
+
+# =============================================================================
+def readLookup(lookupFile):
+
+    # The lookup file is a JavaScript assignment wrapping a JSON object
+    #
+    with open(lookupFile, 'r') as fh:
+        lookupText = fh.read()
+
+    lookupText = lookupText[lookupText.index('{'):lookupText.rindex('}') + 1]
+
+    return json.loads(lookupText)
+
+# =============================================================================
+def parseRasters(rasterText):
+
+    rastersL = re.split(r"[-;,\s]\s*", rasterText)
+    screen_logger.debug('\nRasters: %s' % ' '.join(rastersL))
+
+    if len(rastersL) < 1:
+        raise FrameworkError('%s' % 'Provide a set of rasters from land surface to bedrock (descending order)')
+
+    return rastersL
+
+# =============================================================================
+def parseNumber(myArg, myParm):
+
+    # Real numbers
+    #             regex "^[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?$"
+    #
+    myMatch = bool(re.search(numberRegex, myArg))
+
+    # Argument failed regex
+    #
+    if not myMatch:
+        raise FrameworkError('Provide a numeric value for %s' % myParm)
+
+    return float(myArg)
+
+# =============================================================================
+def readPostBody(stream, contentLength):
+
+    try:
+        length = int(contentLength)
+    except ValueError:
+        raise FrameworkError('Provide the length of the request body')
+
+    if length > maxPostBytes:
+        raise FrameworkError('Error: request body is larger than %d bytes' % maxPostBytes)
+
+    try:
+        return stream.read(length).decode('utf-8')
+    except UnicodeDecodeError:
+        raise FrameworkError('Error: request body is not UTF-8 text')
+
+# =============================================================================
+@timed('open')
+def openLayers(rastersL, decode=False, directory=None):
+
+    # Raster layers in descending order, general information is taken from
+    #  the first raster since all rasters share the same grid
+    #
+    layers = {
+        'rasters'   : [],
+        'files'     : list(rastersL),
+        'paths'     : [],
+        'nodata'    : [],
+        'data'      : None,
+        'quantized' : None,
+        'derived'   : None,
+        'scaled'    : None,
+        'mask'      : None,
+        'nlays'     : len(rastersL)
+    }
+
+    for (rasterFile, rasterPath) in zip(rastersL, rasterPaths(rastersL, directory)):
+
+        # Remove suffix .tif
+        #
+        (root, tif_suffix) = os.path.splitext(rasterFile)
+        (dir, raster)      = os.path.split(root)
+
+        layers['rasters'].append(raster)
+        layers['paths'].append(rasterPath)
+
+    # Version of the raster set when opened
+    #
+    layers['version'] = rasterSetVersion(layers['paths'])
+
+    # Memory-map the stacked layer cube when it is current
+    #
+    if openCube(layers):
+        openMask(layers)
+        return layers
+
+    dataL = []
+    for rasterFile, rasterPath in zip(layers['files'], layers['paths']):
+
+        # Only the first raster is opened unless the bands are decoded
+        #
+        if 'transform' in layers and not decode:
+            break
+
+        try:
+            with rasterio.open(rasterPath) as rc:
+
+                # General information for rasters
+                #
+                if 'transform' not in layers:
+                    setGeneral(layers, rc)
+
+                layers['nodata'].append(rc.nodata)
+
+                # Read raster bands directly to Numpy arrays with nodata as NaN
+                #
+                if decode:
+                    screen_logger.info('\nProcessing raster %s' % rasterFile)
+                    rasterData = rc.read(1, masked=True)
+                    dataL.append(np.ma.filled(rasterData.astype(layers['dtype']), np.nan))
+
+        except Exception:
+            raise FrameworkError('Error: Opening and reading raster %s' % rasterFile)
+
+    if decode:
+        layers['data'] = np.stack(dataL)
+
+    openMask(layers)
+
+    return layers
+
+# =============================================================================
+@timed('open')
+def sharedLayers(rastersL, directory=None):
+
+    # Decoded layer stack shared by worker processes, the first process to
+    #  load the raster set decodes it into a file in shared memory and every
+    #  process maps that file read-only. A current layer cube is already
+    #  mapped and shared
+    #
+    if fcntl is None or not sharedDir:
+        return openLayers(rastersL, decode=True, directory=directory)
+
+    layers = openLayers(rastersL, directory=directory)
+    if layers['data'] is not None:
+        return layers
+
+    (stackFile, lockFile, stalePattern) = sharedFiles(layers)
+
+    with open(lockFile, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.isfile(stackFile):
+                writeStack(layers, stackFile, stalePattern)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    screen_logger.info('\nMemory-mapping shared layer stack %s' % stackFile)
+
+    layers['data'] = np.asarray(np.load(stackFile, mmap_mode='r'))
+
+    return layers
+
+# =============================================================================
+def sharedFiles(layers):
+
+    # Stack named by the raster paths and version, a stack of changed rasters
+    #  replaces the older one
+    #
+    setName = hashlib.sha1(json.dumps([os.path.abspath(rasterPath) for rasterPath in layers['paths']]).encode('utf-8')).hexdigest()[:16]
+    prefix  = os.path.join(sharedDir, 'framework_%s' % setName)
+
+    return ('%s_%s.npy' % (prefix, layers['version'][:16]), '%s.lock' % prefix, '%s_*.npy' % prefix)
+
+# =============================================================================
+def writeStack(layers, stackFile, stalePattern):
+
+    screen_logger.warning('Decoding shared layer stack %s' % stackFile)
+
+    tempFile = '%s.%d.tmp' % (stackFile, os.getpid())
+    stack    = np.lib.format.open_memmap(tempFile, mode='w+', dtype=layers['dtype'], shape=(layers['nlays'], layers['nrows'], layers['ncols']))
+
+    for i, rasterPath in enumerate(layers['paths']):
+        try:
+            with rasterio.open(rasterPath) as rc:
+                rasterData = rc.read(1, masked=True)
+        except Exception:
+            os.remove(tempFile)
+            raise FrameworkError('Error: Opening and reading raster %s' % layers['files'][i])
+
+        stack[i] = np.ma.filled(rasterData.astype(layers['dtype']), np.nan)
+
+    stack.flush()
+    del stack
+
+    # Stacks of older versions of the raster set, processes still mapping
+    #  them keep their pages until they reload
+    #
+    for oldFile in glob.glob(stalePattern):
+        try:
+            os.remove(oldFile)
+        except OSError:
+            pass
+
+    os.replace(tempFile, stackFile)
+
+# =============================================================================
+def cubeFiles(directory):
+
+    return (os.path.join(directory, '%s.npy' % cubeName), os.path.join(directory, '%s.json' % cubeName))
+
+# =============================================================================
+def maskFiles(directory):
+
+    return (os.path.join(directory, '%s.npy' % maskName), os.path.join(directory, '%s.json' % maskName))
+
+# =============================================================================
+def openMask(layers):
+
+    # Memory-map the study area mask when it is on the grid of the rasters
+    #
+    (maskFile, sidecarFile) = maskFiles(os.path.dirname(layers['paths'][0]))
+
+    if not os.path.isfile(maskFile) or not os.path.isfile(sidecarFile):
+        return False
+
+    try:
+        with open(sidecarFile, 'r') as fh:
+            sidecar = json.load(fh)
+    except (IOError, ValueError):
+        screen_logger.warning('Study area mask sidecar %s is not readable' % sidecarFile)
+        return False
+
+    if [sidecar['nrows'], sidecar['ncols']] != [layers['nrows'], layers['ncols']] or \
+       not layers['transform'].almost_equals(Affine(*sidecar['transform'])):
+        screen_logger.warning('Study area mask %s is not on the grid of the rasters' % maskFile)
+        return False
+
+    layers['mask'] = np.asarray(np.load(maskFile, mmap_mode='r'))
+
+    return True
+
+# =============================================================================
+def derivedFiles(directory):
+
+    return dict([(name, os.path.join(directory, '%s_%s.npy' % (cubeName, name))) for name in derivedL])
+
+# =============================================================================
+@timed('files')
+def rasterPaths(rastersL, directory=None):
+
+    pathsL = []
+    for rasterFile in rastersL:
+
+        rasterPath = rasterFile
+        if directory is not None:
+            rasterPath = os.path.join(directory, rasterFile)
+
+        if not os.path.isfile(rasterPath):
+            raise FrameworkError('Error: Raster file %s does not exist' % rasterFile)
+
+        pathsL.append(rasterPath)
+
+    return pathsL
+
+# =============================================================================
+@timed('files')
+def rasterSetVersion(pathsL):
+
+    # Version of the raster set from the size and modification time of each
+    #  raster, the rasters themselves are not read. The layer cube, its
+    #  derived layers and the study area mask beside the rasters change the
+    #  values served and are part of the version
+    #
+    versionL = [rasterVersion(rasterPath) for rasterPath in pathsL]
+
+    if len(pathsL) > 0:
+        directory = os.path.dirname(pathsL[0])
+        companionsL = list(cubeFiles(directory)) + sorted(derivedFiles(directory).values()) + list(maskFiles(directory))
+        versionL.extend([rasterVersion(companion) for companion in companionsL if os.path.isfile(companion)])
+
+    versionText = json.dumps(versionL)
+
+    return hashlib.sha1(versionText.encode('utf-8')).hexdigest()
+
+# =============================================================================
+def rasterVersion(rasterPath):
+
+    # Modification time and size identify the version of a raster
+    #
+    rasterStat = os.stat(rasterPath)
+
+    return {
+        'file'  : os.path.basename(rasterPath),
+        'mtime' : rasterStat.st_mtime,
+        'size'  : rasterStat.st_size
+    }
+
+# =============================================================================
+def openCube(layers):
+
+    (cubeFile, sidecarFile) = cubeFiles(os.path.dirname(layers['paths'][0]))
+
+    if not os.path.isfile(cubeFile) or not os.path.isfile(sidecarFile):
+        return False
+
+    try:
+        with open(sidecarFile, 'r') as fh:
+            sidecar = json.load(fh)
+    except (IOError, ValueError):
+        screen_logger.warning('Layer cube sidecar %s is not readable' % sidecarFile)
+        return False
+
+    # Cube must hold the requested rasters in the same order
+    #
+    if sidecar['rasters'] != layers['rasters']:
+        return False
+
+    for rasterPath, source in zip(layers['paths'], sidecar['sources']):
+        if rasterVersion(rasterPath) != source:
+            screen_logger.warning('Layer cube %s is older than raster %s' % (cubeFile, rasterPath))
+            return False
+
+    screen_logger.info('\nMemory-mapping layer cube %s' % cubeFile)
+
+    # Plain array view of the mapping, only the touched pages are read
+    #
+    layers['data']        = np.asarray(np.load(cubeFile, mmap_mode='r'))
+    layers['quantized']   = quantizedCube(sidecar)
+    layers['derived']     = derivedCube(sidecar, os.path.dirname(cubeFile))
+    layers['scaled']      = derivedScaling(sidecar)
+    layers['bounds']      = BoundingBox(*sidecar['bounds'])
+    layers['nrows']       = sidecar['nrows']
+    layers['ncols']       = sidecar['ncols']
+    layers['crs']         = CRS.from_wkt(sidecar['crs'])
+    layers['transform']   = Affine(*sidecar['transform'])
+    layers['x_cell_size'] = layers['transform'][0]
+    layers['y_cell_size'] = layers['transform'][4]
+    layers['dtype']       = np.dtype(sidecar['dtype'])
+    layers['nodata']      = sidecar['nodata']
+
+    return True
+
+# =============================================================================
+def quantizedCube(sidecar):
+
+    # Scale, layer offsets and nodata sentinel of a cube of scaled integers
+    #
+    if 'quantized' not in sidecar:
+        return None
+
+    quantized = sidecar['quantized']
+
+    return {
+        'dtype'    : np.dtype(quantized['dtype']),
+        'scale'    : quantized['scale'],
+        'offsets'  : np.asarray(quantized['offsets'], dtype=np.float64).reshape(-1, 1),
+        'sentinel' : quantized['sentinel']
+    }
+
+# =============================================================================
+def derivedCube(sidecar, directory):
+
+    # Derived layers built with the cube
+    #
+    if 'derived' not in sidecar:
+        return None
+
+    # Layers of the earlier float64 form are rebuilt
+    #
+    if not isinstance(sidecar['derived'], dict):
+        screen_logger.warning('Derived layers of the layer cube in %s are of an earlier form, rebuild them' % directory)
+        return None
+
+    derived = {}
+    for (name, derivedFile) in derivedFiles(directory).items():
+        if not os.path.isfile(derivedFile):
+            screen_logger.warning('Derived layer %s of the layer cube does not exist' % derivedFile)
+            return None
+        derived[name] = np.asarray(np.load(derivedFile, mmap_mode='r'))
+
+    return derived
+
+# =============================================================================
+def derivedScaling(sidecar):
+
+    # Scale, layer offsets and nodata sentinel of each derived layer held as
+    #  scaled integers, the derived layers of a quantized cube
+    #
+    if not isinstance(sidecar.get('derived'), dict) or 'quantized' not in sidecar['derived']:
+        return None
+
+    return dict([(name, quantizedCube({'quantized': quantized})) for (name, quantized) in sidecar['derived']['quantized'].items()])
+
+# =============================================================================
+def layerOffset(minimum, maximum, scale):
+
+    # Offset centring the values of a layer on zero in steps of the scale
+    #
+    return scale * round((float(minimum) + float(maximum)) / (2.0 * scale))
+
+# =============================================================================
+def quantizeLayer(values, qtype, scale, offset=None):
+
+    # Layer values as scaled integers with the lowest integer as the nodata
+    #  sentinel, the offset centres the values of the layer on zero unless
+    #  given
+    #
+    qinfo = np.iinfo(qtype)
+    valid = ~np.isnan(values)
+
+    if offset is None:
+        offset = 0.0
+        if np.any(valid):
+            offset = layerOffset(np.nanmin(values), np.nanmax(values), scale)
+
+    scaled = np.round((values[valid].astype(np.float64) - offset) / scale)
+    if scaled.size > 0 and (scaled.min() <= qinfo.min or scaled.max() > qinfo.max):
+        raise ValueError('Layer values span more than %s holds in steps of %s' % (np.dtype(qtype).name, scale))
+
+    quantized        = np.full(values.shape, qinfo.min, dtype=qtype)
+    quantized[valid] = scaled
+
+    return (quantized, offset)
+
+# =============================================================================
+def decodeCells(layers, cells):
+
+    # Cell values of a quantized cube with the sentinel as NaN
+    #
+    quantized = layers['quantized']
+    if quantized is None:
+        return cells
+
+    values = (cells * quantized['scale'] + quantized['offsets']).astype(layers['dtype'])
+    values[cells == quantized['sentinel']] = np.nan
+
+    return values
+
+# =============================================================================
+def setGeneral(layers, rc):
+
+    screen_logger.info('\n\nGeneral information for rasters')
+    layers['bounds'] = rc.bounds
+    screen_logger.info('\t%s' % str(rc.bounds))
+    layers['ncols']  = rc.width
+    layers['nrows']  = rc.height
+    screen_logger.info('\tRaster shape (columns %s (x coordinate) rows %s (y coordinate) ' % (str(rc.width), str(rc.height)))
+
+    # Determine CRS parameters
+    #
+    layers['crs'] = rc.crs
+    screen_logger.info('\tCoordinate system %s' % str(rc.crs))
+
+    # Determine Affine parameters
+    #
+    layers['transform'] = rc.transform
+
+    # Determine cell sizes
+    #
+    layers['x_cell_size'] = rc.transform[0]
+    screen_logger.info('\tCell size (x-direction column) %s' % str(rc.transform[0]))
+    layers['y_cell_size'] = rc.transform[4]
+    screen_logger.info('\tCell size (y-direction row) %s' % str(rc.transform[4]))
+
+    # Cell values keep the raster precision, integer rasters are promoted
+    #  so nodata can be held as NaN
+    #
+    layers['dtype'] = np.result_type(rc.dtypes[0], np.float32)
+
+# =============================================================================
+@timed('sample')
+def rowCol(layers, x_coordinates, y_coordinates):
+
+    # Determine rows and columns from coordinates
+    #
+    transformer  = rasterio.transform.AffineTransformer(layers['transform'])
+    (rows, cols) = transformer.rowcol(x_coordinates, y_coordinates)
+
+    return (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))
+
+# =============================================================================
+@timed('sample')
+def transformCoordinates(src_crs, dst_crs, x_coordinates, y_coordinates):
+
+    # Transformer for the CRS pair is built on first use and cached
+    #
+    key = (str(src_crs), str(dst_crs))
+
+    if key not in transformersD:
+        try:
+            src = CRS.from_user_input(src_crs)
+            dst = CRS.from_user_input(dst_crs)
+        except Exception:
+            raise FrameworkError('Provide a valid coordinate reference system')
+
+        if Transformer is not None:
+            transformersD[key] = Transformer.from_crs(src.to_wkt(), dst.to_wkt(), always_xy=True).transform
+        else:
+            transformersD[key] = functools.partial(rasterio.warp.transform, src, dst)
+
+    # All coordinates are transformed in one call
+    #
+    (x_coordinates, y_coordinates) = transformersD[key](np.asarray(x_coordinates, dtype=np.float64),
+                                                        np.asarray(y_coordinates, dtype=np.float64))
+
+    return (np.asarray(x_coordinates, dtype=np.float64), np.asarray(y_coordinates, dtype=np.float64))
+
+# =============================================================================
+def insideLayers(layers, rows, cols):
+
+    rows = np.asarray(rows)
+    cols = np.asarray(cols)
+
+    return (rows >= 0) & (rows < layers['nrows']) & (cols >= 0) & (cols < layers['ncols'])
+
+# =============================================================================
+def insideStudyArea(layers, rows, cols):
+
+    # Locations inside the rasters and the study area mask, checked before
+    #  any raster is read
+    #
+    rows   = np.asarray(rows, dtype=np.int64)
+    cols   = np.asarray(cols, dtype=np.int64)
+    inside = insideLayers(layers, rows, cols)
+
+    if layers['mask'] is not None:
+        inside[inside] = layers['mask'][rows[inside], cols[inside]]
+
+    countMetric('locations_rejected', int(inside.size - np.count_nonzero(inside)))
+
+    return inside
+
+# =============================================================================
+def layersLevel(layers, factor):
+
+    # Layers on a grid coarser by a factor, each coarse cell holds the cell
+    #  at the centre of its block of native cells as a nearest-neighbour
+    #  overview does, partial blocks on the far edges are dropped
+    #
+    if factor <= 1:
+        return layers
+
+    level = dict(layers)
+    level['factor']      = factor
+    level['nrows']       = layers['nrows'] // factor
+    level['ncols']       = layers['ncols'] // factor
+    level['transform']   = layers['transform'] * Affine.scale(factor)
+    level['x_cell_size'] = layers['x_cell_size'] * factor
+    level['y_cell_size'] = layers['y_cell_size'] * factor
+
+    # Decoded layers, the layer cube and its derived layers are strided in
+    #  place
+    #
+    offset = factor // 2
+    if layers['data'] is not None:
+        level['data'] = layers['data'][:, offset:level['nrows'] * factor:factor, offset:level['ncols'] * factor:factor]
+
+    if layers['derived'] is not None:
+        level['derived'] = dict([(name, derived[:, offset:level['nrows'] * factor:factor, offset:level['ncols'] * factor:factor])
+                                 for (name, derived) in layers['derived'].items()])
+
+    return level
+
+# =============================================================================
+@timed('read')
+def readCells(layers, rows, cols):
+
+    # Cell values for each layer (nlays, ncells) with nodata as NaN
+    #
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+
+    countMetric('cells_sampled', rows.size)
+
+    # Decoded layers
+    #
+    if layers['data'] is not None:
+        countMetric('bytes_read', layers['nlays'] * rows.size * layers['data'].dtype.itemsize)
+        return decodeCells(layers, layers['data'][:, rows, cols])
+
+    values = np.full((layers['nlays'], rows.size), np.nan, dtype=layers['dtype'])
+    if rows.size < 1:
+        return values
+
+    # Read only the window (blocks) holding the cells
+    #
+    row_off    = int(rows.min())
+    col_off    = int(cols.min())
+    cellWindow = Window(col_off, row_off, int(cols.max()) - col_off + 1, int(rows.max()) - row_off + 1)
+    countMetric('bytes_read', layers['nlays'] * int(cellWindow.width) * int(cellWindow.height) * np.dtype(layers['dtype']).itemsize)
+
+    # Coarser grid read from the matching native window, GDAL takes the cells
+    #  from the raster overviews when they are present
+    #
+    factor     = layers.get('factor', 1)
+    readWindow = Window(cellWindow.col_off * factor, cellWindow.row_off * factor, cellWindow.width * factor, cellWindow.height * factor)
+    outShape   = (int(cellWindow.height), int(cellWindow.width))
+
+    for i in range(layers['nlays']):
+        try:
+            with rasterio.open(layers['paths'][i]) as rc:
+                warnLayout(rc, layers['files'][i])
+                rasterData = rc.read(1, window=readWindow, out_shape=outShape, resampling=Resampling.nearest, masked=True)
+        except Exception:
+            raise FrameworkError('Error: Opening and reading raster %s' % layers['files'][i])
+
+        rasterData = np.ma.filled(rasterData.astype(layers['dtype']), np.nan)
+        values[i]  = rasterData[rows - row_off, cols - col_off]
+
+    return values
+
+# =============================================================================
+def decimalValues(values):
+
+    # Cell values as the shortest decimal of their precision, the elevations
+    #  given in a well log
+    #
+    return np.asarray(values).astype(str).astype(np.float64)
+
+# =============================================================================
+def derivedCells(values):
+
+    # Thickness of each unit, depth of its top below land surface (the first
+    #  layer holding a value) and index of the next layer below holding a
+    #  value for cell values (nlays, ncells). Thickness and depth keep the
+    #  precision of the cell values as the layer cube holds them
+    #
+    tops  = decimalValues(values)
+    below = nextValidBelow(values)
+    first = np.argmax(~np.isnan(tops), axis=0).reshape(1, -1)
+    land  = np.take_along_axis(tops, first, axis=0)
+    dtype = np.result_type(values.dtype, np.float32)
+
+    return {
+        'tops'      : tops,
+        'thickness' : decimalValues((tops - layerBottoms(tops, below)).astype(dtype)),
+        'depth'     : decimalValues((land - tops).astype(dtype)),
+        'below'     : below
+    }
+
+# =============================================================================
+def readDerived(layers, rows, cols, values):
+
+    # Derived layers of the cells, looked up when built with the cube
+    #
+    if layers['derived'] is None:
+        return derivedCells(values)
+
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+
+    derived = dict([(name, layers['derived'][name][:, rows, cols]) for name in derivedL])
+    derived['tops'] = decimalValues(values)
+
+    # Thickness and depth are held in the dtype of the cube
+    #
+    for name in ['thickness', 'depth']:
+        if layers['scaled'] is not None:
+            derived[name] = decodeCells({'quantized': layers['scaled'][name], 'dtype': layers['dtype']}, derived[name])
+        derived[name] = decimalValues(derived[name])
+
+    return derived
+
+# =============================================================================
+def readBelow(layers, rows, cols, values):
+
+    # Index of the next layer below holding a value, looked up when built
+    #  with the cube
+    #
+    if layers['derived'] is None:
+        return nextValidBelow(values)
+
+    return layers['derived']['below'][:, np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)]
+
+# =============================================================================
+def layoutProblem(rc):
+
+    # Block layout forcing more of the band to be decoded than a window
+    #  holds, tools/framework_cog.py rewrites the rasters as tiled COGs
+    #
+    (blockRows, blockCols) = rc.block_shapes[0]
+
+    if blockRows >= rc.height and blockCols >= rc.width:
+        return 'is a single block, every read decodes the full band'
+
+    if blockCols >= rc.width:
+        return 'is not tiled, every read decodes full-width strips of %d rows' % blockRows
+
+    return None
+
+# =============================================================================
+def warnLayout(rc, rasterFile):
+
+    if rasterFile in layoutWarnedS:
+        return
+
+    layoutWarnedS.add(rasterFile)
+
+    problem = layoutProblem(rc)
+    if problem is not None:
+        screen_logger.warning('Warning: raster %s %s' % (rasterFile, problem))
+
+# =============================================================================
+def nextValidBelow(values):
+
+    # Index of the first layer below each layer holding a cell value for
+    #  cell values (nlays, ncells), nlays where there is none
+    #
+    nlays = values.shape[0]
+    index = np.where(np.isnan(values), nlays, np.arange(nlays).reshape(-1, 1))
+
+    # First layer holding a value at or below each layer
+    #
+    atOrBelow = np.minimum.accumulate(index[::-1], axis=0)[::-1]
+
+    below      = np.full(index.shape, nlays, dtype=index.dtype)
+    below[:-1] = atOrBelow[1:]
+
+    return below
+
+# =============================================================================
+def layerBottoms(values, below=None):
+
+    # Bottom of each layer is the top of the next layer below holding a
+    #  value, layers without a top have no bottom
+    #
+    if below is None:
+        below = nextValidBelow(values)
+
+    padded = np.concatenate([values, np.full((1, values.shape[1]), np.nan, dtype=values.dtype)])
+    bots   = np.take_along_axis(padded, below, axis=0)
+    bots[np.isnan(values)] = np.nan
+
+    return bots
+
+# =============================================================================
+def entityTag(kind, rastersL, version, parts):
+
+    # Entity tag from the kind of response, the raster set and its version,
+    #  and the canonical request
+    #
+    tagText = json.dumps([kind, list(rastersL), version, parts])
+
+    return '"%s"' % hashlib.sha1(tagText.encode('utf-8')).hexdigest()
+
+# =============================================================================
+def tagMatches(ifNoneMatch, etag):
+
+    # If-None-Match holds * or a list of entity tags, weak tags compare equal
+    #
+    if ifNoneMatch is None or etag is None:
+        return False
+
+    for tag in ifNoneMatch.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == '*' or tag == etag:
+            return True
+
+    return False
+
+# =============================================================================
+def cacheHeaders(etag):
+
+    # Responses of the static framework model may be reused until the rasters
+    #  change, errors are never stored
+    #
+    if etag is None:
+        return [('Cache-Control', 'no-store')]
+
+    return [
+        ('ETag', etag),
+        ('Cache-Control', 'public, max-age=%d' % maxAge)
+    ]
+
+# =============================================================================
+@timed('parse')
+def outputFormat(queryString, formatsL):
+
+    # Output format from the query string, the first format is the default
+    #
+    queryStringD = parse_qs(queryString, encoding='utf-8')
+    myFormat     = queryStringD.get('format', [formatsL[0]])[0]
+
+    if myFormat not in formatsL:
+        raise FrameworkError('Provide an output format of %s' % ', '.join(formatsL))
+
+    return myFormat
+
+# =============================================================================
+@timed('serialize')
+def compactJson(jsonText):
+
+    # Same response without the padding and white space
+    #
+    return json.dumps(json.loads(jsonText), separators=(',', ':'))
+
+# =============================================================================
+def acceptEncoding(acceptHeader):
+
+    # Content coding from the Accept-Encoding header, brotli is preferred
+    #  over gzip when both are accepted
+    #
+    if acceptHeader is None:
+        return None
+
+    codingsD = {}
+    for item in acceptHeader.split(','):
+        fieldsL = item.strip().split(';')
+        coding  = fieldsL[0].strip().lower()
+        quality = 1.0
+        for field in fieldsL[1:]:
+            (name, sep, value) = field.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codingsD[coding] = quality
+
+    for coding in ['br', 'gzip']:
+        if coding == 'br' and brotli is None:
+            continue
+        if codingsD.get(coding, codingsD.get('*', 0.0)) > 0.0:
+            return coding
+
+    return None
+
+# =============================================================================
+def responseEncoding(acceptHeader, text):
+
+    # Small responses are not worth compressing
+    #
+    if len(text) < minCompressBytes:
+        return None
+
+    return acceptEncoding(acceptHeader)
+
+# =============================================================================
+def encodedTag(etag, encoding):
+
+    # Each content coding of a response is a different entity
+    #
+    if etag is None or encoding is None:
+        return etag
+
+    return '%s-%s"' % (etag[:-1], encoding)
+
+# =============================================================================
+def encodeChunks(text, encoding):
+
+    # Compress the response in chunks as it is written out
+    #
+    body = text.encode('utf-8')
+
+    if encoding is None:
+        yield body
+        return
+
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        (compress, finish) = (compressor.process, compressor.finish)
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        (compress, finish) = (compressor.compress, compressor.flush)
+
+    for start in range(0, len(body), chunkBytes):
+        chunk = compress(body[start:start + chunkBytes])
+        if len(chunk) > 0:
+            yield chunk
+
+    yield finish()
+
+# =============================================================================
+def responseHeaders(etag, encoding=None):
+
+    # Caching headers, the response varies with the accepted content coding
+    #
+    headersL = cacheHeaders(encodedTag(etag, encoding))
+    headersL.append(('Vary', 'Accept-Encoding'))
+
+    if encoding is not None:
+        headersL.append(('Content-Encoding', encoding))
+
+    return headersL
+
+# =============================================================================
+def printResponse(jsonText, etag, acceptHeader=None, extraHeaders=[]):
+
+    # CGI response, headers then the body in the accepted content coding
+    #
+    text     = '%s\n' % jsonText
+    encoding = responseEncoding(acceptHeader, text)
+
+    print('Content-type: application/json')
+    for (header, value) in responseHeaders(etag, encoding) + list(extraHeaders):
+        print('%s: %s' % (header, value))
+    print('')
+    sys.stdout.flush()
+
+    for chunk in encodeChunks(text, encoding):
+        sys.stdout.buffer.write(chunk)
+    sys.stdout.buffer.flush()
+
+# =============================================================================
+def notModifiedHeaders(etag, ifNoneMatch, acceptHeader=None):
+
+    # Headers of a 304 response when the client holds the response in one of
+    #  its content codings, small responses are held uncompressed
+    #
+    for encoding in [acceptEncoding(acceptHeader), None]:
+        if tagMatches(ifNoneMatch, encodedTag(etag, encoding)):
+            return [(header, value) for (header, value) in responseHeaders(etag, encoding) if header != 'Content-Encoding']
+
+    return None
+
+# =============================================================================
+def printNotModified(etag, ifNoneMatch, acceptHeader=None):
+
+    headersL = notModifiedHeaders(etag, ifNoneMatch, acceptHeader)
+    if headersL is None:
+        return False
+
+    print('Status: 304 Not Modified')
+    for (header, value) in headersL:
+        print('%s: %s' % (header, value))
+    print('')
+
+    return True
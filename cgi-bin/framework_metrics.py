@@ -0,0 +1,355 @@
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_metrics
+# Purpose:  This module times the stages of a framework request (query
+#           parsing, file checks, raster open, band read, sampling and JSON
+#           serialization) and counts the bytes read, cells sampled and
+#           result cache hits. The timings of a request are returned in a
+#           timings block or Server-Timing header, and are aggregated into
+#           Prometheus histograms served by the resident service. The
+#           histograms of every process, service workers and CGI requests
+#           alike, are merged into one file in a shared directory.
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+###############################################################################
+
+import os, time
+import atexit
+import functools
+import threading
+
+import json
+
+# File locking of the shared metrics, not available on Windows
+#
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from urllib.parse import parse_qs
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+# Stages of a request in the order reported
+#
+stagesL = ['parse', 'files', 'open', 'cache', 'read', 'sample', 'serialize']
+
+# Counters of a request
+#
+countersL = ['bytes_read', 'cells_sampled', 'cache_hits', 'cache_misses', 'locations_rejected']
+
+# Upper bounds (seconds) of the histogram buckets
+#
+bucketsL = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Directory holding the metrics merged from all processes, shared memory
+#  when the system has it, empty to keep the metrics of each process apart
+#  (each series is then labelled with the process id)
+#
+metricsDir  = os.environ.get('FRAMEWORK_METRICS', '/dev/shm' if os.path.isdir('/dev/shm') else '')
+metricsName = 'framework_metrics.json'
+
+# Seconds between merges of the metrics of a process into the shared
+#  metrics, the rest are merged when the process exits
+#
+mergeSeconds = float(os.environ.get('FRAMEWORK_METRICS_SECONDS', '5.0'))
+
+# Timings of the request handled by this thread
+#
+requestState = threading.local()
+
+# Histograms keyed by (script, stage) holding the bucket counts, sum and
+#  count, request counts keyed by (script, status) and counter totals, of
+#  this process since the last merge into the shared metrics
+#
+histogramsD  = {}
+requestsD    = {}
+countersD    = dict([(counter, 0) for counter in countersL])
+metricsLock  = threading.Lock()
+
+# Time of the last merge into the shared metrics
+#
+mergeState   = {'time': None}
+
+# =============================================================================
+def startRequest():
+
+    requestState.timings = dict([(stage, 0.0) for stage in stagesL])
+    requestState.counts  = dict([(counter, 0) for counter in countersL])
+    requestState.stack   = []
+    requestState.start   = time.perf_counter()
+
+# =============================================================================
+def timed(stage):
+
+    # Time a function as a stage of the request, time spent in a nested
+    #  stage is counted only in the nested stage
+    #
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+
+            stack = getattr(requestState, 'stack', None)
+            if stack is None:
+                return function(*args, **kwargs)
+
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested  = stack.pop()
+                requestState.timings[stage] += elapsed - nested
+                if len(stack) > 0:
+                    stack[-1] += elapsed
+
+        return wrapper
+
+    return decorator
+
+# =============================================================================
+def countMetric(counter, amount=1):
+
+    counts = getattr(requestState, 'counts', None)
+    if counts is not None:
+        counts[counter] += amount
+
+    with metricsLock:
+        countersD[counter] += amount
+
+# =============================================================================
+def finishRequest(script, status):
+
+    # Timings (milliseconds) and counts of the request, added to the
+    #  histograms of the script
+    #
+    if getattr(requestState, 'stack', None) is None:
+        return None
+
+    secondsD          = dict(requestState.timings)
+    secondsD['total'] = time.perf_counter() - requestState.start
+
+    with metricsLock:
+        requestsD[(script, status)] = requestsD.get((script, status), 0) + 1
+
+        for (stage, seconds) in secondsD.items():
+            if seconds <= 0.0 and stage != 'total':
+                continue
+
+            histogram = histogramsD.setdefault((script, stage), {'buckets': [0] * len(bucketsL), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(bucketsL):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum']   += seconds
+            histogram['count'] += 1
+
+    timingsD = dict([(stage, round(1000.0 * seconds, 3)) for (stage, seconds) in secondsD.items()])
+    timingsD.update(requestState.counts)
+
+    requestState.stack = None
+
+    # Merged at most every few seconds, and only when no other process holds
+    #  the shared metrics, so requests are not serialized on the file lock
+    #
+    merged = mergeState['time']
+    if merged is None or time.monotonic() - merged >= mergeSeconds:
+        mergeMetrics(wait=False)
+
+    return timingsD
+
+# =============================================================================
+def sharedMetrics():
+
+    if fcntl is None or not metricsDir:
+        return None
+
+    return os.path.join(metricsDir, metricsName)
+
+# =============================================================================
+def addMetrics(histograms, requests, counters, stateD):
+
+    # Metrics of a saved state added to histograms, request counts and
+    #  counters
+    #
+    for (script, stage, buckets, seconds, count) in stateD.get('histograms', []):
+        histogram = histograms.setdefault((script, stage), {'buckets': [0] * len(bucketsL), 'sum': 0.0, 'count': 0})
+        histogram['buckets'] = [total + n for (total, n) in zip(histogram['buckets'], buckets)]
+        histogram['sum']    += seconds
+        histogram['count']  += count
+
+    for (script, status, count) in stateD.get('requests', []):
+        requests[(script, status)] = requests.get((script, status), 0) + count
+
+    for (counter, count) in stateD.get('counters', {}).items():
+        if counter in counters:
+            counters[counter] += count
+
+# =============================================================================
+def metricsState(histograms, requests, counters):
+
+    return {
+        'histograms' : [[script, stage, h['buckets'], h['sum'], h['count']] for ((script, stage), h) in sorted(histograms.items())],
+        'requests'   : [[script, status, count] for ((script, status), count) in sorted(requests.items())],
+        'counters'   : dict(counters)
+    }
+
+# =============================================================================
+def readMetrics(metricsFile):
+
+    try:
+        with open(metricsFile, 'r') as fh:
+            return json.load(fh)
+    except (IOError, ValueError):
+        return {}
+
+# =============================================================================
+def mergeMetrics(wait=True):
+
+    # Metrics of this process added to the shared metrics under a file lock,
+    #  they are taken out under the thread lock so other requests of the
+    #  process are not held up by the file, and put back when the shared
+    #  file is busy or cannot be written
+    #
+    metricsFile = sharedMetrics()
+    if metricsFile is None:
+        return
+
+    with metricsLock:
+        stateD = metricsState(histogramsD, requestsD, countersD)
+
+        histogramsD.clear()
+        requestsD.clear()
+        for counter in countersL:
+            countersD[counter] = 0
+
+        mergeState['time'] = time.monotonic()
+
+    try:
+        with open('%s.lock' % metricsFile, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            try:
+                (histograms, requests, counters) = ({}, {}, dict([(counter, 0) for counter in countersL]))
+                addMetrics(histograms, requests, counters, readMetrics(metricsFile))
+                addMetrics(histograms, requests, counters, stateD)
+
+                tempFile = '%s.%d.%d.tmp' % (metricsFile, os.getpid(), threading.get_ident())
+                with open(tempFile, 'w') as fh:
+                    json.dump(metricsState(histograms, requests, counters), fh)
+                os.replace(tempFile, metricsFile)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    except (IOError, OSError):
+        with metricsLock:
+            addMetrics(histogramsD, requestsD, countersD, stateD)
+
+# Metrics not yet merged are merged when the process exits
+#
+atexit.register(mergeMetrics)
+
+# =============================================================================
+def timingsRequested(queryString):
+
+    queryStringD = parse_qs(queryString, encoding='utf-8')
+
+    return queryStringD.get('timings', ['0'])[0].lower() in ['1', 'true', 'yes']
+
+# =============================================================================
+def serverTiming(timingsD):
+
+    # Server-Timing header value of the stages that took time
+    #
+    if timingsD is None:
+        return None
+
+    timingL = []
+    for stage in stagesL + ['total']:
+        if timingsD.get(stage, 0.0) > 0.0 or stage == 'total':
+            timingL.append('%s;dur=%.3f' % (stage, timingsD[stage]))
+
+    return ', '.join(timingL)
+
+# =============================================================================
+def timingsJson(jsonText, timingsD):
+
+    # Timings block added to the end of the response object
+    #
+    if timingsD is None:
+        return jsonText
+
+    jsonText = jsonText.rstrip()
+
+    return '%s,\n  "timings" : %s\n}' % (jsonText[:-1].rstrip(), json.dumps(timingsD))
+
+# =============================================================================
+def metricsText():
+
+    # Prometheus text exposition of the histograms and counters of all
+    #  processes, or of this process labelled by its process id
+    #
+    metricsL = []
+    process  = ''
+
+    with metricsLock:
+
+        (histograms, requests, counters) = ({}, {}, dict([(counter, 0) for counter in countersL]))
+        addMetrics(histograms, requests, counters, metricsState(histogramsD, requestsD, countersD))
+
+        metricsFile = sharedMetrics()
+        if metricsFile is not None and os.path.isfile(metricsFile):
+            with open('%s.lock' % metricsFile, 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_SH)
+                try:
+                    addMetrics(histograms, requests, counters, readMetrics(metricsFile))
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        elif metricsFile is None:
+            process = ',pid="%d"' % os.getpid()
+
+        metricsL.append('# HELP framework_requests_total Requests handled by script and status.')
+        metricsL.append('# TYPE framework_requests_total counter')
+        for (script, status) in sorted(requests):
+            metricsL.append('framework_requests_total{script="%s",status="%s"%s} %d' % (script, status, process, requests[(script, status)]))
+
+        metricsL.append('# HELP framework_stage_seconds Time spent in each stage of a request.')
+        metricsL.append('# TYPE framework_stage_seconds histogram')
+        for (script, stage) in sorted(histograms):
+            histogram = histograms[(script, stage)]
+            labels    = 'script="%s",stage="%s"%s' % (script, stage, process)
+            for bound, count in zip(bucketsL, histogram['buckets']):
+                metricsL.append('framework_stage_seconds_bucket{%s,le="%s"} %d' % (labels, repr(bound), count))
+            metricsL.append('framework_stage_seconds_bucket{%s,le="+Inf"} %d' % (labels, histogram['count']))
+            metricsL.append('framework_stage_seconds_sum{%s} %.6f' % (labels, histogram['sum']))
+            metricsL.append('framework_stage_seconds_count{%s} %d' % (labels, histogram['count']))
+
+        for counter in countersL:
+            metricsL.append('# TYPE framework_%s_total counter' % counter)
+            metricsL.append('framework_%s_total%s %d' % (counter, '{%s}' % process[1:] if process else '', counters[counter]))
+
+    return '%s\n' % '\n'.join(metricsL)
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_service
+# Purpose:  This script serves the framework_cell_log.py, framework_xsec.py
+#           and framework_fence.py query-string API from a resident WSGI
+#           application. The rasters are opened and decoded once and kept in
+#           memory between requests instead of starting a new interpreter for
+#           every CGI request.
+#
+#           Run under any WSGI server mounted at /cgi-bin/frameworkService,
+#              gunicorn --chdir cgi-bin framework_service:application
+#           or stand alone for development,
+#              framework_service.py --port 8080
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+###############################################################################
+
+import os, sys, time
+
+import threading
+
+import argparse
+
+# Set up logging
+#
+import logging
+
+# Framework scripts
+#
+import framework_cell_log
+import framework_xsec
+import framework_fence
+
+from framework_layers import FrameworkError, readLookup, parseRasters, sharedLayers, readPostBody
+from framework_layers import rasterPaths, rasterSetVersion, responseEncoding, encodeChunks, responseHeaders, notModifiedHeaders
+
+from framework_metrics import startRequest, finishRequest, timingsRequested, timingsJson, serverTiming, metricsText
+
+# -- Set logging file
+#
+#   Request details are only logged when asked for, the scripts log at
+#   info level for a single CGI request
+#
+screen_logger = logging.getLogger()
+screen_logger.setLevel(logging.WARNING)
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+program      = "USGS Raster Framework Service"
+version      = "1.01"
+version_date = "October 18, 2026"
+usage_message = """
+Usage: framework_service.py
+                [--help]
+                [--usage]
+                [--host                    Provide a host name or address to listen on]
+                [--port                    Provide a port number to listen on]
+                [--rasters                 Provide a set of rasters from land surface to bedrock (descending order) to load at startup]
+"""
+
+# Directory holding the rasters, relative raster names in the query string
+#  are resolved against this directory as the CGI scripts do
+#
+serviceDir = os.path.dirname(os.path.abspath(__file__))
+rasterDir  = os.environ.get('FRAMEWORK_DIR', serviceDir)
+
+# Lookup file listing the rasters loaded at startup
+#
+lookupFile = os.environ.get('FRAMEWORK_LOOKUP',
+                            os.path.join(serviceDir, '..', 'htdocs', 'data', 'framework_lookup.json'))
+
+# Service scripts
+#
+services = {
+    'framework_cell_log.py' : framework_cell_log,
+    'framework_xsec.py'     : framework_xsec,
+    'framework_fence.py'    : framework_fence
+}
+
+# Service scripts accepting a request body
+#
+postServices = ['framework_cell_log.py']
+
+# Loaded raster layers keyed by the raster set, the decoded layers are
+#  shared by the worker processes of the WSGI server (FRAMEWORK_SHARED)
+#
+layersD    = {}
+layersLock = threading.Lock()
+
+# Version of each raster set on disk with the time it was taken, the raster
+#  set is checked again after this many seconds so rebuilt rasters, cube,
+#  derived layers or mask are reloaded and the service and CGI scripts
+#  share one version
+#
+versionsD      = {}
+versionSeconds = float(os.environ.get('FRAMEWORK_VERSION_SECONDS', '1.0'))
+
+# =============================================================================
+def currentVersion(rastersL):
+
+    key = tuple(rastersL)
+    now = time.monotonic()
+
+    with layersLock:
+        if key in versionsD and now - versionsD[key][0] < versionSeconds:
+            return versionsD[key][1]
+
+    version = rasterSetVersion(rasterPaths(rastersL, rasterDir))
+
+    with layersLock:
+        versionsD[key] = (now, version)
+
+    return version
+
+# =============================================================================
+def loadLayers(rastersL):
+
+    key     = tuple(rastersL)
+    version = currentVersion(rastersL)
+
+    with layersLock:
+        if key not in layersD or layersD[key]['version'] != version:
+            screen_logger.warning('Loading rasters %s' % ' '.join(rastersL))
+            layersD[key] = sharedLayers(rastersL, directory=rasterDir)
+
+        return layersD[key]
+
+# =============================================================================
+def layersVersion(rastersL):
+
+    # Version of the rasters on disk, the layers are reloaded when it
+    #  changes
+    #
+    return currentVersion(rastersL)
+
+# =============================================================================
+def startupRasters():
+
+    # Rasters named in the environment or listed in the lookup file
+    #
+    if 'FRAMEWORK_RASTERS' in os.environ:
+        return parseRasters(os.environ['FRAMEWORK_RASTERS'])
+
+    if os.path.isfile(lookupFile):
+        return list(readLookup(lookupFile).get('rasters', []))
+
+    return []
+
+# =============================================================================
+def preloadLayers(rastersL):
+
+    if len(rastersL) < 1:
+        return
+
+    try:
+        loadLayers(rastersL)
+    except FrameworkError as e:
+        screen_logger.warning('Rasters not loaded at startup: %s' % str(e))
+
+# =============================================================================
+def errorJson(error_message):
+
+    jsonL = []
+    jsonL.append('{')
+    jsonL.append(' "status"        : "failed",')
+    jsonL.append(' "message": "%s" ' % error_message)
+    jsonL.append('}')
+
+    return '\n'.join(jsonL)
+
+# =============================================================================
+def application(environ, start_response):
+
+    # Service script from the request path
+    #
+    script      = os.path.basename(environ.get('PATH_INFO', ''))
+    queryString = environ.get('QUERY_STRING', '')
+    service     = services.get(script)
+
+    # Stage timings and counters of all requests for Prometheus, merged from
+    #  every worker and CGI request (FRAMEWORK_METRICS)
+    #
+    if script == 'metrics':
+        body = metricsText().encode('utf-8')
+        start_response('200 OK', [
+            ('Content-type', 'text/plain; version=0.0.4'),
+            ('Content-Length', str(len(body))),
+            ('Cache-Control', 'no-store')
+        ])
+        return [body]
+
+    startRequest()
+
+    status  = '200 OK'
+    etag    = None
+    outcome = 'success'
+    if service is None:
+        status   = '404 Not Found'
+        jsonText = errorJson('Error: Unknown service %s' % script)
+    else:
+        try:
+            if environ.get('REQUEST_METHOD', 'GET') == 'POST' and script in postServices:
+                postBody = readPostBody(environ['wsgi.input'], environ.get('CONTENT_LENGTH', ''))
+                jsonText = service.processQuery(queryString, loadLayers=loadLayers, postBody=postBody)
+            else:
+                etag = service.queryTag(queryString, layersVersion=layersVersion)
+
+                # Client already holds this response
+                #
+                headersL = notModifiedHeaders(etag, environ.get('HTTP_IF_NONE_MATCH'), environ.get('HTTP_ACCEPT_ENCODING'))
+                if headersL is not None:
+                    finishRequest(script, 'not_modified')
+                    start_response('304 Not Modified', headersL)
+                    return []
+
+                jsonText = service.processQuery(queryString, loadLayers=loadLayers)
+        except FrameworkError as e:
+            etag     = None
+            outcome  = 'failed'
+            jsonText = errorJson(str(e))
+
+    # Stage timings in a Server-Timing header, and in the response when asked
+    #  for since it is then no longer cacheable
+    #
+    timingsD = finishRequest(script if service is not None else 'unknown', outcome)
+    if service is not None and outcome == 'success' and timingsRequested(queryString):
+        jsonText = timingsJson(jsonText, timingsD)
+        etag     = None
+
+    # Body in the accepted content coding, compressed bodies are streamed
+    #  without a length
+    #
+    text     = '%s\n' % jsonText
+    encoding = responseEncoding(environ.get('HTTP_ACCEPT_ENCODING'), text)
+
+    headersL = [('Content-type', 'application/json')]
+    if encoding is None:
+        headersL.append(('Content-Length', str(len(text.encode('utf-8')))))
+
+    headersL.append(('Server-Timing', serverTiming(timingsD)))
+
+    start_response(status, headersL + responseHeaders(etag, encoding))
+
+    return encodeChunks(text, encoding)
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    # The service is not a CGI script
+    #
+    if 'GATEWAY_INTERFACE' in os.environ:
+        print('Content-type: application/json\n')
+        print(errorJson('Error: %s runs as a resident service' % program))
+        sys.exit()
+
+    from wsgiref.simple_server import make_server
+
+    parser = argparse.ArgumentParser(description=program, usage=usage_message)
+    parser.add_argument('--usage', action='store_true')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--rasters', default=None)
+    args = parser.parse_args()
+
+    if args.usage:
+        print(usage_message)
+        sys.exit()
+
+    if args.rasters is not None:
+        preloadLayers(parseRasters(args.rasters))
+    else:
+        preloadLayers(startupRasters())
+
+    screen_logger.warning('%s version %s serving on %s:%d' % (program, version, args.host, args.port))
+    make_server(args.host, args.port, application).serve_forever()
+
+else:
+
+    # Load the rasters once when the application is imported by the WSGI server
+    #
+    preloadLayers(startupRasters())
@@ -40,6 +40,7 @@ import numpy as np
 import rasterio
 
 import json
+import base64
 
 import csv
 
@@ -52,10 +53,11 @@ import logging
 # Create screen handler
 #
 screen_logger = logging.getLogger()
-formatter     = logging.Formatter(fmt='%(message)s')
-console       = logging.StreamHandler()
-console.setFormatter(formatter)
-screen_logger.addHandler(console)
+if len(screen_logger.handlers) < 1:
+    formatter     = logging.Formatter(fmt='%(message)s')
+    console       = logging.StreamHandler()
+    console.setFormatter(formatter)
+    screen_logger.addHandler(console)
 screen_logger.setLevel(logging.ERROR)
 screen_logger.setLevel(logging.INFO)
 screen_logger.propagate = False
@@ -64,70 +66,82 @@ screen_logger.propagate = False
 #
 from urllib.parse import parse_qs
 
+# Shared raster layer handling
+#
+from framework_layers import FrameworkError, parseRasters, parseNumber, openLayers, rowCol, insideStudyArea, readCells, readBelow, layerBottoms, layersLevel
+from framework_layers import rasterPaths, rasterSetVersion, entityTag, outputFormat, compactJson, printResponse, printNotModified
+
+# Shared result cache
+#
+from framework_cache import cacheKey, cacheGet, cachePut
+
+# Stage timings and counters of a request
+#
+from framework_metrics import timed, startRequest, finishRequest, timingsRequested, timingsJson, serverTiming
+
 # ------------------------------------------------------------
 # -- Set
 # ------------------------------------------------------------
 
 program      = "USGS Raster Cross Section Script"
-version      = "3.14"
-version_date = "March 23, 2025"
+version      = "3.16"
+version_date = "October 18, 2026"
 usage_message = """
 Usage: framework_xsec.py
                 [--help]
                 [--usage]
                 [--points                  Provide two or more sets of x and y coordinates]
                 [--rasters                 Provide a set of rasters from land surface to bedrock (descending order)]
+                [--format                  Provide an output format of json, compact, columnar or binary]
+                [--max_samples             Provide the largest number of samples returned for a long transect]
+                [--width                   Provide the chart width in pixels to return one bucket (up to 2 samples per unit plus 2) per pixel]
+                [--detail                  Provide full to sample native cells for a bounded transect, default auto]
 """
 
+# Output formats, compact drops the padding and white space, columnar holds
+#  one distance array shared by the top and bottom arrays of each unit and
+#  binary holds those arrays as base64 little-endian float32 with NaN for
+#  no value
+#
+outputFormats = ['json', 'compact', 'columnar', 'binary']
+
+# Sampling detail, auto samples a bounded transect on the coarsest grid
+#  (overview level) holding this many cells for each bucket and full always
+#  samples native cells
+#
+detailsL        = ['auto', 'full']
+cellsPerBucket  = 4
+maxLevelFactor  = 64
+
+# Transect sampling, one sample for each cell crossed, held in the cache keys
+#  and entity tags so results of an earlier sampling are not reused
+#
+samplerName     = 'supercover-2'
+
 # =============================================================================
 def errorMessage(error_message):
 
-    print("Content-type: application/json\n")
+    print("Content-type: application/json")
+    print("Cache-Control: no-store\n")
     print('{')
     print(' "status"        : "failed",')
     print(' "message": "%s" ' % error_message)
     print('}')
+
+    finishRequest('framework_xsec.py', 'failed')
     
     sys.exit()
 
 # =============================================================================
+@timed('parse')
+def parseQuery(queryString):
 
-# ----------------------------------------------------------------------
-# -- Main program
-# ----------------------------------------------------------------------
-
-Arguments = {}
-rastersL  = []
-raster_legend = {}
- 
-# Current directory
-#
-currentDir = os.path.dirname(__file__)
-
-# Parse the Query String
-#
-params = {}
- 
-HardWired = None
-#HardWired = 1
-
-if HardWired is not None:
-    os.environ['QUERY_STRING'] = 'points=1632703.5944117,550449.4082453552 2173336.1637787456,281588.25451114046&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif&color=framework_color_map.txt'
-    os.environ['QUERY_STRING'] = 'points=2049733.082778196,461274.2283728898 2116538.356518111,440719.8276194666&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif&color=framework_color_map.txt'
-    os.environ['QUERY_STRING'] = 'points=1460426.6901486127,353832.73086095566 2792963.1439483366,283522.8834921515&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
-    
-# Check URL
-#
-QUERY_STRING = ''
-
-if 'QUERY_STRING' in os.environ:
-    QUERY_STRING = str(os.environ['QUERY_STRING'])
-    
-screen_logger.info('\nQUERY_STRING: %s' % QUERY_STRING)
-  
-if len(QUERY_STRING) > 0:
-    
-    queryString = os.environ['QUERY_STRING']
+    if len(queryString) < 1:
+        usage_message = ", ".join([
+        'Provide two or more sets of x and y coordinates',
+        'Provide a set of rasters from land surface to bedrock (descending order)'
+        ])
+        raise FrameworkError(usage_message)
 
     queryStringD = parse_qs(queryString, encoding='utf-8')
     screen_logger.info('\nqueryStringD %s' % str(queryStringD))
@@ -138,9 +152,8 @@ if len(QUERY_STRING) > 0:
         'points',
         'rasters'
        ]
-    parmL    = list(myParmsL)
     missingL = []
-    
+
     # Check arguments
     #
     querySet = set(queryStringD.keys())
@@ -152,481 +165,411 @@ if len(QUERY_STRING) > 0:
     #
     if len(missingL) > 0:
         errorL = []
-        if 'raster' in missingL:
+        if 'rasters' in missingL:
             errorL.append('%s' % 'Provide a set of rasters from land surface to bedrock (descending order)')
         elif 'points' in missingL:
             errorL.append('%s' % 'Provide two or more sets of x and y coordinates')
 
-        errorMessage('%s' % ', '.join(errorL))
-    
+        raise FrameworkError('%s' % ', '.join(errorL))
+
     # Check rasters
     #
-    rastersL = re.split(r"[-;,\s]\s*", queryStringD['rasters'][0])
-    tempL    = list(rastersL)
-    screen_logger.info('\nRasters: %s' % ' '.join(rastersL))
+    rastersL = parseRasters(queryStringD['rasters'][0])
 
-    if len(rastersL) < 1:
-        errorMessage('%s' % 'Provide a set of rasters from land surface to bedrock (descending order)')
+    # End points of Cross Section
+    #
+    pointsL = parsePoints(queryStringD['points'][0])
 
-    while len(tempL) > 0:
-        rasterFile  = str(tempL.pop(0))
-        #rasterFile = os.path.join(currentDir, rasterFile)
+    return (rastersL, pointsL)
+
+# =============================================================================
+@timed('parse')
+def parseBuckets(queryString, nlays):
+
+    # Bounded number of buckets, width gives one bucket for each pixel of the
+    #  chart and so bounds the buckets not the samples, each bucket keeps its
+    #  first and last sample and the lowest and highest top of each unit
+    #  (2 * nlays + 2 samples), max_samples bounds the samples returned, the
+    #  smaller bound is kept when both are given
+    #
+    queryStringD = parse_qs(queryString, encoding='utf-8')
+    nbuckets     = None
+
+    for myParm in ['width', 'max_samples']:
+        if myParm not in queryStringD:
+            continue
+
+        myArg = parseNumber(queryStringD[myParm][0], myParm)
+        if myArg < 1 or myArg != int(myArg):
+            raise FrameworkError('Provide a positive whole number for %s' % myParm)
+
+        if myParm == 'width':
+            buckets = int(myArg)
+        else:
+            buckets = max(1, int(myArg) // (2 * nlays + 2))
+
+        if nbuckets is None or buckets < nbuckets:
+            nbuckets = buckets
+
+    return nbuckets
+
+# =============================================================================
+@timed('parse')
+def parseDetail(queryString):
+
+    queryStringD = parse_qs(queryString, encoding='utf-8')
+
+    detail = queryStringD.get('detail', ['auto'])[0].lower()
+    if detail not in detailsL:
+        raise FrameworkError('Provide a detail of %s' % ' or '.join(detailsL))
+
+    return detail
+
+# =============================================================================
+def levelFactor(layers, total_distance, nbuckets, detail):
+
+    # Coarsest power of two grid still holding enough cells along the
+    #  transect for each bucket, native cells for a transect not bounded
+    #
+    if nbuckets is None or detail == 'full':
+        return 1
+
+    ncells = total_distance / abs(layers['x_cell_size'])
+    factor = 1
+    while factor < maxLevelFactor and ncells / (2 * factor) >= cellsPerBucket * nbuckets:
+        factor *= 2
 
-        if not os.path.isfile(rasterFile):
-            errorMessage('Error: Raster file %s does not exist' % rasterFile)
+    return factor
+
+# =============================================================================
+def parsePoints(pointsText):
 
     # End points of Cross Section
     #             Real numbers
     #             regex "^[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?$"
     #
     pointsL = []
-    tempL   = queryStringD['points'][0].split(' ')
+    tempL   = pointsText.split(' ')
     screen_logger.info('\nPoints %s' % str(tempL))
     while len(tempL) > 0:
 
-        (x_coordinate, y_coordinate) = tempL[0].split(',')
+        try:
+            (x_coordinate, y_coordinate) = tempL[0].split(',')
+        except ValueError:
+            raise FrameworkError('Provide two or more sets of x and y coordinates')
         del tempL[0]
         screen_logger.info('\t\tCross section coordinates (%s, %s)' % (str(x_coordinate), str(y_coordinate)))
 
-        myMatch = bool(re.search(r"^[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?$", x_coordinate))
-
-        # Argument failed regex
+        # Points are snapped to the hundredth of a foot given in the output so
+        #  repeated transects share one cached result
         #
-        if not myMatch:
-            errorMessage('Provide a numeric value for x coordinate')
+        pointsL.append([round(parseNumber(x_coordinate, 'x coordinate'), 2), round(parseNumber(y_coordinate, 'y coordinate'), 2)])
 
-        myMatch = bool(re.search(r"^[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?$", y_coordinate))
+    screen_logger.info('\tCross section coordinates %s' % str(pointsL))
 
-        # Argument failed regex
-        #
-        if not myMatch:
-            errorMessage('Provide a numeric value for y coordinate')
+    return pointsL
 
-        pointsL.append([float(x_coordinate), float(y_coordinate)])
-        
-    screen_logger.info('\tCross section coordinates %s' % str(pointsL))
+# =============================================================================
+def checkPoints(layers, pointsL):
 
-# Set rasters
-#
-rasterList = []
-if len(rastersL) > 0:
-
-    rasterD    = {}
-    rasters    = []
-    units      = []
-    tempL      = list(rastersL)
-    nrows      = None
-    ncols      = None
-    nlays      = len(rastersL)
-    row        = None
-    col        = None
-    x_cell_size = None
-    y_cell_size = None
-    cell       = None
-    cell_count = 0
-    bounds     = None
+    x_left, y_lower, x_right, y_upper = layers['bounds']
 
-    elevation_min =  9999999999999999.99
-    elevation_max = -9999999999999999.99
+    # Check cross section coordinates
+    #
+    point_number   = 0
+    total_distance = 0
 
-    while len(tempL) > 0:
+    screen_logger.info('\tChecking cross section coordinates')
+    for location in pointsL:
+        point_number += 1
+        x_coordinate  = location[0]
+        y_coordinate  = location[1]
+        screen_logger.info('\t\tCross section coordinates (%s, %s)' % (str(x_coordinate), str(y_coordinate)))
 
-        rasterFile  = str(tempL.pop(0))
-        NoData      = None
-        rasterValue = None
-        maximum     = None
-        minimum     = None
-        nodata      = None
-            
-        if not os.path.isfile(rasterFile):
-            errorMessage('Error: Raster file %s does not exist' % rasterFile)
-
-        # Remove suffix .tif
-        #
-        (root, tif_suffix)   = os.path.splitext(rasterFile)
-        if tif_suffix is not None:
-            (dir, raster) = os.path.split(root)
+        x2            = x_coordinate
+        y2            = y_coordinate
 
-        # Build list of rasters
+        # The right and lower raster bounds fall just outside the last column
+        #  and row
         #
-        rasters.append(raster)
+        if x_coordinate < x_left or  x_coordinate >= x_right:
+            raise FrameworkError("Error: x coordinate (%s) of location %d is outside of raster (range %s to %s)" % (x_coordinate, point_number, x_left, x_right))
 
-        # Read raster bands directly to Numpy arrays.
-        #
-        try:
-            with rasterio.open(rasterFile) as rc:
-                
-                # General information for rasters
-                #
-                if bounds is None:
-                    screen_logger.info('\n\nGeneral information for rasters')
-                    kwds = rc.profile
-                    #screen_logger.info(kwds)
-                    bounds = rc.bounds
-                    screen_logger.info('\t%s' % str(bounds))
-                    x_left, y_lower, x_right, y_upper = bounds
-                    ncols = rc.width
-                    #screen_logger.info('Number of columns %s' % str(ncols))
-                    nrows = rc.height
-                    #screen_logger.info('Number of rows %s' % str(nrows))
-                    shape = rc.shape
-                    screen_logger.info('\tRaster shape (columns %s (x coordinate) rows %s (y coordinate) ' % (str(ncols), str(nrows)))
-
-                    # Determine CRS parameters
-                    #
-                    rasterCrs = rc.crs
-                    screen_logger.info('\tCoordinate system %s' % str(rasterCrs))
-
-                    # Proj4 parameters
-                    #
-                    dst_crs = rc.crs.to_proj4()
-                    screen_logger.info('\tRaster proj4 parameters %s' % str(dst_crs))
-
-                    # Determine origin coordinates
-                    #
-                    origin_x, origin_y = rc.transform * (0, 0)
-                    screen_logger.info('\tOrigin %s %s' % (str(origin_x), str(origin_y)))
-                    
-                    # Determine Affine parameters
-                    #
-                    rasterAffine = rc.transform
-                    #screen_logger.info('\tAffine %s' % str(rasterAffine))
-                    
-                    # Determine cell sizes
-                    #
-                    x_cell_size = rasterAffine[0]
-                    screen_logger.info('\tCell size (x-direction column) %s' % str(x_cell_size))
-                    y_cell_size = rasterAffine[4]
-                    screen_logger.info('\tCell size (y-direction row) %s' % str(y_cell_size))
-
-                    # Determine row and column from coordinates
-                    #
-                    transformer = rasterio.transform.AffineTransformer(rasterAffine)
-                    (row, col) = transformer.rowcol(float(x_coordinate), float(y_coordinate))
-                    cell_count += 1
-                    screen_logger.info('\tRaster row %s col %s' % (str(row), str(col)))
-
-                    # Check cross section coordinates
-                    #
-                    point_number   = 0
-                    total_distance = 0
-
-                    screen_logger.info('\tChecking cross section coordinates')
-                    for location in pointsL:
-                        point_number += 1
-                        x_coordinate  = location[0]
-                        y_coordinate  = location[1]
-                        screen_logger.info('\t\tCross section coordinates (%s, %s)' % (str(x_coordinate), str(y_coordinate)))
-
-                        x2            = x_coordinate
-                        y2            = y_coordinate
-
-                        if x_coordinate < x_left or  x_coordinate > x_right:
-                            errorMessage("Error: x coordinate (%s) of location %d is outside of raster (range %s to %s)" % (x_coordinate, point_number, x_left, x_right))
-
-                        if y_coordinate < y_lower or y_coordinate > y_upper:
-                            errorMessage("Error: y coordinate (%s) of location %d is outside of raster (range %s to %s)" % (y_coordinate, point_number, y_lower, y_upper))
-
-                        if point_number > 1:
-                            x_distance      = (x2 - x1) * (x2 - x1)
-                            y_distance      = (y2 - y1) * (y2 - y1)
-                            xy_distance     = math.sqrt(x_distance + y_distance)
-                            total_distance += xy_distance
-
-                        x1            = x_coordinate
-                        y1            = y_coordinate
-                                    
-                    screen_logger.info('\tCross section total distance %s' % str(total_distance))
-        
-                # Store data
-                #
-                rasterData = rc.read(1, masked=True)
-                
-                # Store nodata
-                #
-                noData = rc.nodata
-                screen_logger.info('\tnoData %s' % str(noData))
-
-                screen_logger.info('\nProcessing raster %s' % raster)
-
-        except:
-            errorMessage('Error: Opening and reading raster %s' % rasterFile)
-
-        # Store raster information
-        #
-        rasterD[raster] = {
-            'name'    : raster,
-            'file'    : rasterFile,
-            'nodata'  : noData,
-            'data'    : rasterData
-         }
-
-# Compute cross section segments
-#
-rocks             = {}
-elevation_max     = -9999999999999999.99
-elevation_min     =  9999999999999999.99
-segment_no        = 0
-cell_count        = 0
-transect_distance = 0.0
-total_distance    = 0.0
-rowscols          = []
-
-screen_logger.info('\n\nBuilding cross section segments')
-for location in pointsL:
-    x_coordinate  = location[0]
-    y_coordinate  = location[1]
-
-    x2            = x_coordinate
-    y2            = y_coordinate
-   
-    # Compute row
-    #
-    end_row       = int( ( y_upper - y_coordinate ) / abs( y_cell_size ) )
-       
-    end_row_nu    = ( y_upper - y_coordinate ) / abs( y_cell_size )
-    
-    # Compute column
-    #
-    end_col       = int( abs( x_left - x_coordinate ) / x_cell_size )
-       
-    end_col_nu    = abs( x_left - x_coordinate ) / x_cell_size
-
-    rowscols.append((end_row, end_col))
-
-    if segment_no > 0:
-        x_distance      = (x2 - x1) * (x2 - x1)
-        y_distance      = (y2 - y1) * (y2 - y1)
-        xy_distance     = math.sqrt(x_distance + y_distance)
-        total_distance += xy_distance
-        
-        delta_row_nu    = float( end_row - start_row ) * x_cell_size
-        delta_col_nu    = float( end_col - start_col ) * x_cell_size
-        
-        # Sloping transect line
-        #
-        if delta_col_nu != 0.0:
-            slope     = delta_row_nu / delta_col_nu
-            b         = start_row_nu - slope * start_col_nu
-                        
-            delta_col =  1
-            if end_col_nu < start_col_nu:
-                delta_col = -1;
-        
-            delta_row =  1
-            if end_row_nu < start_row_nu:
-                delta_row = -1;
-        
-        # No sloping transect line
-        #
-        else:
-            slope     = 0.0
-            b         = start_row_nu
-            delta_col =  0
-            delta_row =  1
-            if end_row_nu < start_row_nu:
-                delta_row = -1;
-        
-        # Logging
+        if y_coordinate <= y_lower or y_coordinate > y_upper:
+            raise FrameworkError("Error: y coordinate (%s) of location %d is outside of raster (range %s to %s)" % (y_coordinate, point_number, y_lower, y_upper))
+
+        if point_number > 1:
+            x_distance      = (x2 - x1) * (x2 - x1)
+            y_distance      = (y2 - y1) * (y2 - y1)
+            xy_distance     = math.sqrt(x_distance + y_distance)
+            total_distance += xy_distance
+
+        x1            = x_coordinate
+        y1            = y_coordinate
+
+    # Locations outside the study area are rejected before any raster is read
+    #
+    (rows, cols) = rowCol(layers, [location[0] for location in pointsL], [location[1] for location in pointsL])
+    outside      = np.flatnonzero(~insideStudyArea(layers, rows, cols))
+    if outside.size > 0:
+        (x_coordinate, y_coordinate) = pointsL[outside[0]]
+        raise FrameworkError("Error: location %d (%s, %s) is outside of the study area" % (outside[0] + 1, x_coordinate, y_coordinate))
+
+    screen_logger.info('\tCross section total distance %s' % str(total_distance))
+
+    return total_distance
+
+# =============================================================================
+@timed('sample')
+def transectSamples(layers, pointsL):
+
+    x_left, y_lower, x_right, y_upper = layers['bounds']
+    x_cell_size = layers['x_cell_size']
+    y_cell_size = layers['y_cell_size']
+
+    # Sample rows, columns and distances along the transect in order, one
+    #  sample for each cell crossed at the distance the transect leaves it
+    #
+    rowsL             = []
+    colsL             = []
+    distancesL        = []
+    segment_no        = 0
+    transect_distance = 0.0
+    total_distance    = 0.0
+    rowscols          = []
+    last_cell         = None
+
+    screen_logger.info('\n\nBuilding cross section segments')
+    for location in pointsL:
+        x_coordinate  = location[0]
+        y_coordinate  = location[1]
+
+        x2            = x_coordinate
+        y2            = y_coordinate
+
+        # Compute row
         #
-        screen_logger.info('\tDelta col %d Delta row    %d' % (delta_col,delta_row))
-        screen_logger.info('\tStart row %d Start row nu %d' % (start_row,start_row_nu))
-        screen_logger.info('\tEnd row   %d End row nu   %d' % (end_row,end_row_nu))
-        screen_logger.info('\tStart col %d Start col nu %d' % (start_col,start_col_nu))
-        screen_logger.info('\tEnd col   %d End col nu   %d' % (end_col,end_col_nu))
-        screen_logger.info('\tCell x size %f y size %f' % (x_cell_size,y_cell_size))
-
-        # Build sampling points along row direction
+        end_row       = int( ( y_upper - y_coordinate ) / abs( y_cell_size ) )
+
+        end_row_nu    = ( y_upper - y_coordinate ) / abs( y_cell_size )
+
+        # Compute column
         #
-        screen_logger.info('\nSampling points along row direction')
-        row = start_row + delta_row
-        while (row != end_row):
+        end_col       = int( abs( x_left - x_coordinate ) / x_cell_size )
 
-            if slope != 0.0:
-                col_nu = ( row - b ) / slope
-            else:
-                col_nu = start_col
-                
-            col                   = int(col_nu)
-                           
-            delta_row_nu          = ( start_row_nu - row ) * x_cell_size
-            segment_row           = math.pow(delta_row_nu, 2.0)
-            delta_col_nu          = ( start_col_nu - col_nu ) * x_cell_size
-            segment_col           = math.pow(delta_col_nu, 2.0)
-            distance              = math.sqrt(segment_row + segment_col)
-            sample_distance       = transect_distance + distance
-            dist                  = int(sample_distance)
-
-            #screen_logger.info('\tRow %s Column %s Distance %s' % (str(row), str(col), str(distance)))
-            
-            #print "Row",row,"Col",col,"Distance",dist,"delta row",delta_row_nu,"delta col",delta_col_nu,"tran",transect_distance
-        
-            # Loop through rasters top to bottom
+        end_col_nu    = abs( x_left - x_coordinate ) / x_cell_size
+
+        rowscols.append((end_row, end_col))
+
+        if segment_no > 0:
+            x_distance      = (x2 - x1) * (x2 - x1)
+            y_distance      = (y2 - y1) * (y2 - y1)
+            xy_distance     = math.sqrt(x_distance + y_distance)
+            total_distance += xy_distance
+
+            (rows, cols, fractions) = segmentCells(start_row_nu, start_col_nu, end_row_nu, end_col_nu)
+
+            # The cell holding a vertex ends the previous segment and starts
+            #  this one, it is sampled once
             #
-            myTops = {}
-            for raster in rasters:
-        
-                # Read raster bands directly to Numpy arrays.
-                #
-                rasterData = rasterD[raster]['data']
-
-                rasterValue = rasterData[abs(row)][abs(col)]
-                if str(rasterValue) != '--' and not math.isnan(rasterValue):
-                    if rasterValue < elevation_min:
-                        elevation_min = rasterValue
-                    if rasterValue > elevation_max:
-                        elevation_max = rasterValue
-                else:
-                    rasterValue = None
-
-                myTops[raster] = rasterValue
-                #screen_logger.info('\tRaster %s cell value %s' % (raster, str(rasterValue)))
-
-                # Set rocks
-                #
-                if not raster in rocks:
-                    rocks[raster] = {}
-                if not dist in rocks[raster]:
-                    rocks[raster][dist] = {}
-         
-                rocks[raster][dist]["top"] = None
-                rocks[raster][dist]["bot"] = None
-
-            # Loop to set bottoms
+            if rows.size > 0 and (rows[0], cols[0]) == last_cell:
+                (rows, cols, fractions) = (rows[1:], cols[1:], fractions[1:])
+
+            # Logging
             #
-            tempL = list(rasters)
-            while len(tempL):
+            screen_logger.info('\tStart row %d Start row nu %d' % (start_row,start_row_nu))
+            screen_logger.info('\tEnd row   %d End row nu   %d' % (end_row,end_row_nu))
+            screen_logger.info('\tStart col %d Start col nu %d' % (start_col,start_col_nu))
+            screen_logger.info('\tEnd col   %d End col nu   %d' % (end_col,end_col_nu))
+            screen_logger.info('\tCell x size %f y size %f' % (x_cell_size,y_cell_size))
+            screen_logger.info('\tCells crossed %d' % rows.size)
+
+            rowsL.append(rows)
+            colsL.append(cols)
+            distancesL.append(transect_distance + fractions * xy_distance)
+
+            if rows.size > 0:
+                last_cell = (rows[-1], cols[-1])
+
+        x1                 = x_coordinate
+        y1                 = y_coordinate
+        start_row          = end_row
+        start_row_nu       = end_row_nu
+        start_col          = end_col
+        start_col_nu       = end_col_nu
+        segment_no        += 1
+        transect_distance  = total_distance
+
+    # Samples on the edge of the rasters are kept within the grid
+    #
+    rows = np.clip(np.concatenate(rowsL + [np.zeros(0, dtype=np.int64)]), 0, layers['nrows'] - 1)
+    cols = np.clip(np.concatenate(colsL + [np.zeros(0, dtype=np.int64)]), 0, layers['ncols'] - 1)
+
+    return {
+        'rows'           : rows,
+        'cols'           : cols,
+        'distances'      : np.concatenate(distancesL + [np.zeros(0)]),
+        'rowscols'       : rowscols,
+        'total_distance' : total_distance,
+        'cell_count'     : rows.size
+    }
 
-                raster = tempL.pop(0)
-        
-                # Raster information
-                #
-                top = myTops[raster]
+# =============================================================================
+def segmentCells(start_row_nu, start_col_nu, end_row_nu, end_col_nu):
 
-                if top is not None:
-                    rocks[raster][dist]["top"] = float(top)
-                            
-                    # Test for bottom
-                    #
-                    while len(tempL) > 0:
-                        
-                        botRaster = tempL.pop(0)
+    # Cells crossed by a segment in grid units (supercover traversal), the
+    #  fractions of the segment where it crosses a row or column line are
+    #  sorted and each span between crossings lies in one cell, found from
+    #  its midpoint, and ends at the fraction the segment leaves the cell
+    #
+    crossingsL = [np.array([0.0, 1.0])]
+    for (start_nu, end_nu) in [(start_row_nu, end_row_nu), (start_col_nu, end_col_nu)]:
+        if end_nu != start_nu:
+            lines = np.arange(math.floor(min(start_nu, end_nu)) + 1, math.ceil(max(start_nu, end_nu)), dtype=np.float64)
+            crossingsL.append((lines - start_nu) / (end_nu - start_nu))
+
+    # A corner crossed by the segment is one crossing, spans left by
+    #  rounding at a corner hold no cell
+    #
+    fractions = np.unique(np.clip(np.concatenate(crossingsL), 0.0, 1.0))
+    spans     = np.diff(fractions) > 1.0e-12
+    middles   = 0.5 * (fractions[:-1] + fractions[1:])[spans]
 
-                        bot = myTops[botRaster]
+    rows = np.floor(start_row_nu + middles * (end_row_nu - start_row_nu)).astype(np.int64)
+    cols = np.floor(start_col_nu + middles * (end_col_nu - start_col_nu)).astype(np.int64)
 
-                        if bot is not None:
-                            rocks[raster][dist]["bot"] = float(bot)
+    return (rows, cols, fractions[1:][spans])
 
-                            tempL.insert(0, botRaster)
+# =============================================================================
+def decimateSamples(tops, nbuckets):
 
-                            break
+    # Samples kept when the profile is split into buckets along the transect,
+    #  the first and last sample of each bucket and the samples holding the
+    #  lowest and highest top of each unit so contacts and pinch-outs remain
+    #
+    (nlays, nsamples) = tops.shape
+
+    if nbuckets is None or nsamples <= nbuckets * (2 * nlays + 2):
+        return np.arange(nsamples)
+
+    starts   = np.linspace(0, nsamples, nbuckets + 1).astype(np.int64)
+    bucketId = np.repeat(np.arange(nbuckets), np.diff(starts))
+    keepL    = [starts[:-1], starts[1:] - 1]
+
+    # Sorting within each bucket by top places the lowest first and the
+    #  highest last, units without a value in a bucket keep its edges
+    #
+    for k in range(nlays):
+        lowest  = np.where(np.isnan(tops[k]), np.inf, tops[k])
+        highest = np.where(np.isnan(tops[k]), np.inf, -tops[k])
+        keepL.append(np.lexsort((lowest, bucketId))[starts[:-1]])
+        keepL.append(np.lexsort((highest, bucketId))[starts[:-1]])
+
+    return np.unique(np.concatenate(keepL))
+
+# =============================================================================
+def buildCrossSection(layers, pointsL, nbuckets=None, factor=1):
+
+    # Sample rows, columns and distances for the whole transect, on a grid
+    #  coarser by the factor for a long bounded transect
+    #
+    level   = layersLevel(layers, factor)
+    samples = transectSamples(level, pointsL)
+    screen_logger.info('\nNumber of samples %d at level factor %d' % (samples['rows'].size, factor))
+
+    # Cell values of all layers for all samples (nlays, nsamples)
+    #
+    values = readCells(level, samples['rows'], samples['cols'])
+
+    xsec = sampledSection(level, pointsL, samples, values, nbuckets)
+
+    # End points and grid are given at native resolution, the cell width is
+    #  that of the cells sampled
+    #
+    if factor > 1:
+        x_left, y_lower, x_right, y_upper = layers['bounds']
+        xsec['rowscols'] = [(int((y_upper - y) / abs(layers['y_cell_size'])), int(abs(x_left - x) / layers['x_cell_size'])) for (x, y) in pointsL]
+        xsec['nrows']    = layers['nrows']
+        xsec['ncols']    = layers['ncols']
+
+    return xsec
+
+# =============================================================================
+@timed('sample')
+def sampledSection(layers, pointsL, samples, values, nbuckets=None):
+
+    rasters = layers['rasters']
+
+    elevation_max = -9999999999999999.99
+    elevation_min =  9999999999999999.99
+    if np.any(~np.isnan(values)):
+        elevation_max = np.nanmax(values)
+        elevation_min = np.nanmin(values)
+
+    # Samples are in order along the transect, one for each cell crossed
+    #
+    distances = samples['distances']
+
+    # Tops and bottoms of all layers (nlays, nsamples), the bottom is the
+    #  next surface below holding a value
+    #
+    below = readBelow(layers, samples['rows'], samples['cols'], values)
+    tops  = values
+
+    # Bounded number of samples
+    #
+    keep = decimateSamples(tops, nbuckets)
+
+    # Samples other sections line up with are always kept
+    #
+    if 'required' in samples and keep.size < distances.size:
+        keep = np.union1d(keep, np.flatnonzero(np.isin(distances, samples['required'])))
+
+    if keep.size < distances.size:
+        screen_logger.info('\nNumber of samples decimated to %d' % keep.size)
+        distances = distances[keep]
+        tops      = tops[:, keep]
+        below     = below[:, keep]
+
+    bots = layerBottoms(tops, below)
+
+    return {
+        'rasters'       : rasters,
+        'points'        : pointsL,
+        'rowscols'      : samples['rowscols'],
+        'distances'     : distances,
+        'tops'          : tops,
+        'bots'          : bots,
+        'nrows'         : layers['nrows'],
+        'ncols'         : layers['ncols'],
+        'cell_width'    : layers['x_cell_size'],
+        'cell_count'    : samples['cell_count'],
+        'elevation_min' : elevation_min,
+        'elevation_max' : elevation_max
+    }
+
+# =============================================================================
+@timed('serialize')
+def crossSectionJson(xsec):
+
+    rasters   = xsec['rasters']
+    distances = xsec['distances']
+    tops      = xsec['tops']
+    bots      = xsec['bots']
 
-            row += delta_row
-        
-        # Build sampling points along column direction
-        #
-        screen_logger.info('\nSampling points along column direction')
-        col = start_col + delta_col
-        while (col != end_col):
-        
-            row_nu                = slope * col + b
-            row                   = int(row_nu)
-                           
-            delta_row_nu          = ( start_row_nu - row ) * x_cell_size
-            segment_row           = math.pow(delta_row_nu, 2.0)
-            delta_col_nu          = ( start_col_nu - col ) * x_cell_size
-            segment_col           = math.pow(delta_col_nu, 2.0)
-            distance              = math.sqrt(segment_row + segment_col)
-            sample_distance       = transect_distance + distance
-            dist                  = int(sample_distance)
-                
-            # Loop through rasters
-            #
-            myTops = {}
-            for raster in rasters:
-
-                # Read raster bands directly to Numpy arrays.
-                #
-                rasterData = rasterD[raster]['data']
-
-                rasterValue = rasterData[abs(row)][abs(col)]
-                if str(rasterValue) != '--' and not math.isnan(rasterValue):
-                    if rasterValue < elevation_min:
-                        elevation_min = rasterValue
-                    if rasterValue > elevation_max:
-                        elevation_max = rasterValue
-                else:
-                    rasterValue = None
-                            
-                myTops[raster] = rasterValue
-                #screen_logger.info('\tRaster %s cell value %s' % (raster, str(rasterValue)))
-
-                # Set rocks
-                #
-                if not raster in rocks:
-                    rocks[raster] = {}
-                if not dist in rocks[raster]:
-                    rocks[raster][dist] = {}
-         
-                rocks[raster][dist]["top"] = None
-                rocks[raster][dist]["bot"] = None
-
-            # Loop to set bottoms
-            #
-            tempL = list(rasters)
-            while len(tempL):
-
-                raster = tempL.pop(0)
-        
-                # Raster information
-                #
-                top = myTops[raster]
-
-                if top is not None:
-                    rocks[raster][dist]["top"] = float(top)
-                            
-                    # Test for bottom
-                    #
-                    while len(tempL) > 0:
-                        
-                        botRaster = tempL.pop(0)
-
-                        bot = myTops[botRaster]
-
-                        if bot is not None:
-                            rocks[raster][dist]["bot"] = float(bot)
-
-                            tempL.insert(0, botRaster)
-
-                            break
-                        
-            col += delta_col
-
-    x1                 = x_coordinate
-    y1                 = y_coordinate
-    start_row          = end_row
-    start_row_nu       = end_row_nu
-    start_col          = end_col
-    start_col_nu       = end_col_nu
-    segment_no        += 1
-    transect_distance  = total_distance
-
-# Plot rasters
-#
-try:
     # Begin JSON format
     #
     jsonL = []
     jsonL.append('{')
     jsonL.append('  "status"        : "%s",' % "success")
-     
+
     linesL = []
     i      = 0
-    for location in pointsL:
+    for location in xsec['points']:
         x_coordinate  = location[0]
         y_coordinate  = location[1]
-        row           = rowscols[i][0]
-        col           = rowscols[i][1]
+        row           = xsec['rowscols'][i][0]
+        col           = xsec['rowscols'][i][1]
 
         i            += 1
         ptList = []
@@ -638,71 +581,237 @@ try:
         ptList.append("                      }")
 
         linesL.append('%s' % '\n'.join(ptList))
-    
+
     jsonL.append('  "points" : ')
-    jsonL.append('           {')        
+    jsonL.append('           {')
     jsonL.append('%s' % ',\n'.join(linesL))
     jsonL.append('           },')
-    
+
     # Draw rasters
     #
     myRocks = []
     x_max   = -9999999999999999.99
     x_min   =  0.0
-    for raster in rasters:
+    for k, raster in enumerate(rasters):
 
         # Loop through distance
         #
         last_distance = 0.0
         myRecords     = []
 
-        for distance in sorted(rocks[raster].keys()):
+        for i, distance in enumerate(distances):
 
             # Set top and bottom
             #
-            top    = rocks[raster][distance]['top']
-            bot    = rocks[raster][distance]['bot']
-            
-            if top is not None:
+            top    = tops[k, i]
+            bot    = bots[k, i]
+
+            if not np.isnan(top):
                 top_txt = "%.2f" % top
             else:
                 top_txt = "null"
-                
-            if bot is not None:
+
+            if not np.isnan(bot):
                 bot_txt = "%.2f" % bot
             else:
                 bot_txt = "null"
 
             myRecords.append('{ "x": %10.3f, "top": %s, "bot": %s }' % (last_distance,top_txt,bot_txt))
-                                 
+
             myRecords.append('{ "x": %10.3f, "top": %s, "bot": %s }' % (distance,top_txt,bot_txt))
 
             last_distance = distance
-        
+
             if distance > x_max:
                 x_max = distance
 
         # Set unit
         #
         myRocks.append( '"%s" : [%s]' % (raster, ','.join(myRecords)))
-    
+
     jsonL.append('  "rocks" : {')
     jsonL.append('             %s' % ',\n'.join(myRocks))
     jsonL.append('},')
-  
-    jsonL.append('  "nrows"         : %15d,' % nrows)
-    jsonL.append('  "ncols"         : %15d,' % ncols)
+
+    jsonL.append('  "nrows"         : %15d,' % xsec['nrows'])
+    jsonL.append('  "ncols"         : %15d,' % xsec['ncols'])
     jsonL.append('  "nlays"         : %15d,' % len(rasters))
-    jsonL.append('  "cell_width"    : %15.2f,' % x_cell_size)
-    jsonL.append('  "cell_count":    %15d,'   % cell_count)
+    jsonL.append('  "cell_width"    : %15.2f,' % xsec['cell_width'])
+    jsonL.append('  "cell_count":    %15d,'   % xsec['cell_count'])
     jsonL.append('  "x_axis_min":    %15.2f,' % x_min)
     jsonL.append('  "x_axis_max":    %15.2f,' % x_max)
-    jsonL.append('  "elevation_min": %15.2f,' % elevation_min)
-    jsonL.append('  "elevation_max": %15.2f'  % elevation_max)
+    jsonL.append('  "elevation_min": %15.2f,' % xsec['elevation_min'])
+    jsonL.append('  "elevation_max": %15.2f'  % xsec['elevation_max'])
     jsonL.append('}')
-        
-    print('Content-type: application/json\n')
-    print('\n'.join(jsonL))
 
-except IOError:
-    errorMessage("Error: Cannot create cross section")
+    return '\n'.join(jsonL)
+
+# =============================================================================
+@timed('serialize')
+def columnarJson(xsec, binary=False):
+
+    rasters   = xsec['rasters']
+    distances = xsec['distances']
+
+    # Arrays as lists with null for no value, or as base64 float32
+    #
+    if binary:
+        def column(values, decimals):
+            return base64.b64encode(np.asarray(values, dtype='<f4').tobytes()).decode('ascii')
+    else:
+        def column(values, decimals):
+            values = np.round(np.asarray(values, dtype=np.float64), decimals)
+            return [None if math.isnan(value) else value for value in values.tolist()]
+
+    pointsD = {}
+    for i, location in enumerate(xsec['points']):
+        (row, col) = xsec['rowscols'][i]
+        pointsD['point_%d' % (i + 1)] = {
+            'easting'  : round(location[0], 2),
+            'northing' : round(location[1], 2),
+            'row'      : int(row),
+            'column'   : int(col)
+        }
+
+    rocksD = {}
+    for k, raster in enumerate(rasters):
+        rocksD[raster] = {
+            'top' : column(xsec['tops'][k], 2),
+            'bot' : column(xsec['bots'][k], 2)
+        }
+
+    x_max = -9999999999999999.99
+    if len(distances) > 0:
+        x_max = float(np.max(distances))
+
+    xsecD = {
+        'status'        : 'success',
+        'format'        : 'binary' if binary else 'columnar',
+        'points'        : pointsD,
+        'distances'     : column(distances, 3),
+        'rocks'         : rocksD,
+        'nrows'         : int(xsec['nrows']),
+        'ncols'         : int(xsec['ncols']),
+        'nlays'         : len(rasters),
+        'nsamples'      : len(distances),
+        'cell_width'    : round(float(xsec['cell_width']), 2),
+        'cell_count'    : int(xsec['cell_count']),
+        'x_axis_min'    : 0.0,
+        'x_axis_max'    : round(x_max, 2),
+        'elevation_min' : round(float(xsec['elevation_min']), 2),
+        'elevation_max' : round(float(xsec['elevation_max']), 2)
+    }
+    if binary:
+        xsecD['dtype'] = '<f4'
+
+    return json.dumps(xsecD, separators=(',', ':'))
+
+# =============================================================================
+def queryTag(queryString, layersVersion=None):
+
+    (rastersL, pointsL) = parseQuery(queryString)
+    myFormat            = outputFormat(queryString, outputFormats)
+    nbuckets            = parseBuckets(queryString, len(rastersL))
+    detail              = parseDetail(queryString)
+
+    # Version of the raster set, the resident service hands over the version
+    #  of the layers it has loaded
+    #
+    if layersVersion is None:
+        version = rasterSetVersion(rasterPaths(rastersL))
+    else:
+        version = layersVersion(rastersL)
+
+    return entityTag('xsec', rastersL, version, [pointsL, myFormat, nbuckets, detail, samplerName])
+
+# =============================================================================
+def processQuery(queryString, loadLayers=None):
+
+    (rastersL, pointsL) = parseQuery(queryString)
+    myFormat            = outputFormat(queryString, outputFormats)
+    nbuckets            = parseBuckets(queryString, len(rastersL))
+    detail              = parseDetail(queryString)
+
+    # Open rasters, only the window holding the transect is read. The resident
+    #  service hands over layers already loaded
+    #
+    if loadLayers is None:
+        layers = openLayers(rastersL)
+    else:
+        layers = loadLayers(rastersL)
+
+    total_distance = checkPoints(layers, pointsL)
+    factor         = levelFactor(layers, total_distance, nbuckets, detail)
+
+    # Cross section already computed for the transect
+    #
+    key      = cacheKey('xsec', layers, [pointsL, myFormat if myFormat in ['columnar', 'binary'] else 'json', nbuckets, factor, samplerName])
+    jsonText = cacheGet(key)
+    if jsonText is None:
+
+        xsec = buildCrossSection(layers, pointsL, nbuckets, factor)
+
+        try:
+            if myFormat in ['columnar', 'binary']:
+                jsonText = columnarJson(xsec, binary=(myFormat == 'binary'))
+            else:
+                jsonText = crossSectionJson(xsec)
+        except IOError:
+            raise FrameworkError("Error: Cannot create cross section")
+
+        cachePut(key, layers, jsonText)
+
+    if myFormat == 'compact':
+        jsonText = compactJson(jsonText)
+
+    return jsonText
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    # Parse the Query String
+    #
+    HardWired = None
+    #HardWired = 1
+
+    if HardWired is not None:
+        os.environ['QUERY_STRING'] = 'points=1632703.5944117,550449.4082453552 2173336.1637787456,281588.25451114046&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif&color=framework_color_map.txt'
+        os.environ['QUERY_STRING'] = 'points=2049733.082778196,461274.2283728898 2116538.356518111,440719.8276194666&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif&color=framework_color_map.txt'
+        os.environ['QUERY_STRING'] = 'points=1460426.6901486127,353832.73086095566 2792963.1439483366,283522.8834921515&rasters=tiffs/obtop.tif,tiffs/smtop.tif,tiffs/wntop.tif,tiffs/grtop.tif,tiffs/pmtop.tif'
+
+    # Check URL
+    #
+    QUERY_STRING = ''
+
+    if 'QUERY_STRING' in os.environ:
+        QUERY_STRING = str(os.environ['QUERY_STRING'])
+
+    screen_logger.info('\nQUERY_STRING: %s' % QUERY_STRING)
+
+    startRequest()
+
+    try:
+        etag = queryTag(QUERY_STRING)
+
+        # Client already holds this response
+        #
+        if printNotModified(etag, os.environ.get('HTTP_IF_NONE_MATCH'), os.environ.get('HTTP_ACCEPT_ENCODING')):
+            finishRequest('framework_xsec.py', 'not_modified')
+            sys.exit()
+
+        jsonText = processQuery(QUERY_STRING)
+    except FrameworkError as e:
+        errorMessage(str(e))
+
+    # Stage timings in a Server-Timing header, and in the response when asked
+    #  for since it is then no longer cacheable
+    #
+    timingsD = finishRequest('framework_xsec.py', 'success')
+    if timingsRequested(QUERY_STRING):
+        jsonText = timingsJson(jsonText, timingsD)
+        etag     = None
+
+    printResponse(jsonText, etag, os.environ.get('HTTP_ACCEPT_ENCODING'), [('Server-Timing', serverTiming(timingsD))])
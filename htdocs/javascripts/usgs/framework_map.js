@@ -37,7 +37,10 @@
 var markerLayer;
 var profileLayer;
 var boundaryLayer;
+var insideLayer        = null;
 var StudyBoundary
+var boundaryLevels     = null;
+var boundaryFile       = null;
 var longlats           = [];
 
 var myZoomFlag         = false;
@@ -98,6 +101,10 @@ function buildMap () {
 
     boundaryLayer.addTo(map).bringToFront();
 
+    // Study boundary for the inside test of locations, not drawn
+    //
+    loadInsideBoundary();
+
     // Surfical Geology overlay
     //
     dummyPane = map.createPane('surficalGeology');
@@ -270,6 +277,7 @@ function buildMap () {
         {
             surficalGeology.setOpacity(controlGeologyOpacity.opacity);
         }
+        updateBoundaryLevel(mapZoomLevel);
         myLogger.info(`Zoom level ${map.getZoom()}`)
         //jQuery( ".mapZoom" ).html( "<b>Zoom Level: </b>" + map.getZoom());
         //jQuery( ".latlng" ).html(evt.latlng.lng.toFixed(3) + ", " + evt.latlng.lat.toFixed(3));
@@ -378,7 +386,7 @@ function userCoords()
 
     // Point inside model grid
     //
-      if(isPointInPoly(boundaryLayer, [long, lat]))
+      if(isPointInPoly(insideLayer || boundaryLayer, [long, lat]))
       {                                              
         // Place marker on map
         //
@@ -435,7 +443,7 @@ function onMapClick(markerLayer, evt)
   
       // Point inside raster grid
       //
-      if(isPointInPoly(boundaryLayer, [long, lat]))
+      if(isPointInPoly(insideLayer || boundaryLayer, [long, lat]))
         {                                              
           // Place marker on map
           //
@@ -602,6 +610,50 @@ function resetCrossSection(markerLayer, profileLayer)
       }
   }
  
+// Replace the study boundary with the simplified level of the zoom level
+//
+function updateBoundaryLevel(zoomLevel) {
+
+    if(!boundaryLevels) return;
+
+    let level = boundaryLevels.find(item => zoomLevel >= item.minzoom && zoomLevel <= item.maxzoom);
+    if(!level) level = boundaryLevels[boundaryLevels.length - 1];
+
+    if(level.file == boundaryFile) return;
+    boundaryFile = level.file;
+
+    myLogger.info(`Study boundary level ${level.file} for zoom level ${zoomLevel}`)
+
+    webRequests([level.file], 'json', function(myData) {
+
+        // A later zoom has asked for another level
+        //
+        if(level.file != boundaryFile) return;
+
+        boundaryLayer.clearLayers();
+        boundaryLayer.addData(myData[0]);
+    });
+}
+
+// Study boundary for the inside test of locations, the finest simplified
+//  level (well under a metre from the study boundary) when the map draws
+//  simplified levels, the drawn study boundary otherwise. Until the finest
+//  level arrives the drawn level is tested
+//
+function loadInsideBoundary() {
+
+    if(!boundaryLevels) {
+        insideLayer = boundaryLayer;
+        return;
+    }
+
+    let finest = boundaryLevels.reduce((best, item) => item.maxzoom > best.maxzoom ? item : best);
+
+    webRequests([finest.file], 'json', function(myData) {
+        insideLayer = L.geoJson(myData[0]);
+    });
+}
+
 // Determine if a point is within Model grid
 //
 function isPointInPoly(poly, pt) {
@@ -95,9 +95,16 @@ function processAboutFiles(myInfo) {
     //
     let urls = [];
 
-    // Web request
+    // Web request, the simplified study boundary for the first zoom levels
+    //  when the levels are listed, otherwise the full study boundary
     //
-    if(study_boundary) {
+    if(typeof study_boundary_levels !== 'undefined' && study_boundary_levels) {
+
+        // Call the async function
+        //
+        requestBoundaryLevels(`${study_boundary_levels}`)
+    }
+    else if(study_boundary) {
         urls.push(`${study_boundary}`);
 
         // Call the async function
@@ -106,6 +113,39 @@ function processAboutFiles(myInfo) {
     }
 }
 
+// Request simplified study boundary levels and the first level, the full
+//  study boundary is drawn when either cannot be fetched
+//
+async function requestBoundaryLevels(levelsUrl) {
+    myLogger.info("requestBoundaryLevels");
+
+    let boundary = null;
+
+    try {
+        let response = await fetch(levelsUrl);
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status} for ${response.url}`);
+
+        let levels = (await response.json())['studyarea'];
+
+        response = await fetch(levels[0]['file']);
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status} for ${response.url}`);
+
+        boundary       = await response.json();
+        boundaryLevels = levels;
+        boundaryFile   = levels[0]['file'];
+
+    } catch (error) {
+        console.warn(`Simplified study boundary levels not available, using the full study boundary: ${error}`)
+        boundaryLevels = null;
+        boundaryFile   = null;
+
+        if(study_boundary) webRequests([`${study_boundary}`], 'json', processStudyBoundary)
+        return;
+    }
+
+    processStudyBoundary([boundary])
+}
+
 // Process study boundary information
 //
 function processStudyBoundary(myData) {
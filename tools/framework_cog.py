@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_cog
+# Purpose:  This script prepares the framework rasters as Cloud-Optimized
+#           GeoTIFFs. The rasters listed in the lookup file are checked to
+#           share one grid, transform, CRS and nodata value, and each is
+#           rewritten with tiled blocks, predictor-aware compression and
+#           nearest-neighbour overviews so windowed reads decode only the
+#           blocks under a window. The check alone reports rasters whose
+#           layout forces full-band or full-width strip decoding.
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+###############################################################################
+
+import os, sys
+
+import argparse
+
+import rasterio
+import rasterio.shutil
+
+# Set up logging
+#
+import logging
+
+# -- Set logging file
+#
+# Create screen handler
+#
+screen_logger = logging.getLogger()
+formatter     = logging.Formatter(fmt='%(message)s')
+console       = logging.StreamHandler()
+console.setFormatter(formatter)
+screen_logger.addHandler(console)
+screen_logger.setLevel(logging.INFO)
+screen_logger.propagate = False
+
+# Shared raster layer handling
+#
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cgi-bin'))
+
+from framework_layers import layoutProblem
+from framework_cube import lookupRasters
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+program      = "USGS Cloud-Optimized GeoTIFF Script"
+version      = "1.01"
+version_date = "October 18, 2026"
+usage_message = """
+Usage: framework_cog.py
+                [--help]
+                [--usage]
+                [--lookup                  Provide the framework lookup file listing the rasters (rasterL)]
+                [--directory               Provide the directory the raster paths in the lookup file are relative to]
+                [--output                  Provide the directory to hold the rewritten rasters, default in place]
+                [--blocksize               Provide the block size in cells of the rewritten rasters]
+                [--compress                Provide the compression of DEFLATE, LZW or ZSTD]
+                [--check                   Check the rasters only without rewriting them]
+"""
+
+# =============================================================================
+def rasterLayout(rasterPath):
+
+    with rasterio.open(rasterPath) as rc:
+        return {
+            'shape'       : rc.shape,
+            'transform'   : rc.transform,
+            'crs'         : rc.crs,
+            'nodata'      : rc.nodata,
+            'dtype'       : rc.dtypes[0],
+            'block'       : rc.block_shapes[0],
+            'compression' : rc.compression.value if rc.compression is not None else 'NONE',
+            'overviews'   : rc.overviews(1),
+            'problem'     : layoutProblem(rc)
+        }
+
+# =============================================================================
+def checkRasters(rastersL):
+
+    # Grid problems stop a rewrite, layout problems are what a rewrite fixes
+    #
+    gridL   = []
+    layoutL = []
+
+    (firstRaster, firstPath) = rastersL[0]
+    first = rasterLayout(firstPath)
+
+    for (raster, rasterPath) in rastersL:
+
+        layout = rasterLayout(rasterPath)
+
+        screen_logger.info('\tLayer %-12s %s block %dx%d compression %s overviews %s' % (raster, layout['dtype'],
+                           layout['block'][0], layout['block'][1], layout['compression'], layout['overviews'] or 'none'))
+
+        for key in ['shape', 'transform', 'crs', 'nodata', 'dtype']:
+            if str(layout[key]) != str(first[key]):
+                gridL.append('Raster %s %s %s differs from %s %s' % (raster, key, layout[key], firstRaster, first[key]))
+
+        if layout['problem'] is not None:
+            layoutL.append('Raster %s %s' % (raster, layout['problem']))
+        elif layout['compression'] == 'NONE':
+            layoutL.append('Raster %s is not compressed' % raster)
+        elif len(layout['overviews']) < 1 and max(layout['shape']) > layout['block'][0]:
+            layoutL.append('Raster %s has no overviews' % raster)
+
+    return (gridL, layoutL)
+
+# =============================================================================
+def rewriteRaster(rasterPath, outputPath, blocksize, compress):
+
+    # Floating point rasters compress best with the floating point
+    #  predictor, integer rasters with horizontal differencing
+    #
+    with rasterio.open(rasterPath) as rc:
+        predictor = 3 if rc.dtypes[0].startswith('float') else 2
+
+    tempPath = '%s.tmp.tif' % os.path.splitext(outputPath)[0]
+
+    rasterio.shutil.copy(rasterPath, tempPath,
+                         driver='COG',
+                         BLOCKSIZE=blocksize,
+                         COMPRESS=compress,
+                         PREDICTOR=predictor,
+                         OVERVIEWS='AUTO',
+                         RESAMPLING='NEAREST',
+                         BIGTIFF='IF_SAFER')
+
+    os.replace(tempPath, outputPath)
+
+    return outputPath
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    toolDir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description=program, usage=usage_message)
+    parser.add_argument('--usage', action='store_true')
+    parser.add_argument('--lookup', default=os.path.join(toolDir, '..', 'htdocs', 'data', 'framework_lookup.json'))
+    parser.add_argument('--directory', default='.')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--blocksize', type=int, default=512)
+    parser.add_argument('--compress', choices=['DEFLATE', 'LZW', 'ZSTD'], default='DEFLATE')
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+
+    if args.usage:
+        print(usage_message)
+        sys.exit()
+
+    rastersL = lookupRasters(args.lookup, args.directory)
+
+    for (raster, rasterPath) in rastersL:
+        if not os.path.isfile(rasterPath):
+            screen_logger.error('Error: Raster file %s does not exist' % rasterPath)
+            sys.exit(1)
+
+    screen_logger.info('Checking %d rasters' % len(rastersL))
+
+    (gridL, layoutL) = checkRasters(rastersL)
+
+    for message in gridL:
+        screen_logger.error('Error: %s' % message)
+    for message in layoutL:
+        screen_logger.warning('Warning: %s' % message)
+
+    if len(gridL) > 0:
+        screen_logger.error('Error: Rasters do not share one grid, fix them before rewriting')
+        sys.exit(1)
+
+    if args.check:
+        sys.exit(1 if len(layoutL) > 0 else 0)
+
+    # Rewrite each raster, the layer cube built from the rasters must be
+    #  rebuilt afterwards as the raster versions change
+    #
+    for (raster, rasterPath) in rastersL:
+
+        outputPath = rasterPath
+        if args.output is not None:
+            outputPath = os.path.join(args.output, os.path.relpath(rasterPath, args.directory))
+            os.makedirs(os.path.dirname(outputPath), exist_ok=True)
+
+        screen_logger.info('\tRewriting %s to %s' % (raster, outputPath))
+        rewriteRaster(rasterPath, outputPath, args.blocksize, args.compress)
+
+    screen_logger.info('Done, rebuild the layer cube with framework_cube.py')
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_cube
+# Purpose:  This script builds the stacked layer cube for the framework
+#           rasters. The ordered raster list (rasterL) in the lookup file is
+#           stacked into one array of shape (nlays, nrows, ncols) with nodata
+#           as NaN and saved beside the rasters with a sidecar holding the
+#           transform, bounds and CRS. The framework scripts memory-map the
+#           cube in place of opening and decoding each GeoTIFF. A compact
+#           cube holds the elevations as scaled integers (int16 or int32)
+#           with a layer offset and a nodata sentinel, decoded only when
+#           cells are sampled. Derived layers of the thickness of each
+#           unit, the depth of its top below land surface and the index of
+#           the next layer below holding a value can be built with the cube
+#           so the framework scripts look them up.
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+###############################################################################
+
+import os, sys
+
+import argparse
+
+import numpy as np
+import rasterio
+
+import json
+
+# Set up logging
+#
+import logging
+
+# -- Set logging file
+#
+# Create screen handler
+#
+screen_logger = logging.getLogger()
+formatter     = logging.Formatter(fmt='%(message)s')
+console       = logging.StreamHandler()
+console.setFormatter(formatter)
+if len(screen_logger.handlers) < 1:
+    screen_logger.addHandler(console)
+screen_logger.setLevel(logging.INFO)
+screen_logger.propagate = False
+
+# Shared raster layer handling
+#
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cgi-bin'))
+
+from framework_layers import readLookup, cubeFiles, derivedFiles, rasterVersion, quantizeLayer, layerOffset, quantizedCube, decodeCells, derivedCells
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+program      = "USGS Raster Layer Cube Script"
+version      = "1.01"
+version_date = "October 18, 2026"
+usage_message = """
+Usage: framework_cube.py
+                [--help]
+                [--usage]
+                [--lookup                  Provide the framework lookup file listing the rasters (rasterL)]
+                [--directory               Provide the directory the raster paths in the lookup file are relative to]
+                [--quantize                Provide int16 or int32 to hold the elevations as scaled integers]
+                [--scale                   Provide the step in feet of the scaled integers, 0.01 (centi-foot) by default]
+                [--derived                 Build the derived thickness, depth and next layer below with the cube]
+"""
+
+# Rows of the cube processed at a time when building the derived layers
+#
+bandRows = 256
+
+# =============================================================================
+def lookupRasters(lookupFile, directory):
+
+    # Raster paths in rasterL order
+    #
+    lookupD  = readLookup(lookupFile)
+    pathsD   = {}
+    for rasterFile in lookupD.get('rasters', []):
+        (root, tif_suffix) = os.path.splitext(os.path.basename(rasterFile))
+        pathsD[root] = rasterFile
+
+    rastersL = []
+    for raster in lookupD['rasterL']:
+        rasterFile = pathsD.get(raster, os.path.join('tiffs', '%s.tif' % raster))
+        rastersL.append((raster, os.path.join(directory, rasterFile)))
+
+    return rastersL
+
+# =============================================================================
+def buildCube(rastersL, quantize=None, scale=0.01, derived=False):
+
+    # Grid of the first raster, all rasters must share it
+    #
+    with rasterio.open(rastersL[0][1]) as rc:
+        profile = rc.profile
+        bounds  = rc.bounds
+        crs     = rc.crs
+        dtype   = np.result_type(rc.dtypes[0], np.float32)
+
+    nlays = len(rastersL)
+    nrows = profile['height']
+    ncols = profile['width']
+
+    cubeDir = os.path.dirname(rastersL[0][1])
+    (cubeFile, sidecarFile) = cubeFiles(cubeDir)
+    tempFile = '%s.tmp.npy' % cubeFile[:-4]
+
+    screen_logger.info('Building layer cube %s (%d layers, %d rows, %d columns)' % (cubeFile, nlays, nrows, ncols))
+
+    # Temporary files are removed when the cube is not built, a mismatched
+    #  or unquantizable raster leaves nothing beside the rasters
+    #
+    tempsL = [tempFile, '%s.tmp' % sidecarFile] + ['%s.tmp.npy' % derivedFile[:-4] for derivedFile in derivedFiles(cubeDir).values()]
+
+    try:
+        # Write one band at a time into the mapped cube
+        #
+        cubeType = dtype if quantize is None else np.dtype(quantize)
+        cube     = np.lib.format.open_memmap(tempFile, mode='w+', dtype=cubeType, shape=(nlays, nrows, ncols))
+        nodataL  = []
+        offsetsL = []
+        for i, (raster, rasterPath) in enumerate(rastersL):
+
+            with rasterio.open(rasterPath) as rc:
+                if rc.shape != (nrows, ncols) or rc.transform != profile['transform'] or rc.crs != crs:
+                    raise ValueError('Raster %s is not on the grid of %s' % (rasterPath, rastersL[0][1]))
+
+                screen_logger.info('\tLayer %d %s' % (i, raster))
+                rasterData = rc.read(1, masked=True)
+                layerData  = np.ma.filled(rasterData.astype(dtype), np.nan)
+                nodataL.append(rc.nodata)
+
+            if quantize is None:
+                cube[i] = layerData
+                continue
+
+            try:
+                (cube[i], offset) = quantizeLayer(layerData, cubeType, scale)
+            except ValueError as e:
+                raise ValueError('Raster %s: %s' % (rasterPath, str(e)))
+            offsetsL.append(offset)
+
+        cube.flush()
+        del cube
+
+        sidecar = {
+            'rasters'   : [raster for (raster, rasterPath) in rastersL],
+            'sources'   : [rasterVersion(rasterPath) for (raster, rasterPath) in rastersL],
+            'nrows'     : nrows,
+            'ncols'     : ncols,
+            'dtype'     : np.dtype(dtype).name,
+            'nodata'    : nodataL,
+            'transform' : list(profile['transform'])[:6],
+            'bounds'    : list(bounds),
+            'crs'       : crs.to_wkt(),
+            'proj4'     : crs.to_proj4()
+        }
+        if quantize is not None:
+            sidecar['quantized'] = {
+                'dtype'    : cubeType.name,
+                'scale'    : scale,
+                'offsets'  : offsetsL,
+                'sentinel' : int(np.iinfo(cubeType).min)
+            }
+
+        derivedD = {}
+        if derived:
+            derivedD = buildDerived(tempFile, sidecar, derivedFiles(cubeDir))
+
+        # Replace the cube, derived layers and sidecar together
+        #
+        with open('%s.tmp' % sidecarFile, 'w') as fh:
+            json.dump(sidecar, fh, indent=2)
+
+        for derivedFile in derivedFiles(cubeDir).values():
+            if derivedFile in derivedD:
+                os.replace(derivedD[derivedFile], derivedFile)
+            elif os.path.isfile(derivedFile):
+                os.remove(derivedFile)
+
+        os.replace(tempFile, cubeFile)
+        os.replace('%s.tmp' % sidecarFile, sidecarFile)
+    finally:
+        for temp in tempsL:
+            if os.path.isfile(temp):
+                os.remove(temp)
+
+    screen_logger.info('Done with layer cube %s' % cubeFile)
+
+    return cubeFile
+
+# =============================================================================
+def buildDerived(cubeFile, sidecar, derivedD):
+
+    # Derived layers computed from the cube values as the framework scripts
+    #  sample them, a band of rows at a time. Thickness and depth are held in
+    #  the dtype of the cube, as scaled integers of its scale and sentinel
+    #  for a quantized cube
+    #
+    cube   = np.load(cubeFile, mmap_mode='r')
+    (nlays, nrows, ncols) = cube.shape
+    layers = {'quantized': quantizedCube(sidecar), 'dtype': np.dtype(sidecar['dtype'])}
+
+    def derivedBands():
+        for row in range(0, nrows, bandRows):
+            band   = cube[:, row:row + bandRows, :]
+            values = decodeCells(layers, band.reshape(nlays, -1))
+            yield (row, band.shape, derivedCells(values))
+
+    dtypesD = {
+        'thickness' : cube.dtype,
+        'depth'     : cube.dtype,
+        'below'     : np.min_scalar_type(nlays)
+    }
+
+    # Offsets of the scaled thickness and depth of each layer centre their
+    #  range over the whole cube
+    #
+    offsetsD = {}
+    if layers['quantized'] is not None:
+        screen_logger.info('Measuring derived layers thickness, depth')
+
+        rangesD = dict([(name, [np.full(nlays, np.inf), np.full(nlays, -np.inf)]) for name in ['thickness', 'depth']])
+        for (row, shape, derived) in derivedBands():
+            for (name, (minima, maxima)) in rangesD.items():
+                valid = ~np.isnan(derived[name])
+                minima[:] = np.minimum(minima, np.where(valid, derived[name], np.inf).min(axis=1))
+                maxima[:] = np.maximum(maxima, np.where(valid, derived[name], -np.inf).max(axis=1))
+
+        scale = layers['quantized']['scale']
+        for (name, (minima, maxima)) in rangesD.items():
+            offsetsD[name] = [layerOffset(minimum, maximum, scale) if minimum <= maximum else 0.0 for (minimum, maximum) in zip(minima, maxima)]
+
+    tempD   = {}
+    mappedD = {}
+    for (name, derivedFile) in derivedD.items():
+        tempD[derivedFile] = '%s.tmp.npy' % derivedFile[:-4]
+        mappedD[name]      = np.lib.format.open_memmap(tempD[derivedFile], mode='w+', dtype=dtypesD[name], shape=(nlays, nrows, ncols))
+
+    screen_logger.info('Building derived layers %s' % ', '.join(sorted(derivedD)))
+
+    try:
+        for (row, shape, derived) in derivedBands():
+            for (name, mapped) in mappedD.items():
+                if name in offsetsD:
+                    for k in range(nlays):
+                        (mapped[k, row:row + bandRows, :], offset) = quantizeLayer(derived[name][k].reshape(shape[1:]), cube.dtype, scale, offsetsD[name][k])
+                else:
+                    mapped[:, row:row + bandRows, :] = derived[name].reshape(shape)
+    except ValueError as e:
+        raise ValueError('Derived layers: %s' % str(e))
+
+    for mapped in mappedD.values():
+        mapped.flush()
+
+    if layers['quantized'] is not None:
+        sidecar['derived'] = {
+            'quantized' : dict([(name, {'dtype': cube.dtype.name, 'scale': scale, 'offsets': offsets, 'sentinel': layers['quantized']['sentinel']})
+                                for (name, offsets) in offsetsD.items()])
+        }
+    else:
+        sidecar['derived'] = {}
+
+    return tempD
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    toolDir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description=program, usage=usage_message)
+    parser.add_argument('--usage', action='store_true')
+    parser.add_argument('--lookup', default=os.path.join(toolDir, '..', 'htdocs', 'data', 'framework_lookup.json'))
+    parser.add_argument('--directory', default='.')
+    parser.add_argument('--quantize', choices=['int16', 'int32'], default=None)
+    parser.add_argument('--scale', type=float, default=0.01)
+    parser.add_argument('--derived', action='store_true')
+    args = parser.parse_args()
+
+    if args.usage:
+        print(usage_message)
+        sys.exit()
+
+    rastersL = lookupRasters(args.lookup, args.directory)
+
+    for (raster, rasterPath) in rastersL:
+        if not os.path.isfile(rasterPath):
+            screen_logger.error('Error: Raster file %s does not exist' % rasterPath)
+            sys.exit(1)
+
+    try:
+        buildCube(rastersL, args.quantize, args.scale, args.derived)
+    except ValueError as e:
+        screen_logger.error('Error: %s' % str(e))
+        sys.exit(1)
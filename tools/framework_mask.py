@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_mask
+# Purpose:  This script builds the study area mask for the framework
+#           rasters. The study area boundary (htdocs/gis/studyarea.geojson)
+#           is projected to the raster coordinate system and rasterized on
+#           the grid of the rasters listed in the lookup file. The mask is
+#           saved beside the rasters with a sidecar holding the grid, and
+#           the framework scripts reject locations outside it before any
+#           raster is read.
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+
+import os, sys
+
+import argparse
+
+import numpy as np
+import rasterio
+import rasterio.features
+import rasterio.warp
+
+import json
+
+# Set up logging
+#
+import logging
+
+# -- Set logging file
+#
+# Create screen handler
+#
+screen_logger = logging.getLogger()
+formatter     = logging.Formatter(fmt='%(message)s')
+console       = logging.StreamHandler()
+console.setFormatter(formatter)
+screen_logger.addHandler(console)
+screen_logger.setLevel(logging.INFO)
+screen_logger.propagate = False
+
+# Shared raster layer handling
+#
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cgi-bin'))
+
+from framework_layers import maskFiles, rasterVersion, longlatCrs
+from framework_cube import lookupRasters
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+program      = "USGS Study Area Mask Script"
+version      = "1.01"
+version_date = "October 18, 2026"
+usage_message = """
+Usage: framework_mask.py
+                [--help]
+                [--usage]
+                [--lookup                  Provide the framework lookup file listing the rasters (rasterL)]
+                [--directory               Provide the directory the raster paths in the lookup file are relative to]
+                [--studyarea               Provide the GeoJSON file of the study area boundary]
+                [--centres                 Keep only cells with their centre inside, otherwise every cell the boundary touches]
+"""
+
+# =============================================================================
+def studyAreaShapes(studyAreaFile, dst_crs):
+
+    # Study area polygons projected from longitude and latitude (GeoJSON)
+    #  to the raster coordinate system
+    #
+    with open(studyAreaFile, 'r') as fh:
+        studyArea = json.load(fh)
+
+    src_crs = studyArea.get('crs', {}).get('properties', {}).get('name', longlatCrs)
+
+    shapesL = []
+    for feature in studyArea.get('features', []):
+        if feature.get('geometry') is None:
+            continue
+        shapesL.append(rasterio.warp.transform_geom(src_crs, dst_crs, feature['geometry']))
+
+    return shapesL
+
+# =============================================================================
+def buildMask(rastersL, studyAreaFile, all_touched=True):
+
+    # Grid of the first raster, all rasters share it
+    #
+    with rasterio.open(rastersL[0][1]) as rc:
+        nrows     = rc.height
+        ncols     = rc.width
+        transform = rc.transform
+        crs       = rc.crs
+
+    maskDir = os.path.dirname(rastersL[0][1])
+    (maskFile, sidecarFile) = maskFiles(maskDir)
+
+    screen_logger.info('Building study area mask %s (%d rows, %d columns)' % (maskFile, nrows, ncols))
+
+    shapesL = studyAreaShapes(studyAreaFile, crs)
+    if len(shapesL) < 1:
+        raise ValueError('Study area %s holds no polygons' % studyAreaFile)
+
+    mask = rasterio.features.rasterize([(shape, 1) for shape in shapesL],
+                                       out_shape=(nrows, ncols),
+                                       transform=transform,
+                                       fill=0,
+                                       all_touched=all_touched,
+                                       dtype='uint8').astype(bool)
+
+    screen_logger.info('\tCells inside the study area %d of %d' % (np.count_nonzero(mask), mask.size))
+
+    sidecar = {
+        'source'    : rasterVersion(studyAreaFile),
+        'nrows'     : nrows,
+        'ncols'     : ncols,
+        'transform' : list(transform)[:6],
+        'crs'       : crs.to_wkt(),
+        'touched'   : all_touched,
+        'inside'    : int(np.count_nonzero(mask))
+    }
+
+    # Replace the mask and sidecar together
+    #
+    tempFile = '%s.tmp.npy' % maskFile[:-4]
+    np.save(tempFile, mask)
+
+    with open('%s.tmp' % sidecarFile, 'w') as fh:
+        json.dump(sidecar, fh, indent=2)
+
+    os.replace(tempFile, maskFile)
+    os.replace('%s.tmp' % sidecarFile, sidecarFile)
+
+    screen_logger.info('Done with study area mask %s' % maskFile)
+
+    return maskFile
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    toolDir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description=program, usage=usage_message)
+    parser.add_argument('--usage', action='store_true')
+    parser.add_argument('--lookup', default=os.path.join(toolDir, '..', 'htdocs', 'data', 'framework_lookup.json'))
+    parser.add_argument('--directory', default='.')
+    parser.add_argument('--studyarea', default=os.path.join(toolDir, '..', 'htdocs', 'gis', 'studyarea.geojson'))
+    parser.add_argument('--centres', action='store_true')
+    args = parser.parse_args()
+
+    if args.usage:
+        print(usage_message)
+        sys.exit()
+
+    rastersL = lookupRasters(args.lookup, args.directory)
+
+    for (raster, rasterPath) in rastersL:
+        if not os.path.isfile(rasterPath):
+            screen_logger.error('Error: Raster file %s does not exist' % rasterPath)
+            sys.exit(1)
+
+    if not os.path.isfile(args.studyarea):
+        screen_logger.error('Error: Study area file %s does not exist' % args.studyarea)
+        sys.exit(1)
+
+    try:
+        buildMask(rastersL, args.studyarea, not args.centres)
+    except ValueError as e:
+        screen_logger.error('Error: %s' % str(e))
+        sys.exit(1)
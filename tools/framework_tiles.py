@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_tiles
+# Purpose:  This script builds the web-mercator tile pyramid of the surficial
+#           geology overlay (gis/maptiles/{z}/{x}/{y}.png) from the
+#           surficalgeology.png image, georeferenced by its bounds, or from a
+#           georeferenced raster. Tiles are warped across a pool of worker
+#           processes, tiles without any cell of the image are skipped, and
+#           zoom levels already built from the same source are kept unless
+#           a rebuild is forced.
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+
+import os, sys
+
+import argparse
+import hashlib
+import shutil
+import warnings
+
+import math
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.transform import from_bounds
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import transform_bounds
+
+import json
+
+# Set up logging
+#
+import logging
+
+# -- Set logging file
+#
+# Create screen handler
+#
+screen_logger = logging.getLogger()
+formatter     = logging.Formatter(fmt='%(message)s')
+console       = logging.StreamHandler()
+console.setFormatter(formatter)
+screen_logger.addHandler(console)
+screen_logger.setLevel(logging.INFO)
+screen_logger.propagate = False
+
+# Shared raster layer handling
+#
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cgi-bin'))
+
+from framework_layers import rasterVersion, longlatCrs
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+program      = "USGS Map Tile Script"
+version      = "1.01"
+version_date = "October 18, 2026"
+usage_message = """
+Usage: framework_tiles.py
+                [--help]
+                [--usage]
+                [--image                   Provide the overlay image or georeferenced raster to tile]
+                [--bounds                  Provide the west,south,east,north bounds of an image without georeferencing]
+                [--crs                     Provide the coordinate system of the bounds, longitude and latitude by default]
+                [--zooms                   Provide the range of zoom levels as minimum-maximum]
+                [--output                  Provide the directory to hold the tile pyramid]
+                [--scheme                  Provide the row numbering of tms (the map) or xyz]
+                [--workers                 Provide the number of worker processes]
+                [--force                   Rebuild every zoom level]
+"""
+
+# Web-mercator tile grid
+#
+mercatorCrs    = 'EPSG:3857'
+mercatorExtent = 20037508.342789244
+tileSize       = 256
+
+# Tile pyramid record of the source of each zoom level
+#
+recordName = 'tiles.json'
+
+# Source opened once for each worker process
+#
+workerSource = {}
+
+# =============================================================================
+def openSource(imagePath, bounds=None, crs=longlatCrs):
+
+    # Image warped to web mercator, an image without georeferencing is placed
+    #  by its bounds
+    #
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', NotGeoreferencedWarning)
+        src = rasterio.open(imagePath)
+
+    options = {'crs': mercatorCrs, 'resampling': Resampling.bilinear}
+    if bounds is not None:
+        options.update({'src_crs': CRS.from_user_input(crs), 'src_transform': from_bounds(*bounds, src.width, src.height)})
+    elif src.crs is None:
+        raise ValueError('Image %s is not georeferenced, provide its bounds' % imagePath)
+
+    return (src, options)
+
+# =============================================================================
+def sourceBounds(src, options):
+
+    # Bounds of the source in web mercator
+    #
+    if 'src_transform' in options:
+        (west, north) = options['src_transform'] * (0, 0)
+        (east, south) = options['src_transform'] * (src.width, src.height)
+        return transform_bounds(options['src_crs'], mercatorCrs, west, south, east, north)
+
+    return transform_bounds(src.crs, mercatorCrs, *src.bounds)
+
+# =============================================================================
+def tileRange(bounds, zoom):
+
+    # Columns and rows (xyz, from the top) of the tiles covering the bounds
+    #
+    ntiles = 2 ** zoom
+    span   = 2.0 * mercatorExtent / ntiles
+    (west, south, east, north) = bounds
+
+    x_min = max(0, int(math.floor((west + mercatorExtent) / span)))
+    x_max = min(ntiles - 1, int(math.floor((east + mercatorExtent) / span)))
+    y_min = max(0, int(math.floor((mercatorExtent - north) / span)))
+    y_max = min(ntiles - 1, int(math.floor((mercatorExtent - south) / span)))
+
+    return (range(x_min, x_max + 1), range(y_min, y_max + 1))
+
+# =============================================================================
+def tileBounds(x, y, zoom):
+
+    span  = 2.0 * mercatorExtent / 2 ** zoom
+    west  = -mercatorExtent + x * span
+    north =  mercatorExtent - y * span
+
+    return (west, north - span, west + span, north)
+
+# =============================================================================
+def initWorker(imagePath, bounds, crs):
+
+    screen_logger.setLevel(logging.WARNING)
+    (workerSource['src'], workerSource['options']) = openSource(imagePath, bounds, crs)
+
+# =============================================================================
+def buildTile(task):
+
+    # Tile warped from the source, a tile with no cell of the source (fully
+    #  transparent) is not written
+    #
+    (zoom, x, y, tilePath) = task
+
+    src     = workerSource['src']
+    options = dict(workerSource['options'])
+    options.update({'transform': from_bounds(*tileBounds(x, y, zoom), tileSize, tileSize), 'width': tileSize, 'height': tileSize})
+
+    with WarpedVRT(src, **options) as vrt:
+        tileData = vrt.read()
+
+    # Transparency from the alpha band, otherwise from the nodata mask
+    #
+    if tileData.shape[0] in [2, 4]:
+        alpha = tileData[-1]
+    else:
+        with WarpedVRT(src, **options) as vrt:
+            alpha = vrt.dataset_mask()
+
+    if not np.any(alpha):
+        return 0
+
+    os.makedirs(os.path.dirname(tilePath), exist_ok=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', NotGeoreferencedWarning)
+        with rasterio.open(tilePath, 'w', driver='PNG', width=tileSize, height=tileSize,
+                           count=tileData.shape[0], dtype=tileData.dtype, ZLEVEL=9) as dst:
+            dst.write(tileData)
+
+    if os.path.isfile('%s.aux.xml' % tilePath):
+        os.remove('%s.aux.xml' % tilePath)
+
+    return 1
+
+# =============================================================================
+def sourceVersion(imagePath, bounds, crs):
+
+    # Version of the source image and its placement
+    #
+    versionText = json.dumps([rasterVersion(imagePath), bounds, crs, tileSize])
+
+    return hashlib.sha1(versionText.encode('utf-8')).hexdigest()
+
+# =============================================================================
+def buildPyramid(imagePath, bounds, crs, zoomsL, outputDir, scheme, workers, force=False):
+
+    (src, options) = openSource(imagePath, bounds, crs)
+    mercatorBounds = sourceBounds(src, options)
+    src.close()
+
+    # Zoom levels already built from this source are kept
+    #
+    recordFile = os.path.join(outputDir, recordName)
+    recordD    = {}
+    if os.path.isfile(recordFile):
+        with open(recordFile, 'r') as fh:
+            recordD = json.load(fh)
+
+    version = sourceVersion(imagePath, bounds, crs)
+
+    tasksL   = []
+    rebuiltL = []
+    for zoom in zoomsL:
+        if not force and recordD.get(str(zoom), {}).get('version') == version and recordD[str(zoom)].get('scheme') == scheme:
+            screen_logger.info('\tZoom %2d is current' % zoom)
+            continue
+
+        # Tiles of an older source are removed with the zoom level
+        #
+        zoomDir = os.path.join(outputDir, str(zoom))
+        if os.path.isdir(zoomDir):
+            shutil.rmtree(zoomDir)
+        recordD.pop(str(zoom), None)
+        rebuiltL.append(zoom)
+
+        (xRange, yRange) = tileRange(mercatorBounds, zoom)
+        for x in xRange:
+            for y in yRange:
+                row = (2 ** zoom - 1 - y) if scheme == 'tms' else y
+                tasksL.append((zoom, x, y, os.path.join(zoomDir, str(x), '%d.png' % row)))
+
+    screen_logger.info('Building %d tiles with %d workers' % (len(tasksL), workers))
+
+    # Tiles written by zoom level, zoom levels without tiles are recorded so
+    #  they are not rebuilt on every run
+    #
+    countsD = dict([(zoom, 0) for zoom in rebuiltL])
+    if workers > 1:
+        import multiprocessing
+
+        with multiprocessing.Pool(workers, initializer=initWorker, initargs=(imagePath, bounds, crs)) as pool:
+            for (task, written) in zip(tasksL, pool.imap(buildTile, tasksL, chunksize=16)):
+                countsD[task[0]] += written
+    else:
+        initWorker(imagePath, bounds, crs)
+        for task in tasksL:
+            countsD[task[0]] += buildTile(task)
+
+    for (zoom, written) in sorted(countsD.items()):
+        screen_logger.info('\tZoom %2d %6d tiles written' % (zoom, written))
+        recordD[str(zoom)] = {'version': version, 'scheme': scheme, 'tiles': written}
+
+    os.makedirs(outputDir, exist_ok=True)
+    with open(recordFile, 'w') as fh:
+        json.dump(recordD, fh, indent=2, sort_keys=True)
+
+    return sum(countsD.values())
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    toolDir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description=program, usage=usage_message)
+    parser.add_argument('--usage', action='store_true')
+    parser.add_argument('--image', default=os.path.join(toolDir, '..', 'htdocs', 'gis', 'surficalgeology.png'))
+    parser.add_argument('--bounds', default=None)
+    parser.add_argument('--crs', default=longlatCrs)
+    parser.add_argument('--zooms', default='6-12')
+    parser.add_argument('--output', default=os.path.join(toolDir, '..', 'htdocs', 'gis', 'maptiles'))
+    parser.add_argument('--scheme', choices=['tms', 'xyz'], default='tms')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--force', action='store_true')
+    args = parser.parse_args()
+
+    if args.usage:
+        print(usage_message)
+        sys.exit()
+
+    if not os.path.isfile(args.image):
+        screen_logger.error('Error: Image file %s does not exist' % args.image)
+        sys.exit(1)
+
+    try:
+        bounds = None
+        if args.bounds is not None:
+            bounds = [float(bound) for bound in args.bounds.split(',')]
+            if len(bounds) != 4:
+                raise ValueError('Provide the bounds as west,south,east,north')
+
+        (minzoom, maxzoom) = [int(zoom) for zoom in args.zooms.split('-')]
+
+        ntiles = buildPyramid(args.image, bounds, args.crs, list(range(minzoom, maxzoom + 1)), args.output, args.scheme, max(1, args.workers), args.force)
+    except ValueError as e:
+        screen_logger.error('Error: %s' % str(e))
+        sys.exit(1)
+
+    screen_logger.info('Done with %d tiles in %s' % (ntiles, args.output))
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+###############################################################################
+# $Id$
+#
+# Project:  Rasterio Python framework_vectors
+# Purpose:  This script builds simplified versions of the study area
+#           GeoJSON file (or other vector files) for the map, one for each
+#           band of zoom levels. Each version is simplified to half a map
+#           pixel at the largest zoom of its band with topology preserved,
+#           and its coordinates are snapped to a decimal grid finer than
+#           that tolerance. A manifest lists the versions so the map fetches
+#           the coarsest version first and finer versions as it zooms in.
+#
+# Author:   Leonard Orzol <llorzol@usgs.gov>
+#
+###############################################################################
+# Copyright (c) Oregon Water Science Center
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+
+import os, sys
+
+import argparse
+import math
+
+import json
+
+# Set up logging
+#
+import logging
+
+# -- Set logging file
+#
+# Create screen handler
+#
+screen_logger = logging.getLogger()
+formatter     = logging.Formatter(fmt='%(message)s')
+console       = logging.StreamHandler()
+console.setFormatter(formatter)
+screen_logger.addHandler(console)
+screen_logger.setLevel(logging.INFO)
+screen_logger.propagate = False
+
+# Geometry simplification requires shapely
+#
+try:
+    import shapely
+    from shapely.geometry import shape, mapping
+except ImportError:
+    shapely = None
+
+# ------------------------------------------------------------
+# -- Set
+# ------------------------------------------------------------
+
+program      = "USGS Simplified Vector Script"
+version      = "1.01"
+version_date = "October 18, 2026"
+usage_message = """
+Usage: framework_vectors.py
+                [--help]
+                [--usage]
+                [--htdocs                  Provide the htdocs directory holding the gis directory]
+                [--vectors                 Provide the GeoJSON files in the gis directory to simplify]
+                [--bands                   Provide the bands of zoom levels as minimum-maximum pairs]
+                [--output                  Provide the directory in the gis directory to hold the versions and manifest]
+"""
+
+# Width in degrees of longitude of a map tile at zoom level 0
+#
+tileDegrees = 360.0
+tilePixels  = 256
+
+# =============================================================================
+def parseBands(bandsText):
+
+    bandsL = []
+    for band in bandsText.split(','):
+        (minzoom, maxzoom) = [int(zoom) for zoom in band.split('-')]
+        if minzoom > maxzoom:
+            raise ValueError('Zoom band %s has its minimum above its maximum' % band)
+        bandsL.append((minzoom, maxzoom))
+
+    return sorted(bandsL)
+
+# =============================================================================
+def bandTolerance(maxzoom):
+
+    # Half a map pixel in degrees at the largest zoom of the band, and the
+    #  decimal places of a grid ten times finer
+    #
+    tolerance = 0.5 * tileDegrees / (tilePixels * 2 ** maxzoom)
+    decimals  = int(math.ceil(-math.log10(tolerance))) + 1
+
+    return (tolerance, decimals)
+
+# =============================================================================
+def roundCoordinates(coordinates, decimals):
+
+    if isinstance(coordinates[0], (int, float)):
+        return [round(coordinate, decimals) for coordinate in coordinates]
+
+    return [roundCoordinates(part, decimals) for part in coordinates]
+
+# =============================================================================
+def simplifyVector(vectorD, tolerance, decimals):
+
+    # Features simplified with their topology preserved and snapped to the
+    #  decimal grid, features simplified away are dropped
+    #
+    featuresL = []
+    vertices  = 0
+    for feature in vectorD['features']:
+        if feature.get('geometry') is None:
+            continue
+
+        geometry = shapely.simplify(shape(feature['geometry']), tolerance, preserve_topology=True)
+        geometry = shapely.set_precision(geometry, 10.0 ** -decimals)
+        if geometry.is_empty:
+            continue
+
+        vertices += int(shapely.get_num_coordinates(geometry))
+
+        geometryD = mapping(geometry)
+        featuresL.append({
+            'type'       : 'Feature',
+            'properties' : feature.get('properties', {}),
+            'geometry'   : {'type': geometryD['type'], 'coordinates': roundCoordinates(geometryD['coordinates'], decimals)}
+        })
+
+    simplifiedD = {'type': 'FeatureCollection', 'name': vectorD.get('name'), 'features': featuresL}
+    if 'crs' in vectorD:
+        simplifiedD['crs'] = vectorD['crs']
+
+    return (simplifiedD, vertices)
+
+# =============================================================================
+def buildVersions(htdocsDir, vectorsL, bandsL, outputDir):
+
+    manifestD = {}
+    for vectorFile in vectorsL:
+
+        vectorPath = os.path.join(htdocsDir, 'gis', vectorFile)
+        with open(vectorPath, 'r') as fh:
+            vectorD = json.load(fh)
+
+        (name, suffix) = os.path.splitext(vectorFile)
+        screen_logger.info('Simplifying %s (%d bytes)' % (vectorPath, os.path.getsize(vectorPath)))
+
+        levelsL = []
+        for (minzoom, maxzoom) in bandsL:
+
+            (tolerance, decimals)   = bandTolerance(maxzoom)
+            (simplifiedD, vertices) = simplifyVector(vectorD, tolerance, decimals)
+
+            levelFile = '%s_z%d-%d.geojson' % (name, minzoom, maxzoom)
+            levelPath = os.path.join(htdocsDir, 'gis', outputDir, levelFile)
+            with open(levelPath, 'w') as fh:
+                json.dump(simplifiedD, fh, separators=(',', ':'))
+
+            levelD = {
+                'minzoom'   : minzoom,
+                'maxzoom'   : maxzoom,
+                'file'      : '/'.join(['gis', outputDir, levelFile]),
+                'tolerance' : tolerance,
+                'vertices'  : vertices,
+                'bytes'     : os.path.getsize(levelPath)
+            }
+            levelsL.append(levelD)
+
+            screen_logger.info('\tZoom %2d-%-2d tolerance %.7f degrees %7d vertices %8d bytes' % (minzoom, maxzoom, tolerance, vertices, levelD['bytes']))
+
+        manifestD[name] = levelsL
+
+    manifestFile = os.path.join(htdocsDir, 'gis', outputDir, 'manifest.json')
+    with open(manifestFile, 'w') as fh:
+        json.dump(manifestD, fh, indent=2)
+
+    return manifestFile
+
+# ----------------------------------------------------------------------
+# -- Main program
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    toolDir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description=program, usage=usage_message)
+    parser.add_argument('--usage', action='store_true')
+    parser.add_argument('--htdocs', default=os.path.join(toolDir, '..', 'htdocs'))
+    parser.add_argument('--vectors', default='studyarea.geojson')
+    parser.add_argument('--bands', default='0-7,8-9,10-18')
+    parser.add_argument('--output', default='simplified')
+    args = parser.parse_args()
+
+    if args.usage:
+        print(usage_message)
+        sys.exit()
+
+    if shapely is None:
+        screen_logger.error('Error: Simplifying the vectors requires the shapely module')
+        sys.exit(1)
+
+    try:
+        bandsL = parseBands(args.bands)
+    except ValueError as e:
+        screen_logger.error('Error: Provide zoom bands as minimum-maximum pairs (%s)' % str(e))
+        sys.exit(1)
+
+    os.makedirs(os.path.join(args.htdocs, 'gis', args.output), exist_ok=True)
+
+    manifestFile = buildVersions(args.htdocs, args.vectors.split(','), bandsL, args.output)
+
+    screen_logger.info('Done with manifest %s' % manifestFile)